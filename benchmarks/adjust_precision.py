@@ -0,0 +1,54 @@
+"""
+舍入开销的基准测试, 不属于单元测试.
+模拟40个持仓的一次循环: 调整因子, 计算下单表格, 以及下单价格的舍入,
+分别使用 round() 快速路径和 Decimal 路径, 比较每次循环的耗时.
+python -m benchmarks.adjust_precision
+"""
+import time
+import argparse
+from unittest.mock import patch
+from hodl.factor_mixin import *
+from hodl.plan_calc import *
+from hodl.tools import *
+
+
+FACTORS = FactorMixin.FACTORS_DICT['fear']
+STORES = [(10.0 + i * 3.17, 1000 + i * 100, ) for i in range(40)]
+
+
+def loop():
+    for base_price, max_shares in STORES:
+        weight = [factor[0] for factor in FACTORS]
+        sell_rate = [FormatTool.adjust_precision((factor[1] - 1.0) * 1.0 + 1.0, 5) for factor in FACTORS]
+        buy_rate = [FormatTool.adjust_precision((factor[2] - 1.0) * 1.0 + 1.0, 5) for factor in FACTORS]
+        calc = PlanCalc(weight=weight, sell_rate=sell_rate, buy_rate=buy_rate)
+        table = calc._profit_rows(base_price=base_price, max_shares=max_shares, sell_spread_rate=0.0015)
+        for row in table:
+            FormatTool.adjust_precision(row.sell_at * 1.0015, 2)
+            FormatTool.adjust_precision(row.buy_at * 0.9985, 2)
+
+
+def measure(times: int) -> float:
+    loop()
+    begin = time.perf_counter()
+    for _ in range(times):
+        loop()
+    return (time.perf_counter() - begin) / times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较 adjust_precision 的 round() 和 Decimal 路径')
+    parser.add_argument('--times', type=int, default=200, help='循环次数')
+    args = parser.parse_args()
+
+    fast = measure(args.times)
+    with patch.object(FormatTool, 'adjust_precision', new=FormatTool._adjust_precision_decimal):
+        slow = measure(args.times)
+    print(f'40个持仓每次循环的舍入开销(循环{args.times}次):')
+    print(f'Decimal: {slow * 1000:.3f}ms')
+    print(f'round(): {fast * 1000:.3f}ms')
+    print(f'加速: {slow / fast:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
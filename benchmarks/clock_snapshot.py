@@ -0,0 +1,45 @@
+"""
+时钟快照的基准测试, 不属于单元测试.
+模拟一次持仓循环中数百次的时间和日期查询,
+分别在没有快照和 TimeTools.clock_snapshot() 中调用 us_time_now/us_day_now, 比较耗时.
+python -m benchmarks.clock_snapshot
+"""
+import time
+import argparse
+from hodl.tools import *
+
+
+def measure(func, calls: int, times: int, snapshot: bool) -> float:
+    begin = time.perf_counter()
+    for _ in range(times):
+        if snapshot:
+            with TimeTools.clock_snapshot():
+                for _ in range(calls):
+                    func()
+        else:
+            for _ in range(calls):
+                func()
+    return (time.perf_counter() - begin) / times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较使用时钟快照前后的时间查询开销')
+    parser.add_argument('--calls', type=int, default=500, help='每次循环的查询次数')
+    parser.add_argument('--times', type=int, default=200, help='循环次数')
+    parser.add_argument('--tz', default='America/New_York', help='查询使用的时区')
+    args = parser.parse_args()
+
+    cases = [
+        ('us_time_now', lambda: TimeTools.us_time_now(tz=args.tz), ),
+        ('us_day_now', lambda: TimeTools.us_day_now(tz=args.tz), ),
+    ]
+    print(f'每次循环查询{args.calls}次(循环{args.times}次):')
+    for name, func in cases:
+        func()
+        plain = measure(func, calls=args.calls, times=args.times, snapshot=False)
+        frozen = measure(func, calls=args.calls, times=args.times, snapshot=True)
+        print(f'{name}: {plain * 1000:.3f}ms -> {frozen * 1000:.3f}ms, 加速: {plain / frozen:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,6 @@
+from hodl.broker.rate_limiter import *
 from hodl.broker.base import *
+from hodl.broker.account_snapshot import *
+from hodl.broker.http_transport import *
+from hodl.broker.quote_stream import *
 from hodl.broker.http_trading import *
@@ -0,0 +1,66 @@
+import time
+import threading
+from typing import Any, Callable
+from dataclasses import dataclass, field
+
+
+@dataclass
+class AccountSnapshot:
+    """
+    一个券商账户的持仓列表和现金, 分别记录拉取时间
+    """
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    parts: dict[str, tuple[float, Any]] = field(default_factory=dict)
+    version: int = 0
+
+
+class AccountSnapshotCache:
+    """
+    券商账户的持仓和现金快照,
+    以券商账户(券商名, 服务地址, 实例)为键, 在同一券商交易的全部持仓共用一份快照, 每部分在 ttl 秒内只拉取一次.
+    下单, 撤单, 以及订单出现新的成交后, 快照立即失效.
+    """
+    LOCK = threading.Lock()
+    SNAPSHOTS: dict[tuple, AccountSnapshot] = dict()
+
+    @classmethod
+    def snapshot(cls, key: tuple) -> AccountSnapshot:
+        with AccountSnapshotCache.LOCK:
+            snapshot = AccountSnapshotCache.SNAPSHOTS.get(key)
+            if snapshot is None:
+                snapshot = AccountSnapshot()
+                AccountSnapshotCache.SNAPSHOTS[key] = snapshot
+            return snapshot
+
+    @classmethod
+    def get(cls, key: tuple, part: str, func: Callable[[], Any], ttl: float) -> tuple[Any, bool]:
+        """
+        返回快照的一部分, 以及是否来自缓存
+        """
+        if not ttl or ttl <= 0:
+            return func(), False
+        snapshot = cls.snapshot(key)
+        with snapshot.lock:
+            item = snapshot.parts.get(part)
+            if item and time.monotonic() - item[0] < ttl:
+                return item[1], True
+            version = snapshot.version
+        data = func()
+        with snapshot.lock:
+            # 拉取期间快照被标记失效时, 这次的结果可能早于下单或成交, 不放入快照
+            if snapshot.version == version:
+                snapshot.parts[part] = (time.monotonic(), data, )
+        return data, False
+
+    @classmethod
+    def invalidate(cls, key: tuple):
+        snapshot = cls.snapshot(key)
+        with snapshot.lock:
+            snapshot.parts = dict()
+            snapshot.version += 1
+
+
+__all__ = [
+    'AccountSnapshot',
+    'AccountSnapshotCache',
+]
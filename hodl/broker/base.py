@@ -1,4 +1,4 @@
-from typing import Type
+from typing import Type, Callable
 import abc
 import time
 import random
@@ -11,6 +11,7 @@ from hodl.tools import *
 from hodl.state import *
 from hodl.exception_tools import *
 from hodl.tools.format import FormatTool as FMT
+from hodl.broker.rate_limiter import *
 
 
 class BrokerApiMixin(abc.ABC):
@@ -18,8 +19,8 @@ class BrokerApiMixin(abc.ABC):
     券商通道包含8个重要的操作方法, 和 on_init, 用于交易持仓相关的初始化函数
     8个方法,可根据对券商的实际需要进行部分开发, 比如这个券商只提供行情数据, 不提供交易, 那么仅实现行情获取功能即可.
     关于市场状态: fetch_market_status;
-    关于行情: fetch_quote;
-    关于交易: place_order cancel_order refresh_order query_chips query_cash detect_plug_in;
+    关于行情: fetch_quote, 以及可选的批量行情 fetch_quotes, 推送行情 subscribe_quotes;
+    关于交易: place_order cancel_order refresh_order query_chips query_cash detect_plug_in, 以及可选的批量订单 refresh_orders;
     """
 
     def fetch_market_status(self) -> BrokerMarketStatusResult:
@@ -40,6 +41,37 @@ class BrokerApiMixin(abc.ABC):
         """
         raise NotImplementedError
 
+    def fetch_quotes(self, symbols: list[str]) -> dict[str, Quote]:
+        """
+        可选的批量行情接口, 一次拉取多个标的的行情, 返回以标的为键的 Quote 字典。
+        行情预拉取线程每轮按券商汇总全部持仓的标的调用一次, 持仓线程直接读取结果,
+        结果中缺少的标的, 持仓线程仍然使用 fetch_quote 自己拉取。
+        实现此方法后, 需要让 batch_quote_enabled 返回 True。
+        """
+        raise NotImplementedError
+
+    def batch_quote_enabled(self) -> bool:
+        """
+        是否可以使用 fetch_quotes 批量拉取行情
+        """
+        return False
+
+    def subscribe_quotes(self, symbols: list[str], callback: Callable[[Quote], None]):
+        """
+        可选的推送行情接口, 订阅多个标的的行情, 每收到一个行情就调用一次 callback,
+        返回的订阅对象需要提供 close 方法, 以及表示连接可用的 alive 属性。
+        推送线程把行情放入行情中心, 持仓线程优先使用没有过期的推送行情,
+        推送中断或者某个标的长时间没有推送时, 持仓线程恢复使用 fetch_quote 拉取。
+        实现此方法后, 需要让 stream_quote_enabled 返回 True。
+        """
+        raise NotImplementedError
+
+    def stream_quote_enabled(self) -> bool:
+        """
+        是否可以使用 subscribe_quotes 订阅推送行情
+        """
+        return False
+
     def place_order(self, order: Order):
         """
         根据订单参数完成下单，并将订单号填充进 Order.order_id 属性。
@@ -78,6 +110,20 @@ class BrokerApiMixin(abc.ABC):
         """
         raise NotImplementedError
 
+    def refresh_orders(self, orders: list[Order]) -> list[Order]:
+        """
+        可选的批量订单接口, 一次请求更新多个订单, 每个订单的更新方式与 refresh_order 相同,
+        返回已经更新的订单, 没有返回的订单由框架继续使用 refresh_order 逐个更新。
+        实现此方法后, 需要让 batch_order_enabled 返回 True。
+        """
+        raise NotImplementedError
+
+    def batch_order_enabled(self) -> bool:
+        """
+        是否可以使用 refresh_orders 批量更新订单
+        """
+        return False
+
     def query_chips(self, symbol=None) -> int:
         """
         返回 self.symbol 获取实际持仓数量。
@@ -286,6 +332,17 @@ class TrackApi:
     avg_time: float | None
     # 最慢的记录, 单位秒
     slowest_time: float | None
+    # 直接使用缓存结果, 没有调用接口的次数
+    hit_times: int = 0
+    # 等待其他持仓正在进行的同一调用, 合并为一次接口调用的次数
+    coalesce_times: int = 0
+    # 因为限流而排队的次数, 以及排队的平均时间, 单位秒
+    wait_times: int = 0
+    avg_wait: float | None = None
+    # 当前排队中的调用数量
+    queue_depth: int = 0
+    # 限流闸门当前的速率(次/分钟), 没有限流时为空
+    rate_limit: float | None = None
 
 
 class _TrackApi:
@@ -296,6 +353,7 @@ class _TrackApi:
         time: float
         time_use: float
         is_ok: bool
+        wait_time: float = 0.0
 
         def __hash__(self):
             return id(self)
@@ -303,6 +361,21 @@ class _TrackApi:
     TTL = 600.0
     LOCK = threading.RLock()
     TIMES: dict[Type[BrokerApiBase], dict[str, set[Node]]] = defaultdict(dict)
+    HIT = 'hit'
+    COALESCE = 'coalesce'
+    # 没有实际调用接口的请求, 记录发生时间和类型(缓存命中/合并等待)
+    SAVED: dict[Type[BrokerApiBase], dict[str, list[tuple[float, str]]]] = defaultdict(dict)
+
+    @classmethod
+    def add_saved(cls, api_type: Type[BrokerApiBase], api_name: str, kind: str):
+        assert kind in (_TrackApi.HIT, _TrackApi.COALESCE, )
+        with _TrackApi.LOCK:
+            saved = _TrackApi.SAVED[api_type].setdefault(api_name, list())
+            now = time.time()
+            saved.append((now, kind, ))
+            expiry_time = now - _TrackApi.TTL
+            if saved[0][0] <= expiry_time:
+                saved[:] = [item for item in saved if item[0] > expiry_time]
 
     @classmethod
     def add(cls, node: Node):
@@ -336,6 +409,10 @@ class _TrackApi:
                         removable.add(node)
                     for node in removable:
                         api_set.remove(node)
+            expiry_time = time.time() - _TrackApi.TTL
+            for api_type, api_dict in _TrackApi.SAVED.items():
+                for api_name, saved in api_dict.items():
+                    saved[:] = [item for item in saved if item[0] > expiry_time]
 
     @classmethod
     def api_report(cls):
@@ -344,37 +421,58 @@ class _TrackApi:
             ttl = _TrackApi.TTL
             times = _TrackApi.TIMES
             result = list()
-            for api_type, api_dict in times.items():
-                for api_name, api_set in api_dict.items():
-                    match api_name:
-                        case 'detect_plug_in':
-                            api_name = '连通测试'
-                        case 'fetch_market_status':
-                            api_name = '市场状态'
-                        case 'fetch_quote':
-                            api_name = '行情快照'
-                        case 'query_cash':
-                            api_name = '可用资金'
-                        case 'query_chips':
-                            api_name = '持仓量'
-                        case 'place_order':
-                            api_name = '下单'
-                        case 'cancel_order':
-                            api_name = '撤单'
-                        case 'refresh_order':
-                            api_name = '刷新订单'
-                        case _:
-                            api_name = api_name
-                    avg_time = sum(i.time_use for i in api_set) / len(api_set) if api_set else None
-                    result.append(TrackApi(
-                        api_type=api_type,
-                        api_name=api_name,
-                        ok_times=sum(1 for i in api_set if i.is_ok),
-                        error_times=sum(1 for i in api_set if not i.is_ok),
-                        frequency=FormatTool.adjust_precision(len(api_set) / ttl * 60, precision=1),
-                        avg_time=FormatTool.adjust_precision(avg_time, precision=3) if api_set else None,
-                        slowest_time=max(i.time_use for i in api_set) if api_set else None,
-                    ))
+            keys = [(api_type, api_name, ) for api_type, api_dict in times.items() for api_name in api_dict]
+            keys += [
+                (api_type, api_name, )
+                for api_type, api_dict in _TrackApi.SAVED.items()
+                for api_name, saved in api_dict.items()
+                if saved and api_name not in times.get(api_type, dict())
+            ]
+            for api_type, api_name in keys:
+                api_set = times.get(api_type, dict()).get(api_name, set())
+                saved = _TrackApi.SAVED.get(api_type, dict()).get(api_name, list())
+                origin_name = api_name
+                match api_name:
+                    case 'detect_plug_in':
+                        api_name = '连通测试'
+                    case 'fetch_market_status':
+                        api_name = '市场状态'
+                    case 'fetch_quote':
+                        api_name = '行情快照'
+                    case 'fetch_quotes':
+                        api_name = '批量行情'
+                    case 'query_cash':
+                        api_name = '可用资金'
+                    case 'query_chips':
+                        api_name = '持仓量'
+                    case 'place_order':
+                        api_name = '下单'
+                    case 'cancel_order':
+                        api_name = '撤单'
+                    case 'refresh_order':
+                        api_name = '刷新订单'
+                    case 'refresh_orders':
+                        api_name = '批量刷新订单'
+                    case _:
+                        api_name = api_name
+                avg_time = sum(i.time_use for i in api_set) / len(api_set) if api_set else None
+                waits = [i.wait_time for i in api_set if i.wait_time > 0.001]
+                gate = RateLimiter.find_gate(api_type, origin_name)
+                result.append(TrackApi(
+                    api_type=api_type,
+                    api_name=api_name,
+                    ok_times=sum(1 for i in api_set if i.is_ok),
+                    error_times=sum(1 for i in api_set if not i.is_ok),
+                    frequency=FormatTool.adjust_precision(len(api_set) / ttl * 60, precision=1),
+                    avg_time=FormatTool.adjust_precision(avg_time, precision=3) if api_set else None,
+                    slowest_time=max(i.time_use for i in api_set) if api_set else None,
+                    hit_times=sum(1 for _, kind in saved if kind == _TrackApi.HIT),
+                    coalesce_times=sum(1 for _, kind in saved if kind == _TrackApi.COALESCE),
+                    wait_times=len(waits),
+                    avg_wait=FormatTool.adjust_precision(sum(waits) / len(waits), precision=3) if waits else None,
+                    queue_depth=gate.depth(origin_name) if gate else 0,
+                    rate_limit=FormatTool.adjust_precision(gate.rate, precision=1) if gate else None,
+                ))
             result.sort(key=lambda i: (i.api_type.BROKER_DISPLAY, i.api_name, ))
             return result
 
@@ -382,13 +480,20 @@ class _TrackApi:
 def track_api(func):
     """
     用于统计方法调用情况的装饰器,
-    记录发生时间, 类名, 方法名. 耗时, 是否产生异常
+    记录发生时间, 类名, 方法名. 耗时, 是否产生异常.
+    券商配置了 rate_limit 时, 调用前先通过限流闸门, 排队时间单独记录, 不计入耗时
     """
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
         api_type = type(self)
         api_name = func.__name__
         is_ok = True
+        wait_time = 0.0
+        gate = None
+        if isinstance(self, BrokerApiBase):
+            gate = RateLimiter.gate(api_type, api_name, self.broker_config)
+        if gate:
+            wait_time = gate.acquire(api_name, RateLimiter.priority(api_name))
         start_time = time.time()
         try:
             result = func(self, *args, **kwargs)
@@ -407,8 +512,11 @@ def track_api(func):
                 time=start_time,
                 time_use=time_use,
                 is_ok=is_ok,
+                wait_time=wait_time,
             )
             _TrackApi.add(node)
+            if gate:
+                gate.feedback(is_ok)
 
     return wrapper
 
@@ -456,6 +564,14 @@ def track_api_report():
     return _TrackApi.api_report()
 
 
+def track_api_saved(api_type: Type[BrokerApiBase], api_name: str, coalesce: bool = False):
+    """
+    记录一次没有实际调用接口的请求, 结果来自缓存, 或者来自其他持仓正在进行的同一调用
+    """
+    kind = _TrackApi.COALESCE if coalesce else _TrackApi.HIT
+    _TrackApi.add_saved(api_type=api_type, api_name=api_name, kind=kind)
+
+
 def sort_brokers(
         var: VariableTools,
         prefer_list: list[str] = None,
@@ -491,5 +607,6 @@ __all__ = [
     'track_api',
     'broker_api',
     'track_api_report',
+    'track_api_saved',
     'sort_brokers',
 ]
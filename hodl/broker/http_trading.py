@@ -1,5 +1,5 @@
 import re
-from typing import Type
+from typing import Type, Callable
 from json import JSONDecodeError
 from urllib.parse import urljoin
 from hodl.quote import *
@@ -7,6 +7,9 @@ from hodl.tools import *
 from hodl.state import *
 from hodl.exception_tools import *
 from hodl.broker.base import *
+from hodl.broker.account_snapshot import *
+from hodl.broker.http_transport import *
+from hodl.broker.quote_stream import *
 
 
 class HttpTradingBase(BrokerApiBase):
@@ -23,19 +26,36 @@ class HttpTradingBase(BrokerApiBase):
             header: str = 'HT-TOKEN',
             token: str = '',
             raise_for_status=False,
+            limit_key: tuple = None,
+            concurrency: int = 0,
     ):
-        args = dict(
-            method=method,
-            url=url,
-            timeout=timeout,
-            json=json,
-            headers={
-                'User-Agent': 'tradebot',
-                header: token,
-            },
-        )
-        session = VariableTools.http_session()
-        resp = session.request(**args)
+        """
+        concurrency 大于 0 时使用异步传输层, limit_key 对应的券商实例最多同时进行 concurrency 个请求;
+        否则使用全局共享的阻塞会话
+        """
+        headers = {
+            'User-Agent': 'tradebot',
+            header: token,
+        }
+        if concurrency > 0:
+            resp = AsyncHttpTransport.request_sync(
+                method=method,
+                url=url,
+                headers=headers,
+                json=json,
+                timeout=timeout,
+                limit_key=limit_key,
+                concurrency=concurrency,
+            )
+        else:
+            session = VariableTools.http_session()
+            resp = session.request(
+                method=method,
+                url=url,
+                timeout=timeout,
+                json=json,
+                headers=headers,
+            )
         if raise_for_status:
             resp.raise_for_status()
         try:
@@ -44,6 +64,17 @@ class HttpTradingBase(BrokerApiBase):
         except JSONDecodeError:
             return dict()
 
+    def _transport_args(self) -> dict:
+        """
+        券商配置 async_transport 开启异步传输层(默认关闭, 使用阻塞会话), max_concurrency 为这个券商实例的并发请求上限
+        """
+        if not self.broker_config.get('async_transport', False):
+            return dict()
+        return dict(
+            limit_key=self.account_key,
+            concurrency=max(1, self.broker_config.get('max_concurrency', 4)),
+        )
+
     def _http_get(self, uri: str, timeout: int = None, ex_type: Type[Exception] = PrepareError) -> dict:
         base_site = self.broker_config.get('base_site')
         instance_id = self.broker_config.get('instance_id')
@@ -62,6 +93,7 @@ class HttpTradingBase(BrokerApiBase):
                     header=header,
                     token=token,
                     raise_for_status=True,
+                    **self._transport_args(),
                 )
             except Exception as ex:
                 raise ex_type(ex)
@@ -89,6 +121,7 @@ class HttpTradingBase(BrokerApiBase):
                 header=header,
                 token=token,
                 raise_for_status=True,
+                **self._transport_args(),
             )
         except Exception as ex:
             raise ex_type(ex)
@@ -125,20 +158,13 @@ class HttpTradingBase(BrokerApiBase):
     def fetch_market_status(self) -> BrokerMarketStatusResult:
         return BrokerMarketStatusResult()
 
-    def fetch_quote(self) -> Quote:
-        symbol = self.symbol
-        region = self._get_region(symbol)
+    def _to_quote(self, symbol: str, quote_d: dict) -> Quote:
         tz = self._get_tz(symbol)
-        uri = '/httptrading/api/{instance_id}/market/quote'
-        query = '?tradeType={trade_type}&region={region}&symbol={symbol}'
-        query = query.format(trade_type='Securities', region=region, symbol=symbol)
-        d = self._http_get(uri + query)
-        quote_d: dict = d.get('quote', dict())
         update_dt = TimeTools.from_timestamp(quote_d.get('timestamp') / 1000, tz=tz)
         is_tradable: bool = quote_d.get('isTradable')
         status = 'NORMAL' if is_tradable else 'DISABLED'
         return Quote(
-            symbol=self.symbol,
+            symbol=symbol,
             open=quote_d.get('openPrice'),
             pre_close=quote_d.get('preClose'),
             latest_price=quote_d.get('latest'),
@@ -150,9 +176,111 @@ class HttpTradingBase(BrokerApiBase):
             broker_display=self.BROKER_DISPLAY,
         )
 
+    def fetch_quote(self) -> Quote:
+        symbol = self.symbol
+        region = self._get_region(symbol)
+        uri = '/httptrading/api/{instance_id}/market/quote'
+        query = '?tradeType={trade_type}&region={region}&symbol={symbol}'
+        query = query.format(trade_type='Securities', region=region, symbol=symbol)
+        d = self._http_get(uri + query)
+        quote_d: dict = d.get('quote', dict())
+        return self._to_quote(symbol, quote_d)
+
+    def batch_quote_enabled(self) -> bool:
+        """
+        需要 HttpTrading 服务提供批量行情接口, 通过券商配置 batch_quote 开启
+        """
+        return self.broker_config.get('batch_quote', False)
+
+    def fetch_quotes(self, symbols: list[str]) -> dict[str, Quote]:
+        """
+        批量行情接口的参数为逗号分隔的 市场.标的, 每次请求最多 batch_quote_size 个标的,
+        返回的 quotes 列表中, 每个行情的 contract 字段说明了对应的标的
+        """
+        uri = '/httptrading/api/{instance_id}/market/quotes'
+        size = max(1, self.broker_config.get('batch_quote_size', 50))
+        symbols = list(dict.fromkeys(symbols))
+        result = dict()
+        for idx in range(0, len(symbols), size):
+            chunk = symbols[idx:idx + size]
+            contracts = ','.join(f'{self._get_region(symbol)}.{symbol}' for symbol in chunk)
+            query = '?tradeType={trade_type}&symbols={symbols}'
+            query = query.format(trade_type='Securities', symbols=contracts)
+            d = self._http_get(uri + query)
+            for quote_d in d.get('quotes', list()):
+                contract_d: dict = quote_d.get('contract', dict())
+                symbol = contract_d.get('symbol')
+                if symbol not in chunk:
+                    continue
+                region = self._get_region(symbol)
+                if contract_d.get('region', region) != region:
+                    continue
+                result[symbol] = self._to_quote(symbol, quote_d)
+        return result
+
+    def stream_quote_enabled(self) -> bool:
+        """
+        需要 HttpTrading 服务提供 SSE 推送行情接口, 通过券商配置 stream_quote 开启
+        """
+        return self.broker_config.get('stream_quote', False)
+
+    def subscribe_quotes(self, symbols: list[str], callback: Callable[[Quote], None]) -> QuoteSubscription:
+        """
+        推送接口的参数与批量行情接口相同, 每个事件是一个带有 contract 字段的行情,
+        服务端需要定期发送心跳注释, 券商配置 stream_timeout 秒内没有任何数据时重新连接
+        """
+        base_site = self.broker_config.get('base_site')
+        instance_id = self.broker_config.get('instance_id')
+        header = self.broker_config.get('header', 'HT-TOKEN')
+        token = self.broker_config.get('token', '')
+        symbols = list(dict.fromkeys(symbols))
+        uri = '/httptrading/api/{instance_id}/market/stream'.format(instance_id=instance_id)
+        contracts = ','.join(f'{self._get_region(symbol)}.{symbol}' for symbol in symbols)
+        query = '?tradeType={trade_type}&symbols={symbols}'
+        query = query.format(trade_type='Securities', symbols=contracts)
+
+        def _on_data(quote_d: dict):
+            contract_d: dict = quote_d.get('contract', dict())
+            symbol = contract_d.get('symbol')
+            if symbol not in symbols:
+                return
+            if contract_d.get('region', self._get_region(symbol)) != self._get_region(symbol):
+                return
+            callback(self._to_quote(symbol, quote_d))
+
+        subscription = QuoteSubscription(
+            url=urljoin(base_site, uri + query),
+            headers={'User-Agent': 'tradebot', header: token},
+            on_data=_on_data,
+            read_timeout=self.broker_config.get('stream_timeout', 30.0),
+            name=f'{self.BROKER_NAME}QuoteStream',
+        )
+        return subscription.start()
+
+    @property
+    def account_key(self) -> tuple:
+        return self.BROKER_NAME, self.broker_config.get('base_site'), self.broker_config.get('instance_id'),
+
+    def _account_part(self, part: str, uri: str, api_name: str):
+        """
+        从账户快照读取持仓列表或者现金, 快照的时效由券商配置 account_cache_ttl 决定, 单位秒, 设置为 0 则每次都请求接口
+        """
+        ttl = self.broker_config.get('account_cache_ttl', 2.0)
+        data, cached = AccountSnapshotCache.get(
+            key=self.account_key,
+            part=part,
+            func=lambda: self._http_get(uri),
+            ttl=ttl,
+        )
+        if cached:
+            track_api_saved(api_type=type(self), api_name=api_name)
+        return data
+
+    def invalidate_account(self):
+        AccountSnapshotCache.invalidate(self.account_key)
+
     def query_cash(self):
-        uri = '/httptrading/api/{instance_id}/cash/state'
-        d = self._http_get(uri)
+        d = self._account_part('cash', '/httptrading/api/{instance_id}/cash/state', 'query_cash')
         cash_d: dict = d.get('cash', dict())
         currency = cash_d.get('currency')
         amount = cash_d.get('amount')
@@ -163,8 +291,7 @@ class HttpTradingBase(BrokerApiBase):
     def query_chips(self, symbol=None):
         symbol = symbol or self.symbol
         region = self._get_region(symbol)
-        uri = '/httptrading/api/{instance_id}/position/state'
-        d = self._http_get(uri)
+        d = self._account_part('positions', '/httptrading/api/{instance_id}/position/state', 'query_chips')
         positions = d.get('positions', list())
         for position in positions:
             contract_d: dict = position.get('contract', dict())
@@ -199,30 +326,33 @@ class HttpTradingBase(BrokerApiBase):
             'protectPrice': order.protect_price,
             'direction': order.direction, # 兼容旧的接口参数
         }
-        d = self._http_post(uri, args)
+        try:
+            d = self._http_post(uri, args)
+        finally:
+            # 即使请求失败, 订单也可能已经提交, 账户快照不再可信
+            self.invalidate_account()
         order_id = d.get('orderId')
         assert order_id
         order.order_id = order_id
 
     def cancel_order(self, order: Order):
         uri = '/httptrading/api/{instance_id}/order/cancel'
-        d = self._http_post(uri, {
-            'orderId': order.order_id,
-        })
+        try:
+            d = self._http_post(uri, {
+                'orderId': order.order_id,
+            })
+        finally:
+            self.invalidate_account()
         canceled: bool = d.get('canceled', False)
         assert canceled
 
-    def refresh_order(self, order: Order):
-        uri = '/httptrading/api/{instance_id}/order/state'
-        query = '?orderId={order_id}'
-        query = query.format(order_id=order.order_id)
-        d = self._http_get(uri + query)
-        order_d: dict = d.get('order', dict())
+    def _update_order(self, order: Order, order_d: dict):
         qty = order_d.get('qty')
         filled_qty = order_d.get('filledQty')
         avg_price = order_d.get('avgPrice')
         error_reason = order_d.get('errorReason')
         is_canceled = order_d.get('isCanceled')
+        last_filled_qty = order.filled_qty
         self.modify_order_fields(
             order=order,
             qty=qty,
@@ -232,6 +362,44 @@ class HttpTradingBase(BrokerApiBase):
             reason=error_reason,
             is_cancelled=is_canceled,
         )
+        if order.filled_qty != last_filled_qty:
+            # 新的成交改变了持仓和现金
+            self.invalidate_account()
+
+    def refresh_order(self, order: Order):
+        uri = '/httptrading/api/{instance_id}/order/state'
+        query = '?orderId={order_id}'
+        query = query.format(order_id=order.order_id)
+        d = self._http_get(uri + query)
+        order_d: dict = d.get('order', dict())
+        self._update_order(order, order_d)
+
+    def batch_order_enabled(self) -> bool:
+        """
+        需要 HttpTrading 服务提供批量订单接口, 通过券商配置 batch_order 开启
+        """
+        return self.broker_config.get('batch_order', False)
+
+    def refresh_orders(self, orders: list[Order]) -> list[Order]:
+        """
+        批量订单接口的参数为逗号分隔的订单号, 返回的 orders 列表中每个订单带有 orderId 字段,
+        接口没有返回的订单不做更新, 由调用方逐个刷新
+        """
+        if not orders:
+            return list()
+        uri = '/httptrading/api/{instance_id}/order/states'
+        query = '?orderIds={order_ids}'
+        query = query.format(order_ids=','.join(str(order.order_id) for order in orders))
+        d = self._http_get(uri + query)
+        order_dict = {str(order_d.get('orderId')): order_d for order_d in d.get('orders', list())}
+        result = list()
+        for order in orders:
+            order_d = order_dict.get(str(order.order_id))
+            if order_d is None:
+                continue
+            self._update_order(order, order_d)
+            result.append(order)
+        return result
 
 
 __all__ = ['HttpTradingBase', ]
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from urllib.parse import urlsplit
+import httpx
+
+
+class AsyncHttpTransport:
+    """
+    券商 http 接口的异步传输层,
+    全部请求在异步线程的事件循环中执行, 每个服务地址(base_site)使用一个支持 HTTP/2 多路复用的连接池,
+    每个券商实例(服务地址 + 实例)最多同时进行 concurrency 个请求, 超出的请求在事件循环中排队, 不占用额外的线程.
+    timeout 包含排队的时间, 排队过久的请求直接超时, 不会在排队之后再等待一个完整的超时时间.
+    持仓线程通过 request_sync 同步等待结果, 所以券商插件不需要任何改动.
+    """
+    LOCK = threading.Lock()
+    CLIENTS: dict[str, httpx.AsyncClient] = dict()
+    SEMAPHORES: dict[tuple, asyncio.Semaphore] = dict()
+    MAX_CONNECTIONS = 16
+
+    @classmethod
+    def _site(cls, url: str) -> str:
+        parts = urlsplit(url)
+        return f'{parts.scheme}://{parts.netloc}'
+
+    @classmethod
+    def client(cls, url: str) -> httpx.AsyncClient:
+        site = cls._site(url)
+        with AsyncHttpTransport.LOCK:
+            client = AsyncHttpTransport.CLIENTS.get(site)
+            if client is None:
+                client = httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=AsyncHttpTransport.MAX_CONNECTIONS),
+                )
+                AsyncHttpTransport.CLIENTS[site] = client
+            return client
+
+    @classmethod
+    def semaphore(cls, limit_key: tuple, concurrency: int) -> asyncio.Semaphore:
+        key = (limit_key, concurrency, )
+        with AsyncHttpTransport.LOCK:
+            semaphore = AsyncHttpTransport.SEMAPHORES.get(key)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(concurrency)
+                AsyncHttpTransport.SEMAPHORES[key] = semaphore
+            return semaphore
+
+    @classmethod
+    async def request(
+            cls,
+            method: str,
+            url: str,
+            headers: dict,
+            json=None,
+            timeout: float = 30,
+            limit_key: tuple = None,
+            concurrency: int = 4,
+    ) -> httpx.Response:
+        client = cls.client(url)
+        semaphore = cls.semaphore(limit_key or (cls._site(url), ), max(1, concurrency))
+        async with asyncio.timeout(timeout):
+            async with semaphore:
+                return await client.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    json=json,
+                    timeout=timeout,
+                )
+
+    @classmethod
+    def request_sync(
+            cls,
+            method: str,
+            url: str,
+            headers: dict,
+            json=None,
+            timeout: float = 30,
+            limit_key: tuple = None,
+            concurrency: int = 4,
+    ) -> httpx.Response:
+        # 异步线程所在的模块依赖券商模块, 这里需要延迟导入
+        from hodl.proxy.asyncio_proxy import AsyncioProxyThread
+        return AsyncioProxyThread.call(cls.request(
+            method=method,
+            url=url,
+            headers=headers,
+            json=json,
+            timeout=timeout,
+            limit_key=limit_key,
+            concurrency=concurrency,
+        ))
+
+
+__all__ = ['AsyncHttpTransport', ]
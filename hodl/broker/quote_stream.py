@@ -0,0 +1,128 @@
+import json
+import time
+import threading
+import traceback
+from typing import Callable
+import httpx
+
+
+class QuoteSubscription:
+    """
+    一个 SSE(text/event-stream) 行情推送连接,
+    在单独的守护线程中读取推送, 每个事件的 data 是一个 json 对象, 交给 on_data 处理;
+    以冒号开头的注释行是服务端的心跳, 只用于刷新连接的活跃时间.
+    连接断开后按指数退避重新连接, 直到调用 close.
+    """
+    MIN_BACKOFF = 0.5
+    MAX_BACKOFF = 30.0
+
+    def __init__(
+            self,
+            url: str,
+            headers: dict,
+            on_data: Callable[[dict], None],
+            read_timeout: float = 30.0,
+            name: str = 'quoteStream',
+    ):
+        self.url = url
+        self.headers = headers | {'Accept': 'text/event-stream'}
+        self.on_data = on_data
+        self.read_timeout = read_timeout
+        self.name = name
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.connected = threading.Event()
+        self.response: httpx.Response = None
+        self.thread: threading.Thread = None
+        self.connect_times = 0
+        self.event_times = 0
+        self.error_times = 0
+        self.last_active: float = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.closed.set()
+        with self.lock:
+            response = self.response
+        if response is not None:
+            try:
+                response.close()
+            except Exception as e:
+                pass
+
+    @property
+    def alive(self) -> bool:
+        return not self.closed.is_set() and self.thread is not None and self.thread.is_alive()
+
+    def idle_secs(self) -> float | None:
+        """
+        距离最后一次收到事件或者心跳的秒数, 从未连接成功时为空
+        """
+        if self.last_active is None:
+            return None
+        return time.monotonic() - self.last_active
+
+    def _handle(self, lines: list[str]):
+        try:
+            d = json.loads('\n'.join(lines))
+        except ValueError:
+            self.error_times += 1
+            return
+        if not isinstance(d, dict):
+            return
+        self.event_times += 1
+        try:
+            self.on_data(d)
+        except Exception as e:
+            self.error_times += 1
+            traceback.print_exc()
+
+    def _read(self):
+        timeout = httpx.Timeout(10.0, read=self.read_timeout)
+        with httpx.stream('GET', self.url, headers=self.headers, timeout=timeout) as response:
+            response.raise_for_status()
+            with self.lock:
+                self.response = response
+            self.connect_times += 1
+            self.last_active = time.monotonic()
+            self.connected.set()
+            lines: list[str] = list()
+            for line in response.iter_lines():
+                if self.closed.is_set():
+                    return
+                self.last_active = time.monotonic()
+                if not line:
+                    if lines:
+                        self._handle(lines)
+                    lines = list()
+                elif line.startswith(':'):
+                    continue
+                elif line.startswith('data:'):
+                    lines.append(line[5:].strip())
+
+    def _run(self):
+        backoff = QuoteSubscription.MIN_BACKOFF
+        while not self.closed.is_set():
+            connect_times = self.connect_times
+            try:
+                self._read()
+            except Exception as e:
+                if self.closed.is_set():
+                    break
+                self.error_times += 1
+            finally:
+                self.connected.clear()
+                with self.lock:
+                    self.response = None
+            if self.connect_times != connect_times:
+                backoff = QuoteSubscription.MIN_BACKOFF
+            if self.closed.wait(timeout=backoff):
+                break
+            backoff = min(QuoteSubscription.MAX_BACKOFF, backoff * 2)
+
+
+__all__ = ['QuoteSubscription', ]
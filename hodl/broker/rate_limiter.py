@@ -0,0 +1,153 @@
+import math
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from hodl.tools import *
+
+
+class RateGate:
+    """
+    一个券商接口预算的准入闸门,
+    基于漏桶发放令牌, 等待中的调用按优先级排队, 只有排在队首的调用可以取得令牌, 同优先级的先到先得.
+    实际速率按 AIMD 调整: 短时间内失败次数达到 ERROR_BURST 时速率减半, 之后每次成功调用加回预算的 INCREASE_STEP,
+    最多恢复到预算, 最少保留预算的 MIN_FACTOR.
+    """
+    ERROR_WINDOW = 10.0
+    ERROR_BURST = 3
+    DECREASE_FACTOR = 0.5
+    INCREASE_STEP = 0.05
+    MIN_FACTOR = 0.1
+
+    def __init__(self, budget: float):
+        self.budget = float(budget)
+        self.rate = float(budget)
+        self.bucket = LeakyBucket(leak_rate=budget, capacity=self._capacity(budget))
+        self.cond = threading.Condition()
+        self.waiters: list[tuple[int, int, str]] = list()
+        self.seq = itertools.count()
+        self.errors: deque[float] = deque()
+        self.last_decrease = 0.0
+        self.decrease_times = 0
+
+    @classmethod
+    def _capacity(cls, budget: float) -> int:
+        # 允许一秒内的突发调用
+        return max(1, math.ceil(budget / 60.0))
+
+    def reset_budget(self, budget: float):
+        """
+        配置热更新改变了预算
+        """
+        with self.cond:
+            if budget == self.budget:
+                return
+            self.budget = float(budget)
+            self.rate = min(self.rate, self.budget)
+            self.bucket = LeakyBucket(leak_rate=self.rate, capacity=self._capacity(budget))
+            self.cond.notify_all()
+
+    def depth(self, api_name: str = None) -> int:
+        with self.cond:
+            return sum(1 for item in self.waiters if api_name is None or item[2] == api_name)
+
+    def acquire(self, api_name: str, priority: int) -> float:
+        """
+        阻塞直到取得一个令牌, 返回等待的秒数
+        """
+        begin = time.monotonic()
+        with self.cond:
+            ticket = (priority, next(self.seq), api_name, )
+            heapq.heappush(self.waiters, ticket)
+            try:
+                while True:
+                    if self.waiters[0] is ticket:
+                        if self.bucket.try_consume():
+                            break
+                        self.cond.wait(timeout=max(0.001, self.bucket.wait_secs()))
+                    else:
+                        # 队首离开或者有更高优先级的调用到达时会被唤醒
+                        self.cond.wait(timeout=1.0)
+            finally:
+                self.waiters.remove(ticket)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+        return time.monotonic() - begin
+
+    def feedback(self, is_ok: bool):
+        now = time.monotonic()
+        with self.cond:
+            if is_ok:
+                if self.rate < self.budget:
+                    self.rate = min(self.budget, self.rate + self.budget * RateGate.INCREASE_STEP)
+                    self.bucket.leak_rate = self.rate
+                return
+            self.errors.append(now)
+            while self.errors and self.errors[0] <= now - RateGate.ERROR_WINDOW:
+                self.errors.popleft()
+            if len(self.errors) < RateGate.ERROR_BURST:
+                return
+            if now - self.last_decrease < RateGate.ERROR_WINDOW:
+                return
+            self.rate = max(self.budget * RateGate.MIN_FACTOR, self.rate * RateGate.DECREASE_FACTOR)
+            self.bucket.leak_rate = self.rate
+            self.last_decrease = now
+            self.decrease_times += 1
+            self.errors.clear()
+
+
+class RateLimiter:
+    """
+    券商接口的限流器,
+    预算来自券商配置 rate_limit, 单位为每分钟调用次数, 例如:
+    rate_limit = { shared = 300, fetch_quote = 120, place_order = 30 }
+    配置了预算的接口独占一个闸门, 其他接口共用 shared 闸门, 都没有配置时不做限流.
+    同一闸门中, 下单撤单优先于行情和订单刷新, 它们又优先于可用资金和持仓量查询.
+    """
+    LOCK = threading.Lock()
+    GATES: dict[tuple, RateGate] = dict()
+    SHARED = 'shared'
+    PRIORITY = {
+        'place_order': 0,
+        'cancel_order': 0,
+        'query_cash': 2,
+        'query_chips': 2,
+    }
+    DEFAULT_PRIORITY = 1
+
+    @classmethod
+    def priority(cls, api_name: str) -> int:
+        return RateLimiter.PRIORITY.get(api_name, RateLimiter.DEFAULT_PRIORITY)
+
+    @classmethod
+    def gate(cls, api_type: type, api_name: str, broker_config: dict = None) -> RateGate | None:
+        budgets: dict = (broker_config or dict()).get('rate_limit') or dict()
+        if budget := budgets.get(api_name):
+            gate_name = api_name
+        elif budget := budgets.get(RateLimiter.SHARED):
+            gate_name = RateLimiter.SHARED
+        else:
+            return None
+        key = (api_type, gate_name, )
+        with RateLimiter.LOCK:
+            gate = RateLimiter.GATES.get(key)
+            if gate is None:
+                gate = RateGate(budget=budget)
+                RateLimiter.GATES[key] = gate
+        gate.reset_budget(budget)
+        return gate
+
+    @classmethod
+    def find_gate(cls, api_type: type, api_name: str) -> RateGate | None:
+        """
+        报告使用, 只查找已经创建的闸门
+        """
+        with RateLimiter.LOCK:
+            return RateLimiter.GATES.get((api_type, api_name, )) or RateLimiter.GATES.get((api_type, RateLimiter.SHARED, ))
+
+
+__all__ = [
+    'RateGate',
+    'RateLimiter',
+]
@@ -7,6 +7,7 @@ from textual.widgets import Header, Footer, ListView, ListItem, Label
 from textual.binding import Binding
 from hodl.bot import *
 from hodl.tools import *
+from hodl.storage import *
 from hodl.cli.fix_screens.order_link import *
 from hodl.cli.fix_screens.store_config_detail import *
 from hodl.cli.fix_screens.earning_link import *
@@ -19,6 +20,7 @@ class IndexScreen(Screen):
             ListItem(Label("1.补录订单信息", classes='indexLabel'), id='indexMenuOrderLink'),
             ListItem(Label("2.补录收益信息", classes='indexLabel'), id='indexMenuEarningLink'),
             ListItem(Label("3.生成电报机器人指令列表", classes='indexLabel'), id='indexPrintTgCmdList'),
+            ListItem(Label("4.重建收益汇总", classes='indexLabel'), id='indexRebuildEarningSummary'),
             ListItem(Label("0.查看持仓设定", classes='indexLabel'), id='indexMenuStoreConfig'),
             initial_index=None,
             classes='indexListView',
@@ -38,6 +40,8 @@ class IndexScreen(Screen):
                     self.app.push_screen(EarningLinkScreen())
                 case 'indexPrintTgCmdList':
                     self.print_tg_cmd_list()
+                case 'indexRebuildEarningSummary':
+                    self.rebuild_earning_summary()
                 case _:
                     pass
 
@@ -49,6 +53,18 @@ class IndexScreen(Screen):
             lines.append(line)
         self.app.exit(message=f'在 @BotFather 中使用 /setcommands 回应命令菜单项:\n{"\n".join(lines)}')
 
+    def rebuild_earning_summary(self):
+        var = VariableTools()
+        if not var.db_path:
+            self.app.exit(message=f'没有配置数据库, 不能重建收益汇总')
+            return
+        db = LocalDb(var.db_path)
+        try:
+            count = EarningSummaryRow.rebuild(con=db.conn)
+        finally:
+            db.close()
+        self.app.exit(message=f'执行完成: 根据收益明细重建了{count}条收益汇总')
+
 
 class HodlFixTools(App):
     CSS_PATH = "../../hodl/resources/css/fix_tools.css"
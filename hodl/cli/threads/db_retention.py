@@ -0,0 +1,233 @@
+import time
+import zlib
+import sqlite3
+import traceback
+from dataclasses import dataclass
+from hodl.storage import *
+from hodl.thread_mixin import *
+from hodl.tools import *
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    一张数据表的保留策略, 满足 condition 的数据行会被分批删除
+    """
+    table: str
+    condition: str
+    params: tuple = tuple()
+
+
+class DbRetentionThread(ThreadMixin):
+    """
+    数据库清理线程,
+    按照各数据表的保留策略, 每次只删除一小批数据行并短暂让出写锁, 尽量不影响持仓线程的写入;
+    超过保留天数的持仓状态存档, 每个持仓每天只保留最后一个版本, 并改写为完整快照;
+    清理结束后使用 incremental_vacuum 归还空闲页.
+    """
+    BATCH_ROWS = 500
+    BATCH_PAUSE = 0.1
+    VACUUM_PAGES = 1024
+
+    def __init__(self, db: LocalDb):
+        self.db = db
+        self.total_rows = 0
+        self.total_bytes = 0
+        self.total_times = 0
+        self.error_times = 0
+        self.last_time: float = None
+
+    @property
+    def variable(self):
+        return HotReloadVariableTools.config()
+
+    def primary_bar(self) -> list[BarElementDesc]:
+        last_time = FormatTool.pretty_dt(self.last_time, with_year=False, with_ms=False)
+        return [
+            BarElementDesc(
+                content=f'♻️{FormatTool.number_to_size(self.total_bytes)}',
+                tooltip=f'数据库清理{self.total_times}次, 删除{self.total_rows:,}行, '
+                        f'回收{FormatTool.number_to_size(self.total_bytes)}, 失败{self.error_times}次, '
+                        f'最近执行时间:{last_time}',
+            ),
+        ]
+
+    @classmethod
+    def _ymd_before(cls, days: int) -> int:
+        day = TimeTools.timedelta(TimeTools.us_time_now(), days=-days)
+        return int(TimeTools.date_to_ymd(day, join=False))
+
+    @classmethod
+    def _ts_before(cls, days: int) -> int:
+        return int(TimeTools.timedelta(TimeTools.us_time_now(), days=-days).timestamp())
+
+    def policies(self) -> list[RetentionPolicy]:
+        var = self.variable
+        now = int(TimeTools.us_time_now().timestamp())
+        policies = [
+            RetentionPolicy(table='temp_base_price', condition='`expiry_time` < ?', params=(now, )),
+        ]
+        if days := var.db_retention_order_days:
+            policies.append(
+                RetentionPolicy(table='orders', condition='`create_time` < ?', params=(self._ts_before(days), )),
+            )
+        if days := var.db_retention_quote_history_days:
+            day = self._ymd_before(days)
+            policies.append(RetentionPolicy(table='daily_candle', condition='`day` < ?', params=(day, )))
+            # 旧的最高价/最低价历史表已经合并到日线表, 这里只清理迁移后残留的数据
+            policies.append(RetentionPolicy(table='quote_low_history', condition='`day` < ?', params=(day, )))
+            policies.append(RetentionPolicy(table='quote_high_history', condition='`day` < ?', params=(day, )))
+        if days := var.db_retention_alarm_days:
+            # 仍处于告警中的记录需要保留, 否则恢复时不会发出解除告警的通知
+            policies.append(
+                RetentionPolicy(
+                    table='alarm',
+                    condition='`is_set` = 0 AND `update_time` < ?',
+                    params=(self._ts_before(days), ),
+                ),
+            )
+        return policies
+
+    def _transaction(self, statements: list[tuple[str, tuple]]) -> int:
+        db = self.db
+        con = db.conn
+        count = 0
+        with db.write_lock(), con:
+            con.execute('BEGIN IMMEDIATE;')
+            try:
+                for sql, params in statements:
+                    count += con.execute(sql, params).rowcount
+                con.execute('COMMIT;')
+            except Exception as e:
+                con.execute('ROLLBACK;')
+                raise e
+        return count
+
+    def _delete_ids(self, table: str, ids: list[int]) -> int:
+        count = 0
+        for idx in range(0, len(ids), self.BATCH_ROWS):
+            batch = ids[idx:idx + self.BATCH_ROWS]
+            marks = ', '.join('?' for _ in batch)
+            count += self._transaction([(f'DELETE FROM `{table}` WHERE `id` IN ({marks});', tuple(batch))])
+            time.sleep(self.BATCH_PAUSE)
+        return count
+
+    def prune(self, policy: RetentionPolicy) -> int:
+        """
+        每批最多删除 BATCH_ROWS 行, 批次之间释放写锁
+        """
+        sql = f'DELETE FROM `{policy.table}` WHERE `id` IN ' \
+              f'(SELECT `id` FROM `{policy.table}` WHERE {policy.condition} LIMIT ?);'
+        count = 0
+        while True:
+            deleted = self._transaction([(sql, policy.params + (self.BATCH_ROWS, ))])
+            count += deleted
+            if deleted < self.BATCH_ROWS:
+                return count
+            time.sleep(self.BATCH_PAUSE)
+
+    def compact_state_blob(self, days: int) -> int:
+        """
+        早于 days 天的持仓状态存档, 每个持仓每天只保留最后保存的版本和 state_archive 指向的版本,
+        保留的版本先改写为完整快照, 再删除同一天的其他版本
+        """
+        con = self.db.conn
+        with con:
+            cur = con.cursor()
+            cur.execute(
+                'SELECT `symbol`, `day` FROM `state_blob` WHERE `day` < ? '
+                'GROUP BY `symbol`, `day` HAVING COUNT(*) > 1;',
+                (self._ymd_before(days), ),
+            )
+            groups = cur.fetchall()
+        count = 0
+        for symbol, day in groups:
+            count += self._compact_state_day(con=con, symbol=symbol, day=day)
+        return count
+
+    def _compact_state_day(self, con: sqlite3.Connection, symbol: str, day: int) -> int:
+        with con:
+            cur = con.cursor()
+            cur.execute(
+                'SELECT `id`, `hash`, `base_hash` FROM `state_blob` WHERE `symbol` = ? AND `day` = ? ORDER BY `id`;',
+                (symbol, day, ),
+            )
+            rows = cur.fetchall()
+            cur.execute(
+                'SELECT `content_hash` FROM `state_archive` WHERE `symbol` = ? AND `day` = ? AND `content_hash` IS NOT NULL;',
+                (symbol, day, ),
+            )
+            keep = {row[0] for row in cur.fetchall()}
+        keep.add(rows[-1]['hash'])
+        statements = list()
+        for row in rows:
+            if row['hash'] not in keep or row['base_hash'] is None:
+                continue
+            text = StateBlobRow.rebuild(con=con, content_hash=row['hash'])
+            if text is None:
+                continue
+            statements.append((
+                'UPDATE `state_blob` SET `base_hash` = NULL, `chain` = 0, `content` = ? WHERE `id` = ?;',
+                (zlib.compress(text.encode('utf8')), row['id'], ),
+            ))
+        if statements:
+            self._transaction(statements)
+        ids = [row['id'] for row in rows if row['hash'] not in keep]
+        return self._delete_ids(table='state_blob', ids=ids)
+
+    def used_bytes(self) -> int:
+        con = self.db.conn
+        with con:
+            page_size = con.execute('PRAGMA page_size;').fetchone()[0]
+            page_count = con.execute('PRAGMA page_count;').fetchone()[0]
+            freelist = con.execute('PRAGMA freelist_count;').fetchone()[0]
+        return (page_count - freelist) * page_size
+
+    def vacuum(self):
+        """
+        只有 auto_vacuum 为 INCREMENTAL 的数据库可以逐步归还空闲页, 旧数据库的空闲页会被后续写入复用
+        """
+        db = self.db
+        con = db.conn
+        with con:
+            mode = con.execute('PRAGMA auto_vacuum;').fetchone()[0]
+        if mode != 2:
+            return
+        while True:
+            with con:
+                freelist = con.execute('PRAGMA freelist_count;').fetchone()[0]
+            if not freelist:
+                break
+            with db.write_lock(), con:
+                con.execute(f'PRAGMA incremental_vacuum({self.VACUUM_PAGES});').fetchall()
+            time.sleep(self.BATCH_PAUSE)
+
+    def run_once(self):
+        var = self.variable
+        before = self.used_bytes()
+        count = 0
+        for policy in self.policies():
+            count += self.prune(policy)
+        if days := var.db_retention_state_days:
+            count += self.compact_state_blob(days=days)
+        self.vacuum()
+        self.total_rows += count
+        self.total_bytes += max(0, before - self.used_bytes())
+        self.total_times += 1
+        self.last_time = TimeTools.us_time_now().timestamp()
+
+    def run(self):
+        super(DbRetentionThread, self).run()
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                self.error_times += 1
+                traceback.print_exc()
+            time.sleep(self.variable.db_retention_interval)
+
+
+__all__ = [
+    'RetentionPolicy',
+    'DbRetentionThread',
+]
@@ -1,6 +1,5 @@
 import time
 import datetime
-import dataclasses
 import traceback
 from hodl.storage import *
 from hodl.broker import *
@@ -11,13 +10,6 @@ from hodl.tools import *
 
 
 class HtmlWriterThread(ThreadMixin):
-    class _EnhancedJSONEncoder:
-        @staticmethod
-        def default(o):
-            if dataclasses.is_dataclass(o):
-                return dataclasses.asdict(o)
-            raise TypeError
-
     @classmethod
     def _new_time(cls) -> str:
         return TimeTools.utc_now().strftime('%Y-%m-%dT%H:%M')
@@ -167,15 +159,29 @@ class HtmlWriterThread(ThreadMixin):
             if self.current_hash != new_hash and self.current_time != new_time:
                 self.current_time = new_time
                 if db:
-                    create_time = TimeTools.timedelta(TimeTools.us_time_now(tz='Asia/Shanghai'), days=-365)
-                    create_time = int(create_time.timestamp())
-                    self.recent_earnings = list(EarningRow.items_after_time(con=db.conn, create_time=create_time))
+                    begin_date = TimeTools.timedelta(TimeTools.us_time_now(tz='Asia/Shanghai'), days=-365)
+                    create_time = int(begin_date.timestamp())
+                    self.recent_earnings = list(
+                        EarningRow.items_after_time(con=db.conn, create_time=create_time, limit=20)
+                    )
+                    begin_month = int(begin_date.strftime('%Y%m'))
+                    monthly_earnings = EarningSummaryRow.items_after_month(con=db.conn, month=begin_month)
                 else:
                     self.recent_earnings = list()
-                self.earning_list = [self._earning_style(earning) for earning in self.recent_earnings[:20]]
+                    monthly_earnings = list()
+                self.earning_list = [self._earning_style(earning) for earning in self.recent_earnings]
                 self.earning_json = FormatTool.json_dumps(
-                    self.recent_earnings,
-                    default=HtmlWriterThread._EnhancedJSONEncoder.default,
+                    [
+                        dict(
+                            day=item.day,
+                            currency=item.currency,
+                            region=item.region,
+                            symbol=item.symbol,
+                            unit=item.unit,
+                            amount=item.amount,
+                        )
+                        for item in monthly_earnings
+                    ],
                 )
                 create_time = int(TimeTools.us_time_now().timestamp())
                 self.total_earning = [
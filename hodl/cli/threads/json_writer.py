@@ -1,6 +1,7 @@
 import os
 import time
 from hodl.exception_tools import *
+from hodl.file_writer import *
 from hodl.store import Store
 from hodl.thread_mixin import *
 from hodl.proxy import *
@@ -56,6 +57,7 @@ class JsonWriterThread(ThreadMixin):
                                 'hasAlertBot': store.bot.is_alive,
                                 'processTime': store.process_time,
                                 'cls': type(store).__name__,
+                                'profile': [report.to_dict() for report in store.runtime_state.profiler.report()],
                             },
                             'config': store.store_config.copy(),
                         })
@@ -68,7 +70,7 @@ class JsonWriterThread(ThreadMixin):
                 'items': items,
             }
             body = FormatTool.json_dumps(d, binary=True)
-            LocateTools.write_file(path, body, mode='wb')
+            FileWriterThread.write(path, body)
             self.total_write += len(body)
 
 
@@ -1,6 +1,7 @@
 from typing import Type
 from collections import defaultdict
 from hodl.thread_mixin import *
+from hodl.store_base import *
 from hodl.broker import *
 from hodl.proxy import *
 from hodl.state import *
@@ -18,6 +19,7 @@ class MarketStatusThread(ThreadMixin):
         self.latest_time = dict()
         self.vix_info = dict()
         self.broker_names = dict()
+        self.region_status: dict[str, dict[str, str]] = dict()
 
     def prepare(self):
         print(f'开启异步线程拉取市场状态')
@@ -37,6 +39,7 @@ class MarketStatusThread(ThreadMixin):
                     self.error_counter[broker_name] += 1
                 else:
                     self.ok_counter[broker_name] += 1
+                    self.wake_changed_regions(broker_name=broker_name, d=d)
                     self.latest_time[broker_name] = TimeTools.us_time_now(tz='UTC')
                     if vix := d.vix:
                         latest_vix = vix
@@ -44,6 +47,27 @@ class MarketStatusThread(ThreadMixin):
                     else:
                         self.vix_info[broker_name] = None
 
+    def wake_changed_regions(self, broker_name: str, d: BrokerMarketStatusResult):
+        """
+        市场状态变化时(例如开盘, 收盘), 立即唤醒对应市场的持仓线程
+        """
+        region_status = {
+            f'{trade_type}.{msr.get("region")}': msr.get('status')
+            for trade_type, rl in d.trade_type_items()
+            for msr in rl
+        }
+        last_status = self.region_status.get(broker_name)
+        self.region_status[broker_name] = region_status
+        if last_status is None:
+            return
+        regions = {
+            key.split('.', 1)[1]
+            for key, status in region_status.items()
+            if last_status.get(key) != status
+        }
+        for region in sorted(regions):
+            StoreBase.wake_stores(WakeEvent.MARKET, region=region)
+
     def primary_bar(self) -> list[BarElementDesc]:
         bar = list()
         broker_names = self.broker_names.copy()
@@ -0,0 +1,124 @@
+import time
+import traceback
+from typing import Type
+from hodl.thread_mixin import *
+from hodl.store import *
+from hodl.broker import *
+from hodl.proxy import *
+from hodl.tools import *
+
+
+class QuotePrefetchThread(ThreadMixin):
+    """
+    行情预拉取线程,
+    每一轮按行情券商汇总全部持仓的标的, 对支持批量行情(fetch_quotes)的券商只调用一次批量接口,
+    结果放入行情中心, 持仓线程在这一轮中直接读取, 不再各自请求券商的行情接口.
+    每个持仓只使用它的第一个行情券商, 这与持仓自己拉取行情时的顺序一致.
+    分组中没有任何持仓处于交易时段(包括盘前盘后)时, 这一组不做预拉取.
+    """
+
+    def __init__(self, stores: list[Store], hub: QuoteHub = None):
+        self.stores = stores
+        self.hub = hub or BrokerProxy.QUOTE_HUB
+        self.total_times = 0
+        self.total_quotes = 0
+        self.total_requests = 0
+        self.error_times = 0
+        self.invalid_times = 0
+
+    @property
+    def variable(self):
+        return HotReloadVariableTools.config()
+
+    def primary_bar(self) -> list[BarElementDesc]:
+        return [
+            BarElementDesc(
+                content=f'📦{self.total_quotes:,}',
+                tooltip=f'批量行情{self.total_times}轮, 调用批量接口{self.total_requests:,}次, '
+                        f'得到{self.total_quotes:,}个行情, 丢弃{self.invalid_times}个字段异常的行情, '
+                        f'失败{self.error_times}次',
+            ),
+        ]
+
+    @classmethod
+    def is_active(cls, store: Store) -> bool:
+        """
+        持仓是否需要行情: 市场状态处于交易中, 或者券商报告的盘前盘后交易状态, 或者交易日历中即将开盘;
+        休眠模式中的持仓不需要
+        """
+        state = store.state
+        if state.sleep_mode_active:
+            return False
+        market_status = state.market_status or ''
+        if 'TRADING' in market_status:
+            return True
+        if calendar := store.runtime_state.calendar:
+            return TradingSchedule.by_calendar(calendar).is_trading(TimeTools.utc_now(), forward_minutes=1)
+        return market_status != 'CLOSING'
+
+    def groups(
+            self,
+            active_only: bool = False,
+    ) -> dict[tuple[Type[BrokerApiBase], str, str], tuple[BrokerApiBase, dict[str, tuple]]]:
+        """
+        以(行情券商类型, 交易品种, 市场)分组, 每组包含用于调用批量接口的券商对象, 以及标的到行情中心键的映射,
+        active_only 时只包含需要行情的持仓
+        """
+        result = dict()
+        for store in self.stores:
+            proxy = store.broker_proxy
+            if proxy is None:
+                continue
+            if active_only and not self.is_active(store):
+                continue
+            candidates = proxy.quote_candidates()
+            if not candidates:
+                continue
+            broker, hub_key = candidates[0]
+            if not broker.batch_quote_enabled():
+                continue
+            store_config = store.store_config
+            group_key = (type(broker), store_config.trade_type, store_config.region, )
+            if group_key not in result:
+                result[group_key] = (broker, dict(), )
+            result[group_key][1][store_config.symbol] = hub_key
+        return result
+
+    def run_once(self):
+        for broker, symbols in self.groups(active_only=True).values():
+            try:
+                quotes = broker.fetch_quotes(list(symbols))
+                self.total_requests += 1
+            except Exception as e:
+                self.error_times += 1
+                traceback.print_exc()
+                continue
+            for symbol, quote in quotes.items():
+                if hub_key := symbols.get(symbol):
+                    if not BrokerProxy.is_valid_quote(quote):
+                        self.invalid_times += 1
+                        continue
+                    self.hub.put_prefetched(hub_key, quote)
+                    self.total_quotes += 1
+        self.total_times += 1
+
+    def run(self):
+        super(QuotePrefetchThread, self).run()
+        while True:
+            begin = time.time()
+            interval = self.variable.quote_prefetch_interval
+            if not interval:
+                # 配置热更新关闭了预拉取, 持仓线程恢复各自拉取行情
+                self.hub.prefetched.clear()
+                time.sleep(60.0)
+                continue
+            self.hub.prefetched.max_age = interval
+            try:
+                self.run_once()
+            except Exception as e:
+                self.error_times += 1
+                traceback.print_exc()
+            time.sleep(max(0.0, interval - (time.time() - begin)))
+
+
+__all__ = ['QuotePrefetchThread', ]
@@ -0,0 +1,124 @@
+import time
+import traceback
+from typing import Type
+from hodl.thread_mixin import *
+from hodl.store import *
+from hodl.store_base import *
+from hodl.broker import *
+from hodl.proxy import *
+from hodl.quote import *
+from hodl.tools import *
+
+
+class QuoteStreamThread(ThreadMixin):
+    """
+    推送行情线程,
+    按行情券商汇总全部持仓的标的, 对开启了推送行情(subscribe_quotes)的券商各建立一个订阅,
+    收到的行情经过字段检查后放入行情中心, 价格变化时提前唤醒对应标的的持仓线程, 字段异常的行情被丢弃.
+    和行情预拉取一样, 每个持仓只使用它的第一个行情券商.
+    订阅断开或者持仓的标的发生变化时, 下一轮重新订阅.
+    """
+
+    def __init__(self, stores: list[Store], hub: QuoteHub = None):
+        self.stores = stores
+        self.hub = hub or BrokerProxy.QUOTE_HUB
+        self.subscriptions: dict[tuple, tuple[frozenset, object]] = dict()
+        self.total_quotes = 0
+        self.wake_times = 0
+        self.subscribe_times = 0
+        self.error_times = 0
+        self.invalid_times = 0
+
+    @property
+    def variable(self):
+        return HotReloadVariableTools.config()
+
+    def primary_bar(self) -> list[BarElementDesc]:
+        alive = sum(1 for _, subscription in self.subscriptions.values() if subscription.alive)
+        return [
+            BarElementDesc(
+                content=f'📡{self.total_quotes:,}',
+                tooltip=f'推送订阅{len(self.subscriptions)}个, 可用{alive}个, 订阅{self.subscribe_times}次, '
+                        f'收到{self.total_quotes:,}个行情, 丢弃{self.invalid_times}个字段异常的行情, '
+                        f'唤醒持仓{self.wake_times:,}次, 失败{self.error_times}次',
+            ),
+        ]
+
+    def groups(self) -> dict[tuple[Type[BrokerApiBase], str, str], tuple[BrokerApiBase, dict[str, tuple]]]:
+        """
+        以(行情券商类型, 交易品种, 市场)分组, 每组包含用于订阅的券商对象, 以及标的到行情中心键的映射
+        """
+        result = dict()
+        for store in self.stores:
+            proxy = store.broker_proxy
+            if proxy is None:
+                continue
+            candidates = proxy.quote_candidates()
+            if not candidates:
+                continue
+            broker, hub_key = candidates[0]
+            if not broker.stream_quote_enabled():
+                continue
+            store_config = store.store_config
+            group_key = (type(broker), store_config.trade_type, store_config.region, )
+            if group_key not in result:
+                result[group_key] = (broker, dict(), )
+            result[group_key][1][store_config.symbol] = hub_key
+        return result
+
+    def on_quote(self, symbols: dict[str, tuple], quote: Quote):
+        hub_key = symbols.get(quote.symbol)
+        if hub_key is None:
+            return
+        if not BrokerProxy.is_valid_quote(quote):
+            self.invalid_times += 1
+            return
+        self.total_quotes += 1
+        if self.hub.put_streamed(hub_key, quote):
+            self.wake_times += StoreBase.wake_stores(WakeEvent.QUOTE, region=hub_key[2], symbol=quote.symbol)
+
+    def subscribe(self):
+        for group_key, (broker, symbols) in self.groups().items():
+            symbol_set = frozenset(symbols)
+            if item := self.subscriptions.get(group_key):
+                old_symbols, subscription = item
+                if old_symbols == symbol_set and subscription.alive:
+                    continue
+                subscription.close()
+                self.subscriptions.pop(group_key)
+            try:
+                subscription = broker.subscribe_quotes(
+                    list(symbols),
+                    callback=lambda quote, symbols=symbols: self.on_quote(symbols, quote),
+                )
+                self.subscriptions[group_key] = (symbol_set, subscription, )
+                self.subscribe_times += 1
+            except Exception as e:
+                self.error_times += 1
+                traceback.print_exc()
+
+    def close(self):
+        for _, subscription in self.subscriptions.values():
+            subscription.close()
+        self.subscriptions = dict()
+
+    def run(self):
+        super(QuoteStreamThread, self).run()
+        while True:
+            stale = self.variable.quote_stream_stale
+            if not stale:
+                # 配置热更新关闭了推送, 持仓线程恢复拉取行情
+                self.close()
+                self.hub.streamed.clear()
+                time.sleep(60.0)
+                continue
+            self.hub.streamed.max_age = stale
+            try:
+                self.subscribe()
+            except Exception as e:
+                self.error_times += 1
+                traceback.print_exc()
+            time.sleep(stale)
+
+
+__all__ = ['QuoteStreamThread', ]
@@ -6,8 +6,10 @@ import platform
 from threading import Thread
 from hodl.bot import *
 from hodl.storage import *
+from hodl.file_writer import *
 from hodl.store import *
 from hodl.quote_mixin import *
+from hodl.plan_calc import *
 from hodl.thread_mixin import *
 from hodl.broker import *
 from hodl.proxy import *
@@ -19,6 +21,9 @@ from hodl.cli.threads.ps_util import *
 from hodl.cli.threads.html_writer import *
 from hodl.cli.threads.json_writer import *
 from hodl.cli.threads.telegram import *
+from hodl.cli.threads.db_retention import *
+from hodl.cli.threads.quote_prefetch import *
+from hodl.cli.threads.quote_stream import *
 
 
 class Manager(ThreadMixin):
@@ -29,6 +34,10 @@ class Manager(ThreadMixin):
     JSON_THREAD: Thread = None
     CURRENCY_THREAD: Thread = None
     PSUTIL_THREAD: Thread = None
+    DB_RETENTION_THREAD: Thread = None
+    FILE_WRITER_THREAD: Thread = None
+    QUOTE_PREFETCH_THREAD: Thread = None
+    QUOTE_STREAM_THREAD: Thread = None
 
     def __init__(self, config_file: str = None):
         self.var = VariableTools(config_file=config_file)
@@ -77,6 +86,8 @@ class Manager(ThreadMixin):
                 if not os.path.exists(state_path):
                     continue
                 try:
+                    # 合并等待中的状态写入会用旧的状态重新创建文件, 必须先放弃
+                    FileWriterThread.discard(state_path)
                     os.remove(state_path)
                     rework_price = FormatTool.pretty_price(plan.rework_price, config=store.store_config)
                     store.bot.send_text(f'{state.full_name}套利后价格达到{rework_price}, 持仓状态数据被重置')
@@ -89,8 +100,17 @@ class Manager(ThreadMixin):
         bar = []
         if Manager.CONVERSATION_BOT:
             bar.append(BarElementDesc(content=f'🤖Telegram', tooltip=f'机器人可以对话或者报警'))
-        if Manager.DB:
-            bar.append(BarElementDesc(content=f'📼sqlite', tooltip=f'已启用数据库'))
+        if db := Manager.DB:
+            stats = db.lock_stats
+            mode = 'WAL' if db.wal_mode else '共享连接'
+            tooltip = f'已启用数据库({mode}), 连接数:{db.pool_size}, ' \
+                      f'锁等待{stats.times:,}次, ' \
+                      f'平均{FormatTool.adjust_precision(stats.avg_wait * 1000, 3)}ms, ' \
+                      f'最长{FormatTool.adjust_precision(stats.max_wait * 1000, 3)}ms'
+            bar.append(BarElementDesc(content=f'📼sqlite', tooltip=tooltip))
+        cache = PlanCalc.TABLE_CACHE
+        tooltip = f'下单表格缓存{cache.size}/{cache.capacity}个, 命中{cache.hits:,}次, 未命中{cache.misses:,}次'
+        bar.append(BarElementDesc(content=f'📐{FormatTool.factor_to_percent(cache.hit_rate)}', tooltip=tooltip))
         return bar
 
     def secondary_bar(self) -> list[BarElementDesc]:
@@ -101,9 +121,10 @@ class Manager(ThreadMixin):
         return bar
 
     @classmethod
-    def _extra_html(cls, template, rl):
+    def _extra_html(cls, template, rl, profiles=None):
         html = template.render(
             rl=rl,
+            profiles=profiles or list(),
             FMT=FormatTool,
             TT=TimeTools,
         )
@@ -112,7 +133,12 @@ class Manager(ThreadMixin):
     def extra_html(self) -> None | str:
         template = self.template
         rl = track_api_report()
-        return self._extra_html(template, rl)
+        profiles = [
+            (store.state.full_name, reports, )
+            for store in self.find_by_type(Store)
+            if (reports := store.runtime_state.profiler.report())
+        ]
+        return self._extra_html(template, rl, profiles)
 
     def run(self):
         super(Manager, self).run()
@@ -124,8 +150,18 @@ class Manager(ThreadMixin):
         db = None
         if path := var.db_path:
             print('准备数据库')
-            db = LocalDb(db_path=path)
+            db = LocalDb(db_path=path, wal_mode=var.db_wal_mode)
             Manager.DB = db
+            if var.db_write_behind:
+                print('启动数据库后写线程')
+                writer = WriteBehindQueue(
+                    db=db,
+                    flush_interval=var.db_write_behind_interval,
+                    flush_rows=var.db_write_behind_rows,
+                )
+                db.writer = writer
+                writer.prepare()
+                writer.start(name='dbWriter')
         if app := var.telegram_application():
             if chat_id := var.telegram_chat_id:
                 print('准备机器人')
@@ -135,6 +171,9 @@ class Manager(ThreadMixin):
                 ).start(
                     name='telegram',
                 )
+        file_writer = FileWriterThread()
+        file_writer.prepare()
+        Manager.FILE_WRITER_THREAD = file_writer.start(name='fileWriter')
         try:
             print('启动持仓线程')
             stores = [Store.factory(store_config=config, db=db, variable=var) for config in store_configs.values()]
@@ -149,9 +188,21 @@ class Manager(ThreadMixin):
         except Exception as e:
             print(f'初始化持仓线程异常: {e}')
             if db:
-                db.conn.close()
+                db.close()
             raise e
 
+        if var.quote_prefetch_interval:
+            prefetch_thread = QuotePrefetchThread(stores=stores)
+            if prefetch_thread.groups():
+                print('启动行情预拉取线程')
+                Manager.QUOTE_PREFETCH_THREAD = prefetch_thread.start(name='quotePrefetch')
+
+        if var.quote_stream_stale:
+            stream_thread = QuoteStreamThread(stores=stores)
+            if stream_thread.groups():
+                print('启动推送行情线程')
+                Manager.QUOTE_STREAM_THREAD = stream_thread.start(name='quoteStream')
+
         ms_proxy = MarketStatusProxy()
         if var.async_market_status:
             print('启动异步市场状态线程')
@@ -191,6 +242,10 @@ class Manager(ThreadMixin):
 
         Manager.PSUTIL_THREAD = PsUtilThread().start(name='psutil')
 
+        if db and var.db_retention_enable:
+            print('启动数据库清理线程')
+            Manager.DB_RETENTION_THREAD = DbRetentionThread(db=db).start(name='dbRetention')
+
         print('准备工作结束')
 
         while True:
@@ -217,6 +272,7 @@ class Manager(ThreadMixin):
                         current_config = store.runtime_state.store_config
                         if current_config != new_config:
                             store.runtime_state.store_config = new_config
+                            store.wake(WakeEvent.CONFIG)
                         store.runtime_state.variable = variable
                     store.runtime_state.sleep_secs = sleep_secs
                     QuoteMixin.change_cache_ttl(sleep_secs)
@@ -227,7 +283,7 @@ class Manager(ThreadMixin):
                     if thread.is_alive():
                         thread.join()
                 if db:
-                    db.conn.close()
+                    db.close()
                 return
             except ConfigReadError as e:
                 print(f'读取配置文件出错: {e}')
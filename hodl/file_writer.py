@@ -0,0 +1,176 @@
+import time
+import atexit
+import threading
+import traceback
+from typing import Callable
+from dataclasses import dataclass, field
+from hodl.thread_mixin import *
+from hodl.tools import *
+
+
+@dataclass
+class PendingFile:
+    path: str
+    text: str | bytes
+    fsync: bool = False
+    on_written: Callable[[str], None] = None
+    due_time: float = field(default=0.0)
+
+
+class FileWriterThread(ThreadMixin):
+    """
+    文件写入线程,
+    持仓线程和网页刷新线程只把文件内容交给写入线程, 文件总是先写入临时文件再原子替换;
+    同一个文件在最小间隔内的多次写入被合并为最后一次, 需要 fsync 的写入立即执行.
+    没有启动写入线程时, 写入在调用者的线程中同步完成.
+    """
+    INSTANCE: 'FileWriterThread' = None
+
+    def __init__(self, min_interval: float = None):
+        if min_interval is None:
+            min_interval = VariableTools().file_write_interval
+        assert min_interval >= 0
+        self.min_interval = min_interval
+        self.cond = threading.Condition()
+        self.pending: dict[str, PendingFile] = dict()
+        self.writing: set[str] = set()
+        self.last_write: dict[str, float] = dict()
+        self.total_writes = 0
+        self.total_coalesced = 0
+        self.total_fsync = 0
+        self.total_bytes = 0
+        self.error_times = 0
+
+    def primary_bar(self) -> list[BarElementDesc]:
+        with self.cond:
+            pending = len(self.pending)
+        return [
+            BarElementDesc(
+                content=f'📝{self.total_writes:,}',
+                tooltip=f'文件写入{self.total_writes:,}次/{FormatTool.number_to_size(self.total_bytes)}, '
+                        f'合并{self.total_coalesced:,}次, fsync{self.total_fsync:,}次, '
+                        f'待写入{pending}个, 失败{self.error_times}次',
+            ),
+        ]
+
+    @classmethod
+    def _write_file(cls, path: str, text: str | bytes, fsync: bool):
+        mode = 'wb' if isinstance(text, bytes) else 'w'
+        LocateTools.write_file(path, text, mode=mode, atomic=True, fsync=fsync)
+
+    @classmethod
+    def write(cls, path: str, text: str | bytes, fsync: bool = False, on_written: Callable[[str], None] = None):
+        """
+        on_written 在文件被替换后调用, 参数为文件路径
+        """
+        writer = cls.INSTANCE
+        if writer is None:
+            cls._write_file(path, text, fsync)
+            if on_written:
+                on_written(path)
+            return
+        writer.put(path=path, text=text, fsync=fsync, on_written=on_written)
+
+    @classmethod
+    def is_pending(cls, path: str) -> bool:
+        """
+        文件是否还有没写入的内容, 此时磁盘上的文件比内存中的旧
+        """
+        writer = cls.INSTANCE
+        if writer is None:
+            return False
+        with writer.cond:
+            return path in writer.pending or path in writer.writing
+
+    @classmethod
+    def discard(cls, path: str) -> bool:
+        """
+        放弃文件还没写入的内容, 文件正在写入时等待写入结束,
+        删除文件之前需要调用, 否则写入线程会用旧的内容重新创建文件. 返回是否放弃了待写入的内容
+        """
+        writer = cls.INSTANCE
+        if writer is None:
+            return False
+        with writer.cond:
+            item = writer.pending.pop(path, None)
+            while path in writer.writing:
+                writer.cond.wait(timeout=1.0)
+        return item is not None
+
+    def put(self, path: str, text: str | bytes, fsync: bool = False, on_written: Callable[[str], None] = None):
+        with self.cond:
+            item = self.pending.get(path)
+            if item:
+                self.total_coalesced += 1
+                item.text = text
+                item.fsync = item.fsync or fsync
+                item.on_written = on_written or item.on_written
+            else:
+                item = PendingFile(path=path, text=text, fsync=fsync, on_written=on_written)
+                item.due_time = self.last_write.get(path, 0.0) + self.min_interval
+                self.pending[path] = item
+            if item.fsync:
+                item.due_time = 0.0
+            self.cond.notify()
+
+    def _pop_due(self, now: float, force: bool = False) -> list[PendingFile]:
+        items = [item for item in self.pending.values() if force or item.due_time <= now]
+        for item in items:
+            del self.pending[item.path]
+            self.writing.add(item.path)
+        return items
+
+    def _write_items(self, items: list[PendingFile]):
+        for item in items:
+            try:
+                self._write_file(item.path, item.text, item.fsync)
+                self.total_writes += 1
+                self.total_bytes += len(item.text)
+                if item.fsync:
+                    self.total_fsync += 1
+                if item.on_written:
+                    item.on_written(item.path)
+                with self.cond:
+                    self.last_write[item.path] = time.time()
+                    self.writing.discard(item.path)
+                    self.cond.notify_all()
+            except Exception as e:
+                self.error_times += 1
+                traceback.print_exc()
+                with self.cond:
+                    self.writing.discard(item.path)
+                    self.cond.notify_all()
+                    if item.path not in self.pending:
+                        item.due_time = time.time() + max(self.min_interval, 1.0)
+                        self.pending[item.path] = item
+
+    def flush(self):
+        """
+        立即写入所有待写入的文件, 进程退出前调用
+        """
+        with self.cond:
+            items = self._pop_due(now=time.time(), force=True)
+        self._write_items(items)
+
+    def prepare(self):
+        FileWriterThread.INSTANCE = self
+        atexit.register(self.flush)
+
+    def run(self):
+        super(FileWriterThread, self).run()
+        while True:
+            with self.cond:
+                now = time.time()
+                items = self._pop_due(now=now)
+                if not items:
+                    due_times = [item.due_time for item in self.pending.values()]
+                    timeout = max(0.0, min(due_times) - now) if due_times else None
+                    self.cond.wait(timeout=timeout)
+                    continue
+            self._write_items(items)
+
+
+__all__ = [
+    'PendingFile',
+    'FileWriterThread',
+]
@@ -1,3 +1,6 @@
+import threading
+import numpy as np
+from collections import OrderedDict
 from dataclasses import dataclass
 from hodl.tools import FormatTool as FMT
 
@@ -9,7 +12,7 @@ class _Argument:
     buy_rate: list[float]
 
 
-@dataclass
+@dataclass(frozen=True)
 class ProfitRow:
     level: int
     # 计算出新市值，目前没什么用途
@@ -68,7 +71,56 @@ class ProfitTable(list[ProfitRow]):
             assert row.total_rate >= 1.0
 
 
+class ProfitTableCache:
+    """
+    计算好的下单表格的 LRU 缓存,
+    同样的因子, 基准价格, 股数和点差设置得到的表格是确定的, 持仓线程, 网页线程, 机器人对话之间可以共享.
+    缓存的表格被多处共享, 只能读取不能修改.
+    """
+    def __init__(self, capacity: int = 256):
+        assert capacity > 0
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.tables: OrderedDict[tuple, ProfitTable] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> ProfitTable | None:
+        with self.lock:
+            table = self.tables.get(key)
+            if table is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.tables.move_to_end(key)
+            return table
+
+    def put(self, key: tuple, table: ProfitTable):
+        with self.lock:
+            self.tables[key] = table
+            self.tables.move_to_end(key)
+            while len(self.tables) > self.capacity:
+                self.tables.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.tables)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
 class PlanCalc:
+    TABLE_CACHE = ProfitTableCache()
+
     def __init__(
             self,
             weight=None,
@@ -100,58 +152,173 @@ class PlanCalc:
             buy_spread_rate=None,
             sell_spread_rate=None,
     ) -> ProfitTable[ProfitRow]:
+        key = (
+            tuple(self.weight),
+            tuple(self.sell_rate),
+            tuple(self.buy_rate),
+            base_price,
+            max_shares,
+            base_asset,
+            buy_spread,
+            sell_spread,
+            precision,
+            shares_per_unit,
+            buy_spread_rate,
+            sell_spread_rate,
+        )
+        cache = PlanCalc.TABLE_CACHE
+        if (table := cache.get(key)) is not None:
+            return table
+        table = self._profit_rows(
+            base_price=base_price,
+            max_shares=max_shares,
+            base_asset=base_asset,
+            buy_spread=buy_spread,
+            sell_spread=sell_spread,
+            precision=precision,
+            shares_per_unit=shares_per_unit,
+            buy_spread_rate=buy_spread_rate,
+            sell_spread_rate=sell_spread_rate,
+        )
+        cache.put(key, table)
+        return table
+
+    def _profit_rows(
+            self,
+            base_price: float,
+            max_shares: int,
+            base_asset=1.0,
+            buy_spread=None,
+            sell_spread=None,
+            precision=2,
+            shares_per_unit=1,
+            buy_spread_rate=None,
+            sell_spread_rate=None,
+    ) -> ProfitTable[ProfitRow]:
+        return self.profit_rows_batch(
+            base_prices=np.array([base_price], dtype=np.float64),
+            max_shares=max_shares,
+            base_asset=base_asset,
+            buy_spread=buy_spread,
+            sell_spread=sell_spread,
+            precision=precision,
+            shares_per_unit=shares_per_unit,
+            buy_spread_rate=buy_spread_rate,
+            sell_spread_rate=sell_spread_rate,
+        )[0]
+
+    def _levels(
+            self,
+            max_shares: int,
+            base_asset: float,
+            precision: int,
+            shares_per_unit: int,
+    ) -> list[tuple[float, float, float, int]] | None:
+        """
+        与基准价格无关的部分: 每一档的市值, 获利比例和股数, 任意一档股数不足时返回 None.
+        各档的权重前缀和与卖出重心前缀和只计算一次, 由所有基准价格共用;
+        前缀和仍然使用 sum 计算, 因为 sum 对浮点数使用补偿求和, 逐项累加的结果在末位可能不同
+        """
         weight = list(self.weight)
         sell_rate = list(self.sell_rate)
         buy_rate = list(self.buy_rate)
-        result = ProfitTable()
-        result.table_row = self.table_size
+        weight_sum = sum(weight)
+        weight_prefix = [sum(weight[0:i + 1]) for i in range(self.table_size)]
+        sell_products = [weight[j] * sell_rate[j] for j in range(self.table_size)]
+        sell_cog_prefix = [sum(sell_products[0:i + 1]) for i in range(self.table_size)]
+        result = list()
         sum_shares = 0
         for i in range(self.table_size):
-            range_weight = weight[0:i + 1]
-
             # 平均卖出和买入的重心centre-of-gravity
-            sell_cog = sum(weight[j] * sell_rate[j] for j in range(i + 1))
-            buy_cog = sum(range_weight) * buy_rate[i]
+            sell_cog = sell_cog_prefix[i]
+            buy_cog = weight_prefix[i] * buy_rate[i]
 
             cog_diff = sell_cog - buy_cog
-            float_rate = cog_diff / sum(range_weight)
-            total_rate = cog_diff / sum(weight)
+            float_rate = cog_diff / weight_prefix[i]
+            total_rate = cog_diff / weight_sum
             value = base_asset * total_rate
-            sell_spread_points = FMT.spread(
-                price=base_price * sell_rate[i],
-                precision=precision,
-                spread=sell_spread,
-                spread_rate=sell_spread_rate,
-            )
-            buy_spread_points = FMT.spread(
-                price=base_price * buy_rate[i],
-                precision=precision,
-                spread=buy_spread,
-                spread_rate=buy_spread_rate,
-            )
-            sell_at = base_price * sell_rate[i] + sell_spread_points
-            buy_at = base_price * buy_rate[i] - buy_spread_points
 
             # 由于权重不能把全部股数整除的原因，下一档的股数要补上之前档位股数的余下部分，减少因为除不尽导致不能流动的股票份额
-            range_shares = int(max_shares * sum(range_weight) / sum(weight))
+            range_shares = int(max_shares * weight_prefix[i] / weight_sum)
             shares = range_shares - sum_shares
             shares = (shares // shares_per_unit) * shares_per_unit
             sum_shares += shares
             if shares <= 0:
-                return ProfitTable()
-            row = ProfitRow(
-                level=i+1,
-                value=FMT.adjust_precision(value, precision),
-                float_rate=FMT.adjust_precision(float_rate + 1, 6),
-                total_rate=FMT.adjust_precision(total_rate + 1, 6),
-                sell_at=FMT.adjust_precision(sell_at, precision),
-                buy_at=FMT.adjust_precision(buy_at, precision),
-                buy_spread=buy_spread_points,
-                sell_spread=sell_spread_points,
-                shares=shares,
-            )
-            result.append(row)
+                return None
+            result.append((
+                FMT.adjust_precision(value, precision),
+                FMT.adjust_precision(float_rate + 1, 6),
+                FMT.adjust_precision(total_rate + 1, 6),
+                shares,
+            ))
         return result
 
+    @classmethod
+    def _spread_matrix(cls, prices: np.ndarray, precision: int, spread, spread_rate) -> np.ndarray:
+        """
+        与 FormatTool.spread 的规则一致, 按比例计算的点差逐个价格按精度舍入
+        """
+        if isinstance(spread_rate, float):
+            points = np.abs(prices * spread_rate)
+            return np.array(
+                [FMT.adjust_precision(float(v), precision=precision) for v in points.flat],
+                dtype=np.float64,
+            ).reshape(prices.shape)
+        if isinstance(spread, float):
+            return np.full(prices.shape, FMT.adjust_precision(abs(spread), precision=precision), dtype=np.float64)
+        return np.zeros(prices.shape, dtype=np.float64)
+
+    def profit_rows_batch(
+            self,
+            base_prices: np.ndarray,
+            max_shares: int,
+            base_asset=1.0,
+            buy_spread=None,
+            sell_spread=None,
+            precision=2,
+            shares_per_unit=1,
+            buy_spread_rate=None,
+            sell_spread_rate=None,
+    ) -> list[ProfitTable[ProfitRow]]:
+        """
+        一次计算多个基准价格的下单表格, 结果与逐个调用 profit_rows 完全一致,
+        适用于假设分析和回测这类需要大量表格的场景.
+        """
+        prices = np.asarray(base_prices, dtype=np.float64).reshape(-1)
+        levels = self._levels(
+            max_shares=max_shares,
+            base_asset=base_asset,
+            precision=precision,
+            shares_per_unit=shares_per_unit,
+        )
+        if levels is None:
+            return [ProfitTable() for _ in range(len(prices))]
+        sell_prices = np.outer(prices, np.asarray(self.sell_rate, dtype=np.float64))
+        buy_prices = np.outer(prices, np.asarray(self.buy_rate, dtype=np.float64))
+        sell_spread_points = self._spread_matrix(sell_prices, precision, sell_spread, sell_spread_rate)
+        buy_spread_points = self._spread_matrix(buy_prices, precision, buy_spread, buy_spread_rate)
+        sell_at = (sell_prices + sell_spread_points).tolist()
+        buy_at = (buy_prices - buy_spread_points).tolist()
+        sell_spread_points = sell_spread_points.tolist()
+        buy_spread_points = buy_spread_points.tolist()
+        tables = list()
+        for idx in range(len(prices)):
+            table = ProfitTable()
+            table.table_row = self.table_size
+            for i, (value, float_rate, total_rate, shares) in enumerate(levels):
+                table.append(ProfitRow(
+                    level=i + 1,
+                    value=value,
+                    float_rate=float_rate,
+                    total_rate=total_rate,
+                    sell_at=FMT.adjust_precision(sell_at[idx][i], precision),
+                    buy_at=FMT.adjust_precision(buy_at[idx][i], precision),
+                    buy_spread=buy_spread_points[idx][i],
+                    sell_spread=sell_spread_points[idx][i],
+                    shares=shares,
+                ))
+            tables.append(table)
+        return tables
+
 
-__all__ = ['PlanCalc', 'ProfitTable', 'ProfitRow', ]
+__all__ = ['PlanCalc', 'ProfitTable', 'ProfitRow', 'ProfitTableCache', ]
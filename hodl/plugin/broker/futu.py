@@ -41,6 +41,10 @@ class FutuApi(HttpTradingBase):
     def fetch_quote(self) -> Quote:
         return super().fetch_quote()
 
+    @track_api
+    def fetch_quotes(self, symbols: list[str]) -> dict[str, Quote]:
+        return super().fetch_quotes(symbols)
+
     @track_api
     def query_cash(self):
         return super().query_cash()
@@ -61,5 +65,9 @@ class FutuApi(HttpTradingBase):
     def refresh_order(self, order: Order):
         super().refresh_order(order=order)
 
+    @track_api
+    def refresh_orders(self, orders: list[Order]) -> list[Order]:
+        return super().refresh_orders(orders=orders)
+
 
 __all__ = ['FutuApi', ]
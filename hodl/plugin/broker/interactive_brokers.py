@@ -37,5 +37,9 @@ class InteractiveBrokersApi(HttpTradingBase):
     def refresh_order(self, order: Order):
         super().refresh_order(order=order)
 
+    @track_api
+    def refresh_orders(self, orders: list[Order]) -> list[Order]:
+        return super().refresh_orders(orders=orders)
+
 
 __all__ = ['InteractiveBrokersApi', ]
@@ -1,6 +1,7 @@
 from hodl.bot import *
 from hodl.store_base import *
 from hodl.thread_mixin import *
+from hodl.tools import *
 
 
 @bot_cmd(
@@ -36,6 +37,7 @@ class KillStore(SimpleTelegramConversation):
 
             with store.thread_lock():
                 store.thread_version += 1
+            store.wake(WakeEvent.CONFIG)
             store.kill()
 
             await self.reply_text(
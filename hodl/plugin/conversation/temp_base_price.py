@@ -1,5 +1,6 @@
 from hodl.storage import *
 from hodl.bot import *
+from hodl.store_base import *
 from hodl.tools import *
 
 
@@ -66,6 +67,7 @@ class TempBasePrice(SingleInputConversation):
                 update_time=ts,
             )
             row.save(con=self.DB.conn)
+            StoreBase.wake_stores(WakeEvent.CONFIG, broker=position.config.broker, symbol=symbol)
             await self.reply_text(
                 update,
                 f'改动完成',
@@ -1,4 +1,5 @@
 from hodl.proxy.asyncio_proxy import *
+from hodl.proxy.quote_hub import *
 from hodl.proxy.broker_proxy import *
 from hodl.proxy.currency_proxy import *
 from hodl.proxy.market_status_proxy import *
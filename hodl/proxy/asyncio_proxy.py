@@ -52,7 +52,8 @@ class AsyncioProxyThread(ThreadMixin):
         if thread is not None and cls.instance().ready.is_set():
             return
         with lock:
-            if thread is None:
+            # 多个线程同时首次调用时, 只能创建一个事件循环线程
+            if AsyncioProxyThread.THREAD is None:
                 thread = AsyncioProxyThread().start(name='asyncioProxy')
                 AsyncioProxyThread.THREAD = thread
             cls.instance().ready.wait()
@@ -1,5 +1,6 @@
-from expiringdict import ExpiringDict
 from hodl.broker import *
+from hodl.quote import *
+from hodl.proxy.quote_hub import *
 from hodl.state import *
 from hodl.exception_tools import *
 
@@ -14,10 +15,32 @@ class BrokerProxy(BrokerApiMixin):
     市场状态需要定时统一一次性全部broker触发拉取，按Broker种类汇总保存到 MARKET_STATUS
     特定持仓需要市场状态时，根据broker顺序列表从 MARKET_STATUS 尝试取特定交易品种特定region的状态
     """
-    _QUOTE_CACHE = ExpiringDict(max_len=2024, max_age_seconds=2)
-
-    def _query_quote(self):
-        exc = None
+    QUOTE_HUB = QuoteHub()
+
+    @classmethod
+    def is_valid_quote(cls, quote: Quote) -> bool:
+        """
+        行情的价格字段必须都是浮点数, 预拉取和推送的行情进入行情中心之前也需要经过这个检查
+        """
+        return all(isinstance(v, float) for v in (
+            quote.pre_close,
+            quote.latest_price,
+            quote.day_high,
+            quote.day_low,
+            quote.open,
+        ))
+
+    @classmethod
+    def _fetch_quote(cls, broker: BrokerApiBase):
+        quote = broker.fetch_quote()
+        assert cls.is_valid_quote(quote)
+        return quote
+
+    def quote_candidates(self) -> list[tuple[BrokerApiBase, tuple]]:
+        """
+        按顺序列出可以为持仓提供行情的券商, 以及行情中心使用的键
+        """
+        result = list()
         store_config = self.store_config
         for broker in self.quote_brokers:
             for meta in broker.broker_meta:
@@ -27,23 +50,27 @@ class BrokerProxy(BrokerApiMixin):
                     continue
                 if store_config.region not in meta.quote_regions:
                     continue
-                cache_key = (store_config.broker, store_config.trade_type, store_config.symbol, )
-                if store_config.using_cached_quote:
-                    if cache_quote := BrokerProxy._QUOTE_CACHE.get(cache_key, None):
-                        return cache_quote
-                try:
-                    quote = broker.fetch_quote()
-                    assert isinstance(quote.pre_close, float)
-                    assert isinstance(quote.latest_price, float)
-                    assert isinstance(quote.day_high, float)
-                    assert isinstance(quote.day_low, float)
-                    assert isinstance(quote.open, float)
-                except Exception as e:
-                    quote = None
-                    exc = e
-                if quote:
-                    BrokerProxy._QUOTE_CACHE[cache_key] = quote
-                    return quote
+                # 以行情券商为键, 能走到这里的持仓要么就是这个券商的持仓, 要么这个券商允许共享行情
+                hub_key = (broker.BROKER_NAME, store_config.trade_type, store_config.region, store_config.symbol, )
+                result.append((broker, hub_key, ))
+        return result
+
+    def _query_quote(self):
+        exc = None
+        store_config = self.store_config
+        for broker, hub_key in self.quote_candidates():
+            try:
+                quote = BrokerProxy.QUOTE_HUB.fetch(
+                    api_type=type(broker),
+                    key=hub_key,
+                    func=lambda: self._fetch_quote(broker),
+                    using_cache=store_config.using_cached_quote,
+                )
+            except Exception as e:
+                quote = None
+                exc = e
+            if quote:
+                return quote
         if exc:
             raise exc
         raise QuoteScheduleOver
@@ -67,6 +94,15 @@ class BrokerProxy(BrokerApiMixin):
         broker = self._find_trade_broker()
         return broker.refresh_order(order=order)
 
+    def refresh_orders(self, orders: list[Order]) -> list[Order]:
+        """
+        券商不支持批量订单接口时, 不更新任何订单
+        """
+        broker = self._find_trade_broker()
+        if not orders or not broker.batch_order_enabled():
+            return list()
+        return broker.refresh_orders(orders=orders)
+
     def query_chips(self, symbol=None) -> int:
         broker = self._find_trade_broker()
         chips = broker.query_chips(symbol=symbol)
@@ -129,7 +165,7 @@ class BrokerProxy(BrokerApiMixin):
         ]
         self.trade_brokers = brokers
         if var.quote_cache_ttl:
-            BrokerProxy._QUOTE_CACHE.max_age = var.quote_cache_ttl
+            BrokerProxy.QUOTE_HUB.cache.max_age = var.quote_cache_ttl
 
     def _find_trade_broker(self):
         broker_name = self.store_config.broker
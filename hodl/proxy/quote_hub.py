@@ -0,0 +1,117 @@
+import threading
+from typing import Callable, Type
+from expiringdict import ExpiringDict
+from hodl.broker import *
+from hodl.quote import *
+
+
+class _Flight:
+    __slots__ = ('event', 'quote', 'exc', )
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.quote: Quote = None
+        self.exc: Exception = None
+
+
+class QuoteHub:
+    """
+    按标的汇总的行情中心,
+    以(行情券商, 交易品种, 市场, 标的)为键, 多个持仓同时请求同一份行情时, 只有第一个请求真正调用券商接口,
+    其余请求等待这次调用的结果(成功的行情或者异常), 不会同时打到券商接口上.
+    成功的行情会缓存 max_age 秒, 持仓配置了 using_cached_quote 时可以直接使用缓存.
+    行情预拉取线程批量拉取的行情在 prefetch_age 秒内总是优先使用, 它们就是这一轮为持仓准备的行情.
+    推送行情的优先级最高, 但是超过 stream_age 秒没有新的推送就视为过期, 回到拉取行情的方式.
+    行情券商是否允许共享给其他交易券商的持仓, 由调用方根据 share_quote 决定.
+    """
+
+    def __init__(
+            self,
+            max_len: int = 2024,
+            max_age: float = 2.0,
+            prefetch_age: float = 2.0,
+            stream_age: float = 5.0,
+    ):
+        self.lock = threading.Lock()
+        self.cache = ExpiringDict(max_len=max_len, max_age_seconds=max_age)
+        self.prefetched = ExpiringDict(max_len=max_len, max_age_seconds=prefetch_age)
+        self.streamed = ExpiringDict(max_len=max_len, max_age_seconds=stream_age)
+        self.flights: dict[tuple, _Flight] = dict()
+        self.hit_times = 0
+        self.miss_times = 0
+        self.coalesce_times = 0
+        self.stream_times = 0
+
+    def fetch(
+            self,
+            api_type: Type[BrokerApiBase],
+            key: tuple,
+            func: Callable[[], Quote],
+            using_cache: bool = False,
+    ) -> Quote:
+        with self.lock:
+            quote = self.streamed.get(key, None)
+            if quote is not None:
+                self.stream_times += 1
+            else:
+                quote = self.prefetched.get(key, None)
+            if quote is None and using_cache:
+                quote = self.cache.get(key, None)
+            if quote:
+                self.hit_times += 1
+                track_api_saved(api_type=api_type, api_name='fetch_quote')
+                return quote
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self.flights[key] = flight
+                self.miss_times += 1
+            else:
+                self.coalesce_times += 1
+        if not leader:
+            track_api_saved(api_type=api_type, api_name='fetch_quote', coalesce=True)
+            flight.event.wait()
+            if flight.exc is not None:
+                raise flight.exc
+            return flight.quote
+
+        try:
+            quote = func()
+            flight.quote = quote
+            with self.lock:
+                self.cache[key] = quote
+            return quote
+        except Exception as e:
+            flight.exc = e
+            raise e
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.event.set()
+
+    def put_prefetched(self, key: tuple, quote: Quote):
+        with self.lock:
+            self.prefetched[key] = quote
+            self.cache[key] = quote
+
+    def put_streamed(self, key: tuple, quote: Quote) -> bool:
+        """
+        放入一个推送行情, 返回最新价格相比上一个没有过期的推送行情是否发生了变化
+        """
+        with self.lock:
+            last: Quote = self.streamed.get(key, None)
+            self.streamed[key] = quote
+            self.cache[key] = quote
+            return last is None or last.latest_price != quote.latest_price
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.prefetched.clear()
+            self.streamed.clear()
+
+
+__all__ = [
+    'QuoteHub',
+]
@@ -1,9 +1,69 @@
 from hodl.state import *
+from hodl.state.state_plan import OrderIndex
 from hodl.tools import TimeTools, StoreConfig
 from hodl.exception_tools import *
 from hodl.tools import FormatTool as FMT
 
 
+class RiskLedger:
+    """
+    持仓的风控账本,
+    记录当天提交过的订单, 包括已经不在当前计划中的订单(比如买回后计划被归档), 用于统计当日下单次数以及发现重复的订单,
+    同一个持仓线程的多次循环共用一个账本, 计划中的订单只在订单汇总索引重建(订单被提交或者更新)时同步一次.
+    跨日后当天的记录被清除.
+    """
+    def __init__(self, region: str = None):
+        self.region = region
+        self.day: str = None
+        self.orders: dict[str, Order] = dict()
+        # 防止在重复的状态版本下重复的订单level和重复的订单方向
+        self.level_dict: dict[tuple[str, str, int], Order] = dict()
+        self._index = None
+
+    def _today(self, region: str = None) -> str:
+        region = region or self.region
+        tz = TimeTools.region_to_tz(region=region) if region else None
+        return TimeTools.us_day_now(tz=tz)
+
+    def rollover(self, region: str = None):
+        today = self._today(region)
+        if self.day != today:
+            self.day = today
+            self.orders = dict()
+            self.level_dict = dict()
+            self._index = None
+
+    def sync(self, plan: Plan):
+        """
+        把计划中今天的订单加入账本, 订单汇总索引没有变化时直接跳过
+        """
+        index = plan.order_index()
+        if self.region is None and index.days:
+            self.region = next(iter(index.days))
+        self.rollover()
+        if index is self._index:
+            return
+        self._index = index
+        for order in index.orders:
+            if order.order_day == self.day:
+                self.orders[order.unique_id] = order
+
+    def record(self, order: Order, version: str):
+        if order.unique_id in self.orders:
+            raise RiskControlError(f'订单uniqueId:{order.unique_id}重复出现')
+        self.orders[order.unique_id] = order
+        level_key = version, order.direction, order.level
+        if duplicate_order := self.level_dict.get(level_key):
+            if duplicate_order.has_error or duplicate_order.is_canceled:
+                self.level_dict[level_key] = order
+            else:
+                raise RiskControlError(f'状态版本{version} 订单{order}重复出现')
+
+    @property
+    def today_times(self) -> int:
+        return len(self.orders)
+
+
 class RiskControl:
     """
     检查分为两个入口
@@ -37,10 +97,6 @@ class RiskControl:
     市价单成交价格检查
     成交的市价单根据其保护限价(protect_price)比对, 判断是否按照错误价格进行了成交
     """
-    ORDER_DICT = dict()
-    # 记录运行时产生的订单, 作为检查来源, 防止在重复的状态版本下重复的订单level和重复的订单方向
-    ORDER_LEVEL_DICT: dict[tuple[str, str, int], Order] = dict()
-
     def __init__(
             self,
             store_config: StoreConfig,
@@ -50,6 +106,7 @@ class RiskControl:
             latest_price: float,
             max_shares: int,
             order_checked: bool,
+            ledger: RiskLedger = None,
     ):
         assert max_shares > 0
         assert margin_amount >= 0.0
@@ -59,33 +116,18 @@ class RiskControl:
         self.latest_price = latest_price
         self.store_config = store_config
         self.margin_amount = margin_amount
+        if ledger is None:
+            ledger = RiskLedger(region=store_config.region)
+        self.ledger = ledger
 
         if self.state.market_status == 'TRADING':
             self.when_trading()
         if self.state.market_status == 'CLOSING':
             self.when_closing(order_checked=order_checked)
-        for order in state.plan.orders:
-            RiskControl.ORDER_DICT[order.unique_id] = order
+        ledger.sync(state.plan)
         self.market_order_check()
         self.order_qty_check()
 
-    @classmethod
-    def _increase_times(cls, order: Order, state: State):
-        if order.unique_id in RiskControl.ORDER_DICT:
-            raise RiskControlError(f'订单uniqueId:{order.unique_id}重复出现')
-        RiskControl.ORDER_DICT[order.unique_id] = order
-        level_key = state.version, order.direction, order.level
-        if duplicate_order := RiskControl.ORDER_LEVEL_DICT.get(level_key):
-            if duplicate_order.has_error or duplicate_order.is_canceled:
-                RiskControl.ORDER_LEVEL_DICT[level_key] = order
-            else:
-                raise RiskControlError(f'状态版本{state.version} 订单{order}重复出现')
-
-    @classmethod
-    def today_order_times_by_symbol(cls, symbol: str) -> int:
-        orders = [order for order in RiskControl.ORDER_DICT.values() if order.is_today and order.symbol == symbol]
-        return len(orders)
-
     def _cash_balance_check(self, order: Order):
         if not order.is_buy:
             return
@@ -102,7 +144,9 @@ class RiskControl:
         if order.order_day != us_day:
             raise RiskControlError(f'下单日期({order.order_day}不是当天{us_day}')
 
-        times = self.today_order_times_by_symbol(symbol=order.symbol)
+        ledger = self.ledger
+        ledger.sync(self.state.plan)
+        times = ledger.today_times
         if times == 0:
             quote_time = self.state.quote_time
             chip_day = self.state.chip_day
@@ -113,11 +157,11 @@ class RiskControl:
                 raise RiskControlError(f'每日持仓检查日期({chip_day}不是当天{us_day}')
             if cash_day != us_day:
                 raise RiskControlError(f'每日现金检查日期({cash_day}不是当天{us_day}')
-            orders = self.state.plan.orders
+            index = self.state.plan.order_index()
             chip_count = self.state.chip_count
             cash_amount = self.state.cash_amount + self.margin_amount
-            total_sell = sum(order.filled_qty for order in orders if order.is_sell)
-            total_buy = sum(order.filled_qty for order in orders if order.is_buy)
+            total_sell = index.sell_filled_qty
+            total_buy = index.buy_filled_qty
             if self.store_config.lock_position:
                 base_chip_count = chip_count
                 if self.max_shares != base_chip_count + total_sell - total_buy:
@@ -151,57 +195,48 @@ class RiskControl:
         if times >= order_day_times_limit:
             raise RiskControlError(f'当日({us_day})订单数量达到上限{times}')
 
-    def _total_sell_check(self, order: Order, orders: list[Order]):
+    @classmethod
+    def _order_exposure(cls, order: Order) -> int:
+        """
+        今天活跃订单统计最大成交数量, 其他订单统计实际成交部分
+        """
+        if order.is_waiting_filling:
+            return order.qty
+        return order.filled_qty
+
+    def _total_sell_check(self, order: Order, index: OrderIndex):
         """
-        非今天的订单统计实际成交部分
-        今天非活跃订单统计实际成交部分
-        今天活跃订单统计最大成交数量
+        已有订单的总卖量来自订单汇总索引, 再加上待提交订单的最大成交数量
         :param order:
-        :param orders:
+        :param index:
         :return:
         """
-        total = 0
-        for order in orders + [order, ]:
-            if not order.is_sell:
-                continue
-            if not order.is_today:
-                total += order.filled_qty
-            if order.is_today and order.is_waiting_filling:
-                total += order.qty
-            if order.is_today and not order.is_waiting_filling:
-                total += order.filled_qty
+        total = index.sell_exposure
+        if order.is_sell:
+            total += self._order_exposure(order)
         if total > self.max_shares:
             raise RiskControlError(f'总卖量({total})超出设定值{self.max_shares}')
         return total
 
-    def _total_buy_check(self, order: Order, orders: list[Order]):
+    def _total_buy_check(self, order: Order, index: OrderIndex):
         """
-        非今天的订单统计实际成交部分
-        今天非活跃订单统计实际成交部分
-        今天活跃订单统计最大成交数量
+        已有订单的总买量来自订单汇总索引, 再加上待提交订单的最大成交数量
         :param order:
-        :param orders:
+        :param index:
         :return:
         """
-        total = 0
-        for order in orders + [order, ]:
-            if not order.is_buy:
-                continue
-            if not order.is_today:
-                total += order.filled_qty
-            if order.is_today and order.is_waiting_filling:
-                total += order.qty
-            if order.is_today and not order.is_waiting_filling:
-                total += order.filled_qty
+        total = index.buy_exposure
+        if order.is_buy:
+            total += self._order_exposure(order)
         if total > self.max_shares:
             raise RiskControlError(f'检查总买量({total})超出设定值{self.max_shares}')
         return total
 
     def place_order_check(self, order: Order, function):
-        orders = self.state.plan.orders
         self._order_day_times_check(order=order)
-        sell_total = self._total_sell_check(order=order, orders=orders)
-        buy_total = self._total_buy_check(order=order, orders=orders)
+        index = self.state.plan.order_index()
+        sell_total = self._total_sell_check(order=order, index=index)
+        buy_total = self._total_buy_check(order=order, index=index)
         diff = sell_total - buy_total
         if diff > self.max_shares:
             raise RiskControlError(f'检查总买卖量相对值差距过大: {diff}')
@@ -209,7 +244,7 @@ class RiskControl:
             raise RiskControlError(f'检查总买卖量出现了做空情形: {diff}')
         self._cash_balance_check(order=order)
         result = function()
-        self._increase_times(order=order, state=self.state)
+        self.ledger.record(order=order, version=self.state.version)
         self.state.reset_lsod()
         return result
 
@@ -273,4 +308,7 @@ class RiskControl:
                 raise RiskControlError(f'风控检查到订单{order}成交数量大于设定的数量')
 
 
-__all__ = ['RiskControl', ]
+__all__ = [
+    'RiskLedger',
+    'RiskControl',
+]
@@ -0,0 +1,160 @@
+import json
+import queue
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from hodl.tools import *
+
+
+class FakeQuoteStreamServer:
+    """
+    本地的 HttpTrading 推送行情替身, 用于测试和压测,
+    market/stream 以 SSE 的方式推送 publish 发布的行情, 没有行情时每 heartbeat 秒发送一次心跳注释;
+    market/quote 返回标的最新发布的行情, 用于验证推送过期后恢复拉取的情况.
+    disconnect 可以断开全部推送连接, 模拟推送中断.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, heartbeat: float = 1.0):
+        self.heartbeat = heartbeat
+        self.lock = threading.Lock()
+        self.clients: list[tuple[set[tuple[str, str]], queue.Queue]] = list()
+        self.latest: dict[tuple[str, str], dict] = dict()
+        self.stream_times = 0
+        self.quote_times = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_type())
+        self.server.daemon_threads = True
+        self.thread: threading.Thread = None
+
+    @property
+    def base_site(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    @property
+    def client_count(self) -> int:
+        with self.lock:
+            return len(self.clients)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fakeQuoteStream', daemon=True)
+        self.thread.start()
+        return self
+
+    def shutdown(self):
+        self.disconnect()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def publish(
+            self,
+            symbol: str,
+            price: float,
+            region: str = 'US',
+            pre_close: float = None,
+            is_tradable: bool = True,
+    ) -> int:
+        """
+        发布一个行情, 返回推送到的连接数量
+        """
+        pre_close = price if pre_close is None else pre_close
+        quote_d = {
+            'contract': {'tradeType': 'Securities', 'region': region, 'symbol': symbol},
+            'timestamp': int(TimeTools.get_utc().timestamp() * 1000),
+            'openPrice': pre_close,
+            'preClose': pre_close,
+            'latest': price,
+            'lowPrice': min(price, pre_close),
+            'highPrice': max(price, pre_close),
+            'isTradable': is_tradable,
+        }
+        count = 0
+        with self.lock:
+            self.latest[(region, symbol, )] = quote_d
+            for contracts, q in self.clients:
+                if (region, symbol, ) in contracts:
+                    q.put(quote_d)
+                    count += 1
+        return count
+
+    def disconnect(self):
+        with self.lock:
+            for _, q in self.clients:
+                q.put(None)
+
+    def _handler_type(self):
+        fake = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def _send_json(self, d: dict):
+                body = json.dumps(d).encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, contracts: set[tuple[str, str]]):
+                q = queue.Queue()
+                with fake.lock:
+                    fake.clients.append((contracts, q, ))
+                    fake.stream_times += 1
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Cache-Control', 'no-cache')
+                    self.end_headers()
+                    self.wfile.write(b': connected\n\n')
+                    self.wfile.flush()
+                    while True:
+                        try:
+                            quote_d = q.get(timeout=fake.heartbeat)
+                        except queue.Empty:
+                            self.wfile.write(b': ping\n\n')
+                            self.wfile.flush()
+                            continue
+                        if quote_d is None:
+                            break
+                        self.wfile.write(f'data: {json.dumps(quote_d)}\n\n'.encode('utf8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with fake.lock:
+                        fake.clients.remove((contracts, q, ))
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                if parts.path.endswith('/market/stream'):
+                    contracts = {
+                        tuple(contract.split('.', 1))
+                        for contract in query.get('symbols', '').split(',')
+                        if '.' in contract
+                    }
+                    self._stream(contracts)
+                elif parts.path.endswith('/market/quote'):
+                    with fake.lock:
+                        fake.quote_times += 1
+                        quote_d = fake.latest.get((query.get('region'), query.get('symbol'), ))
+                    if quote_d is None:
+                        self._send_json({'ex': f'没有{query.get("symbol")}的行情'})
+                    else:
+                        self._send_json({'quote': quote_d})
+                elif parts.path.endswith('/ping/state'):
+                    self._send_json({'pong': True})
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                pass
+
+        return _Handler
+
+
+__all__ = ['FakeQuoteStreamServer', ]
@@ -32,6 +32,10 @@ def sleep_mock(new_function):
     return basic_mock(TimeTools, 'sleep', side_effect=new_function)
 
 
+def wake_wait_mock(new_function):
+    return basic_mock(WakeEvent, 'wait', side_effect=new_function)
+
+
 def quote_mock(new_function):
     return basic_mock(QuoteMixin, '_query_quote', side_effect=new_function)
 
@@ -44,6 +48,10 @@ def refresh_order_mock(function):
     return basic_mock(StoreHodl, '_get_order', side_effect=function)
 
 
+def refresh_orders_mock(function):
+    return basic_mock(StoreHodl, '_get_orders', side_effect=function)
+
+
 def cancel_order_mock(function):
     return basic_mock(StoreHodl, '_cancel_order', side_effect=function)
 
@@ -76,6 +84,10 @@ def file_write_mock(function):
     return basic_mock(LocateTools, 'write_file', side_effect=function)
 
 
+def file_signature_mock(function):
+    return basic_mock(LocateTools, 'file_signature', side_effect=function)
+
+
 class SimulationStore(StoreHodl):
     ENABLE_LOG_ALIVE = False
     ENABLE_BROKER = False
@@ -168,6 +180,12 @@ class SimulationStore(StoreHodl):
     def refresh_fake_order(self, order: Order):
         pass
 
+    def refresh_fake_orders(self, orders: list[Order]) -> list[Order]:
+        """
+        模拟不支持批量订单接口的券商, 订单仍然逐个交给 refresh_fake_order 更新
+        """
+        return list()
+
     def before_loop(self):
         super(SimulationStore, self).before_loop()
         try:
@@ -240,10 +258,20 @@ class SimulationStore(StoreHodl):
     def read_file_mock(self, path: str):
         return self.files.get(path, None)
 
-    def write_file_mock(self, path: str, text: str):
+    def write_file_mock(self, path: str, text: str, **kwargs):
         assert isinstance(text, str)
         self.files[path] = text
 
+    def wake_wait_mock(self, secs: float, min_secs: float = 0.0) -> set[str]:
+        TimeTools.sleep(secs)
+        return set()
+
+    def file_signature_mock(self, path: str):
+        text = self.files.get(path, None)
+        if text is None:
+            return None
+        return hash(text), len(text),
+
     def set_up_earning(self):
         super(SimulationStore, self).set_up_earning()
         plan = self.state.plan
@@ -278,7 +306,7 @@ class SimulationStore(StoreHodl):
 
     def __enter__(self) -> Self:
         QuoteMixin.CACHE_MARKET_STATUS = False
-        RiskControl.ORDER_DICT = dict()
+        self.risk_ledger = RiskLedger(region=self.store_config.region)
         for mock in self.mocks:
             mock.start()
         return self
@@ -331,16 +359,19 @@ class SimulationBuilder:
             )
             mocks = [
                 sleep_mock(store.sleep_mock),
+                wake_wait_mock(store.wake_wait_mock),
                 now_mock(store.now_mock),
                 quote_mock(store.quote_mock),
                 market_status_mock(store.market_status_mock),
                 cancel_order_mock(store.cancel_fake_order),
                 submit_order_mock(store.create_fake_order),
                 refresh_order_mock(store.refresh_fake_order),
+                refresh_orders_mock(store.refresh_fake_orders),
                 chip_count_mock(store.current_chip_mock),
                 cash_amount_mock(lambda cls: cash_amount),
                 file_read_mock(store.read_file_mock),
                 file_write_mock(store.write_file_mock),
+                file_signature_mock(store.file_signature_mock),
                 margin_mock(lambda cls: margin_amount),
             ]
             if broker_currency:
@@ -458,15 +489,18 @@ class SimulationBuilder:
 __all__ = [
     'now_mock',
     'sleep_mock',
+    'wake_wait_mock',
     'quote_mock',
     'market_status_mock',
     'refresh_order_mock',
+    'refresh_orders_mock',
     'cancel_order_mock',
     'submit_order_mock',
     'cash_amount_mock',
     'chip_count_mock',
     'file_read_mock',
     'file_write_mock',
+    'file_signature_mock',
     'SimulationStore',
     'generate_quote',
     'generate_from_ticks',
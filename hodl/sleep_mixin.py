@@ -13,26 +13,34 @@ class SleepMixin(StoreHodlBase, ABC):
             time: datetime,
             forward_minutes: int = 0,
     ) -> bool:
-        for offset in range(forward_minutes + 1):
-            offset_time = TimeTools.timedelta(time, minutes=offset)
-            if calendar.is_trading_minute(offset_time):
-                return True
-        return False
+        return TradingSchedule.by_calendar(calendar).is_trading(time, forward_minutes=forward_minutes)
 
     def sleep(self):
+        """
+        按照持仓的状态计算最大的等待时间, 等待期间行情变化, 订单更新或者配置重载都会提前结束等待
+        """
         secs = self.runtime_state.sleep_secs
         calendar = self.runtime_state.calendar
         config, state, _ = self.args()
+        if not config.visible:
+            secs *= 4
         sleep_mode_active = False
         if config.sleep_mode and calendar and state.market_status != 'TRADING':
             utc_now = TimeTools.utc_now()
-            if not self.is_trading_minute(calendar=calendar, time=utc_now, forward_minutes=1):
-                secs *= 8
+            schedule = TradingSchedule.by_calendar(calendar)
+            if not schedule.is_trading(utc_now, forward_minutes=1):
+                # 等到下一次开盘前一分钟, 期间市场状态的变化仍然会提前唤醒持仓线程
+                limit = self.runtime_state.variable.sleep_mode_limit or secs * 8
+                until_open = schedule.seconds_until_open(utc_now)
+                if until_open is None:
+                    secs = max(secs, limit)
+                else:
+                    # 不可见持仓放大的间隔也不能越过开盘前一分钟
+                    open_secs = max(0.0, until_open - 60)
+                    secs = min(max(secs, min(open_secs, limit)), open_secs)
                 sleep_mode_active = True
-        if not config.visible:
-            secs *= 4
         self.state.sleep_mode_active = sleep_mode_active
-        TimeTools.sleep(secs)
+        self.runtime_state.wake_event.wait(secs, min_secs=self.runtime_state.variable.store_wake_interval)
 
 
 __all__ = ['SleepMixin', ]
@@ -1,9 +1,69 @@
 import re
+from functools import partial
 from hodl.tools import *
 from hodl.state.state_plan import Plan
 
 
 class State(dict):
+    """
+    持仓状态,
+    所有写入都经过 __setitem__ 等方法, 以及 Plan/Order 的 on_change 回调, 记录自上次保存之后哪些部分发生了改动,
+    保存状态时没有任何改动则不需要重新序列化.
+    """
+    SECTIONS = ('latestSnapshot', 'dailySnapshot', 'ta', 'plan', )
+    OTHER_SECTION = 'other'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._dirty: set[str] = set()
+
+    def mark_dirty(self, key: str):
+        self._dirty.add(key if key in State.SECTIONS else State.OTHER_SECTION)
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._dirty)
+
+    @property
+    def dirty_sections(self) -> set[str]:
+        return self._dirty.copy()
+
+    def clear_dirty(self):
+        self._dirty.clear()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.mark_dirty(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.mark_dirty(key)
+
+    def pop(self, key, *args):
+        self.mark_dirty(key)
+        return super().pop(key, *args)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.mark_dirty(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.mark_dirty(key)
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        d = dict(*args, **kwargs)
+        super().update(d)
+        for key in d:
+            self.mark_dirty(key)
+
+    def clear(self):
+        for key in self:
+            self.mark_dirty(key)
+        super().clear()
+
     @classmethod
     def new(cls, d: dict = None):
         if d:
@@ -27,7 +87,16 @@ class State(dict):
 
     @property
     def plan(self):
-        return Plan(self.get('plan'))
+        """
+        同一个计划字典复用同一个 Plan 对象, 以便保留订单的汇总索引
+        """
+        d = self.get('plan')
+        plan: Plan = getattr(self, '_plan', None)
+        if d is None or plan is None or plan.d is not d:
+            plan = Plan(d, on_change=partial(self.mark_dirty, 'plan'))
+            if d is not None:
+                self._plan = plan
+        return plan
 
     @property
     def template_plan(self):
@@ -64,7 +64,7 @@ class Order(DictWrapper):
             protect_price: float = None,
     ) -> 'Order':
         o = Order()
-        now = TimeTools.us_time_now()
+        now = TimeTools.clock_time_now()
         if create_timestamp is None:
             create_timestamp = FormatTool.adjust_precision(now.timestamp(), precision=3)
         if order_day is None:
@@ -96,7 +96,7 @@ class Order(DictWrapper):
 
     @symbol.setter
     def symbol(self, v: str):
-        self.d['symbol'] = v
+        self._set('symbol', v)
 
     @property
     def region(self):
@@ -104,7 +104,7 @@ class Order(DictWrapper):
 
     @region.setter
     def region(self, v):
-        self.d['region'] = v
+        self._set('region', v)
 
     @property
     def broker(self):
@@ -112,7 +112,7 @@ class Order(DictWrapper):
 
     @broker.setter
     def broker(self, v):
-        self.d['broker'] = v
+        self._set('broker', v)
 
     @property
     def create_timestamp(self) -> float:
@@ -120,7 +120,7 @@ class Order(DictWrapper):
 
     @create_timestamp.setter
     def create_timestamp(self, v: float):
-        self.d['createTime'] = v
+        self._set('createTime', v)
 
     @property
     def level(self) -> int:
@@ -128,7 +128,7 @@ class Order(DictWrapper):
 
     @level.setter
     def level(self, v):
-        self.d['level'] = v
+        self._set('level', v)
 
     @property
     def order_day(self) -> str:
@@ -136,7 +136,7 @@ class Order(DictWrapper):
 
     @order_day.setter
     def order_day(self, v: str):
-        self.d['orderDay'] = v
+        self._set('orderDay', v)
 
     @property
     def direction(self) -> str:
@@ -144,7 +144,7 @@ class Order(DictWrapper):
 
     @direction.setter
     def direction(self, v):
-        self.d['direction'] = v
+        self._set('direction', v)
 
     @property
     def qty(self) -> int:
@@ -152,7 +152,7 @@ class Order(DictWrapper):
 
     @qty.setter
     def qty(self, v):
-        self.d['qty'] = v
+        self._set('qty', v)
 
     @property
     def limit_price(self) -> float:
@@ -170,7 +170,7 @@ class Order(DictWrapper):
         -------
 
         """
-        self.d['limitPrice'] = v
+        self._set('limitPrice', v)
 
     @property
     def spread(self) -> float:
@@ -185,7 +185,7 @@ class Order(DictWrapper):
 
     @config_spread.setter
     def config_spread(self, v: float):
-        self.d['configSpread'] = v
+        self._set('configSpread', v)
 
     @property
     def config_spread_rate(self) -> float:
@@ -193,7 +193,7 @@ class Order(DictWrapper):
 
     @config_spread_rate.setter
     def config_spread_rate(self, v: float):
-        self.d['configSpreadRate'] = v
+        self._set('configSpreadRate', v)
 
     @property
     def currency(self) -> str | None:
@@ -211,7 +211,7 @@ class Order(DictWrapper):
         -------
 
         """
-        self.d['currency'] = v
+        self._set('currency', v)
 
     @property
     def precision(self):
@@ -219,7 +219,7 @@ class Order(DictWrapper):
 
     @precision.setter
     def precision(self, v):
-        self.d['precision'] = v
+        self._set('precision', v)
 
     # 交易系统创建订单产生的字段
     @property
@@ -228,7 +228,7 @@ class Order(DictWrapper):
 
     @order_type.setter
     def order_type(self, v: str):
-        self.d['orderType'] = v
+        self._set('orderType', v)
 
     @property
     def order_id(self):
@@ -244,7 +244,7 @@ class Order(DictWrapper):
 
     @order_id.setter
     def order_id(self, v):
-        self.d['orderId'] = v
+        self._set('orderId', v)
 
     # 交易系统刷新的字段
     @property
@@ -253,7 +253,7 @@ class Order(DictWrapper):
 
     @error_reason.setter
     def error_reason(self, v: str):
-        self.d['errorReason'] = v
+        self._set('errorReason', v)
 
     @property
     def trade_timestamp(self) -> float:
@@ -261,7 +261,7 @@ class Order(DictWrapper):
 
     @trade_timestamp.setter
     def trade_timestamp(self, v):
-        self.d['tradeTimestamp'] = v
+        self._set('tradeTimestamp', v)
 
     @property
     def filled_qty(self) -> int:
@@ -269,7 +269,7 @@ class Order(DictWrapper):
 
     @filled_qty.setter
     def filled_qty(self, v):
-        self.d['filledQty'] = v
+        self._set('filledQty', v)
 
     @property
     def remain_qty(self) -> int:
@@ -277,7 +277,7 @@ class Order(DictWrapper):
 
     @remain_qty.setter
     def remain_qty(self, v):
-        self.d['remainQty'] = v
+        self._set('remainQty', v)
 
     @property
     def avg_price(self) -> float:
@@ -285,7 +285,7 @@ class Order(DictWrapper):
 
     @avg_price.setter
     def avg_price(self, v: float):
-        self.d['avgPrice'] = v
+        self._set('avgPrice', v)
 
     @property
     def is_canceled(self) -> bool:
@@ -293,7 +293,7 @@ class Order(DictWrapper):
 
     @is_canceled.setter
     def is_canceled(self, v: bool):
-        self.d['isCanceled'] = v
+        self._set('isCanceled', v)
 
     # 运行时计算的字段
     @property
@@ -346,7 +346,7 @@ class Order(DictWrapper):
 
     @protect_price.setter
     def protect_price(self, v: float):
-        self.d['protectPrice'] = v
+        self._set('protectPrice', v)
 
     @property
     def refreshable(self) -> bool:
@@ -1,8 +1,106 @@
+import threading
+from typing import Callable
 from hodl.state.state_order import Order
 from hodl.plan_calc import PlanCalc
 from hodl.tools import *
 
 
+class OrderIndex:
+    """
+    计划中全部订单的汇总,
+    一次遍历得到按方向, 档位, 是否今天分类的成交量, 待成交数量等统计, Plan 的各项查询直接读取结果.
+    订单是否属于今天取决于日期, 所以汇总时记录各个市场的当天日期, 跨日后汇总失效.
+    """
+    def __init__(self, orders: list[Order]):
+        self.orders = orders
+        self.days: dict[str, str] = dict()
+        self.sell_volume = 0
+        self.buy_volume = 0
+        self.sell_filled_value = 0.0
+        self.buy_filled_value = 0.0
+        self.today_count = 0
+        self.today_sell_count = 0
+        self.today_buy_filled = False
+        self.sell_waiting_count = 0
+        self.buy_waiting_count = 0
+        self.sell_waiting_qty = 0
+        self.buy_waiting_qty = 0
+        self.sell_filled_qty = 0
+        self.buy_filled_qty = 0
+        self.filled_before_today_count = 0
+        self.sell_level = 0
+        self.sell_level_filled = 0
+        self.sell_filled_by_level: dict[int, int] = dict()
+        self.today_buy_levels: set[int] = set()
+        self.latest_today_buy: Order | None = None
+        for order in orders:
+            self._add(order)
+
+    @classmethod
+    def _today(cls, region: str) -> str:
+        return TimeTools.us_day_now(tz=TimeTools.region_to_tz(region=region))
+
+    def is_current(self) -> bool:
+        return all(self._today(region) == day for region, day in self.days.items())
+
+    @property
+    def sell_exposure(self) -> int:
+        """
+        风控使用的总卖量: 今天待成交的订单按订单数量, 其他订单按成交数量
+        """
+        return self.sell_volume + self.sell_waiting_qty
+
+    @property
+    def buy_exposure(self) -> int:
+        """
+        风控使用的总买量: 今天待成交的订单按订单数量, 其他订单按成交数量
+        """
+        return self.buy_volume + self.buy_waiting_qty
+
+    def _add(self, order: Order):
+        region = order.region
+        if region not in self.days:
+            self.days[region] = self._today(region)
+        is_today = self.days[region] == order.order_day
+        is_sell, is_buy = order.is_sell, order.is_buy
+        is_filled = order.is_filled
+        is_waiting = is_today and not order.has_error and not order.is_canceled and not is_filled
+        if is_today:
+            self.today_count += 1
+        elif order.filled_qty:
+            self.filled_before_today_count += 1
+        if is_sell:
+            level = order.level
+            if not is_waiting:
+                self.sell_volume += order.filled_qty
+            self.sell_filled_qty += order.filled_qty
+            self.sell_filled_value += order.filled_value
+            self.sell_filled_by_level[level] = self.sell_filled_by_level.get(level, 0) + order.filled_qty
+            self.sell_level = max(self.sell_level, level)
+            if is_filled:
+                self.sell_level_filled = max(self.sell_level_filled, level)
+            if is_today:
+                self.today_sell_count += 1
+            if is_waiting:
+                self.sell_waiting_count += 1
+                self.sell_waiting_qty += order.qty
+        if is_buy:
+            if not is_waiting:
+                self.buy_volume += order.filled_qty
+            self.buy_filled_qty += order.filled_qty
+            self.buy_filled_value += order.filled_value
+            if is_waiting:
+                self.buy_waiting_count += 1
+                self.buy_waiting_qty += order.qty
+            if is_today:
+                self.today_buy_levels.add(order.level)
+                if is_filled:
+                    self.today_buy_filled = True
+                latest = self.latest_today_buy
+                if latest is None or order.create_timestamp > latest.create_timestamp:
+                    self.latest_today_buy = order
+
+
 class Plan(DictWrapper):
     """
     下单计划状态记录运行时的下单计划重要信息。
@@ -25,7 +123,7 @@ class Plan(DictWrapper):
 
     @base_price.setter
     def base_price(self, v: float):
-        self.d['basePrice'] = v
+        self._set('basePrice', v)
 
     @property
     def total_chips(self) -> int:
@@ -33,7 +131,7 @@ class Plan(DictWrapper):
 
     @total_chips.setter
     def total_chips(self, v: int):
-        self.d['totalChips'] = v
+        self._set('totalChips', v)
 
     @property
     def latest_order_day(self):
@@ -41,7 +139,7 @@ class Plan(DictWrapper):
 
     @latest_order_day.setter
     def latest_order_day(self, v: str):
-        self.d['latestOrderDay'] = v
+        self._set('latestOrderDay', v)
 
     @property
     def earning(self):
@@ -49,7 +147,7 @@ class Plan(DictWrapper):
 
     @earning.setter
     def earning(self, v: int):
-        self.d['earning'] = v
+        self._set('earning', v)
 
     @property
     def buy_back_price(self):
@@ -57,7 +155,7 @@ class Plan(DictWrapper):
 
     @buy_back_price.setter
     def buy_back_price(self, v: float):
-        self.d['buyBackPrice'] = v
+        self._set('buyBackPrice', v)
 
     @property
     def weight(self) -> list[float]:
@@ -65,7 +163,7 @@ class Plan(DictWrapper):
 
     @weight.setter
     def weight(self, v: list[float]):
-        self.d['weight'] = v
+        self._set('weight', v)
 
     @property
     def sell_rate(self) -> list[float]:
@@ -73,7 +171,7 @@ class Plan(DictWrapper):
 
     @sell_rate.setter
     def sell_rate(self, v: list[float]):
-        self.d['sellRate'] = v
+        self._set('sellRate', v)
 
     @property
     def buy_rate(self) -> list[float]:
@@ -81,7 +179,7 @@ class Plan(DictWrapper):
 
     @buy_rate.setter
     def buy_rate(self, v: list[float]):
-        self.d['buyRate'] = v
+        self._set('buyRate', v)
 
     @property
     def factor_type(self) -> str:
@@ -89,7 +187,7 @@ class Plan(DictWrapper):
 
     @factor_type.setter
     def factor_type(self, v: str):
-        self.d['factorType'] = v
+        self._set('factorType', v)
 
     @property
     def has_factors(self) -> bool:
@@ -101,7 +199,7 @@ class Plan(DictWrapper):
 
     @price_rate.setter
     def price_rate(self, v: float):
-        self.d['priceRate'] = v
+        self._set('priceRate', v)
 
     @property
     def rework_price(self):
@@ -110,7 +208,7 @@ class Plan(DictWrapper):
     @rework_price.setter
     def rework_price(self, v: float):
         assert v > 0.0
-        self.d['reworkPrice'] = v
+        self._set('reworkPrice', v)
 
     @property
     def give_up_price(self):
@@ -119,27 +217,52 @@ class Plan(DictWrapper):
     @give_up_price.setter
     def give_up_price(self, v: float):
         assert v > 0.0
-        self.d['giveUpPrice'] = v
+        self._set('giveUpPrice', v)
 
     @property
     def orders(self) -> list[Order]:
-        if 'orders' not in self.d:
-            self.d['orders'] = list()
-        return [Order(i) for i in self.d.get('orders')]
+        return list(self.order_index().orders)
+
+    def __init__(self, d: dict = None, on_change: Callable[[], None] = None):
+        super().__init__(d=d, on_change=on_change)
+        self._index_lock = threading.Lock()
+        self._index_generation = 0
+        self._order_index: OrderIndex = None
+
+    def mark_changed(self):
+        with self._index_lock:
+            self._index_generation += 1
+            self._order_index = None
+        super().mark_changed()
+
+    def order_index(self) -> 'OrderIndex':
+        """
+        订单的汇总索引, 订单列表或者任意订单发生改动, 以及跨日之后重建.
+        网页和会话插件的线程也会读取订单, 构建期间订单发生改动时, 这次构建的索引已经过时, 不会被保存
+        """
+        with self._index_lock:
+            index = self._order_index
+            generation = self._index_generation
+        if index is None or not index.is_current():
+            if 'orders' not in self.d:
+                self.d['orders'] = list()
+                self.mark_changed()
+                with self._index_lock:
+                    generation = self._index_generation
+            orders = [Order(i, on_change=self.mark_changed) for i in list(self.d['orders'])]
+            index = OrderIndex(orders)
+            with self._index_lock:
+                if generation == self._index_generation:
+                    self._order_index = index
+        return index
 
     @property
     def sell_volume(self):
-        orders = self.orders
-        sell_orders = [order for order in orders if order.is_sell and not order.is_waiting_filling]
-        sell_volume = sum(order.filled_qty for order in sell_orders)
-        return sell_volume
+        return self.order_index().sell_volume
 
     @property
     def buy_volume(self):
-        orders = self.orders
-        buy_orders = [order for order in orders if order.is_buy and not order.is_waiting_filling]
-        buy_volume = sum(order.filled_qty for order in buy_orders)
-        return buy_volume
+        return self.order_index().buy_volume
 
     @property
     def should_today_get_off(self) -> bool:
@@ -149,13 +272,11 @@ class Plan(DictWrapper):
         订单空集时返回False
         :return:
         """
-        orders = self.orders
-        for order in orders:
-            if order.is_today and order.is_filled and order.is_buy:
-                return True
-        else:
-            if self.sell_volume and self.sell_volume == self.buy_volume:
-                return True
+        index = self.order_index()
+        if index.today_buy_filled:
+            return True
+        if index.sell_volume and index.sell_volume == index.buy_volume:
+            return True
         return False
 
     @property
@@ -164,9 +285,7 @@ class Plan(DictWrapper):
         是否不存在今天的任何卖单
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_today and order.is_sell]
-        return not orders
+        return not self.order_index().today_sell_count
 
     @property
     def all_today_sell_completed(self) -> bool:
@@ -175,10 +294,10 @@ class Plan(DictWrapper):
         如果今天没有卖单则返回False， 以避免第二条件项会反而满足第一条件项
         :return:
         """
-        orders = [order for order in self.orders if order.is_today and order.is_sell]
-        if not orders:
+        index = self.order_index()
+        if not index.today_sell_count:
             return False
-        return not any(order for order in orders if order.is_waiting_filling)
+        return not index.sell_waiting_count
 
     def append_order(self, order: Order):
         """
@@ -190,6 +309,8 @@ class Plan(DictWrapper):
             self.d['orders'] = list()
         orders: list[dict] = self.d['orders']
         orders.append(order.d)
+        order.on_change = self.mark_changed
+        self.mark_changed()
 
     def clean_orders(self):
         """
@@ -203,7 +324,7 @@ class Plan(DictWrapper):
                 result.append(order.d)
             elif order.filled_qty:
                 result.append(order.d)
-        self.d['orders'] = result
+        self._set('orders', result)
 
     @property
     def cleanable(self) -> bool:
@@ -213,13 +334,12 @@ class Plan(DictWrapper):
         """
         if not self.d:
             return True
-        orders = self.orders
-        any_today = any(order for order in orders if order.is_today)
-        if any_today:
+        index = self.order_index()
+        if index.today_count:
             return False
         elif self.earning is not None:
             return True
-        return not any(order for order in orders if order.filled_qty and not order.is_today)
+        return not index.filled_before_today_count
 
     def total_sell_by_level(self, level: int) -> int:
         """
@@ -227,9 +347,7 @@ class Plan(DictWrapper):
         :param level:
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_sell and order.level == level]
-        return sum(order.filled_qty for order in orders)
+        return self.order_index().sell_filled_by_level.get(level, 0)
 
     def today_contains_buy_level(self, level: int) -> bool:
         """
@@ -237,9 +355,7 @@ class Plan(DictWrapper):
         :param level:
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_today and order.is_buy and order.level == level]
-        return any(orders)
+        return level in self.order_index().today_buy_levels
 
     def sell_order_active_count(self) -> int:
         """
@@ -247,9 +363,7 @@ class Plan(DictWrapper):
         空集合返回True
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_sell and order.is_waiting_filling]
-        return len(orders)
+        return self.order_index().sell_waiting_count
 
     def buy_order_not_active(self) -> bool:
         """
@@ -265,9 +379,7 @@ class Plan(DictWrapper):
         空集合返回True
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_buy and order.is_waiting_filling]
-        return len(orders)
+        return self.order_index().buy_waiting_count
 
     def total_volume_not_active(self, assert_zero=True) -> int:
         """
@@ -287,41 +399,29 @@ class Plan(DictWrapper):
         查找全部卖单中level最大值，没有则返回0
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_sell]
-        return max([order.level for order in orders], default=0)
+        return self.order_index().sell_level
 
     def current_sell_level_filled(self) -> int:
         """
         查找卖单全成交level最大值，没有则返回0
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_sell and order.is_filled]
-        return max([order.level for order in orders], default=0)
+        return self.order_index().sell_level_filled
 
     def latest_today_buy_order(self) -> Order | None:
         """
         返回今天最新产生的买单，如果有
         :return:
         """
-        orders = self.orders
-        orders = [order for order in orders if order.is_today and order.is_buy]
-        orders = sorted(orders, key=lambda i: i.create_timestamp, reverse=True)
-        if orders:
-            return orders[0]
-        else:
-            return None
+        return self.order_index().latest_today_buy
 
     def calc_earning(self) -> int:
         """
         计算收益
         :return:
         """
-        orders = self.orders
-        sell_cost = sum(order.filled_value for order in orders if order.is_sell)
-        buy_income = sum(order.filled_value for order in orders if order.is_buy)
-        return int(sell_cost - buy_income)
+        index = self.order_index()
+        return int(index.sell_filled_value - index.buy_filled_value)
 
     def cog(self, precision: int = None) -> float | None:
         """
@@ -330,11 +430,9 @@ class Plan(DictWrapper):
         -------
 
         """
-        orders = self.orders
-        sell_cost = sum(order.filled_value for order in orders if order.is_sell)
-        buy_income = sum(order.filled_value for order in orders if order.is_buy)
-        sell_value = sell_cost - buy_income
-        sell_volume = self.sell_volume - self.buy_volume
+        index = self.order_index()
+        sell_value = index.sell_filled_value - index.buy_filled_value
+        sell_volume = index.sell_volume - index.buy_volume
         if sell_volume:
             if precision is None:
                 precision = 3
@@ -354,5 +452,6 @@ class Plan(DictWrapper):
 
 
 __all__ = [
+    'OrderIndex',
     'Plan',
 ]
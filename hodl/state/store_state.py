@@ -1,3 +1,4 @@
+from collections import Counter
 from dataclasses import dataclass, field
 import exchange_calendars
 from hodl.tools import *
@@ -12,9 +13,16 @@ class StoreState(StoreStateBase):
     variable: VariableTools = field(default_factory=VariableTools)
     sleep_secs: int = field(default=12)
     state_compare: tuple[str, str] = field(default=('', '', ))
-    low_price_compare: tuple[int, float] = field(default=(-1, 0.0, ))
-    high_price_compare: tuple[int, float] = field(default=(-1, 0.0, ))
+    state_file_signature: tuple[str, tuple | None] = field(default=None)
+    state_save_loops: int = field(default=0)
+    state_save_times: int = field(default=0)
+    state_section_changes: Counter = field(default_factory=Counter)
+    candle_compare: tuple[int, float, float, float, float] = field(default=(-1, 0.0, 0.0, 0.0, 0.0, ))
+    candle_save_time: float = field(default=0.0)
+    archive_base: tuple[int, str, str, int] = field(default=(-1, '', '', 0, ))
     calendar: exchange_calendars.ExchangeCalendar = field(default=None)
+    wake_event: WakeEvent = field(default_factory=WakeEvent)
+    profiler: LoopProfiler = field(default_factory=LoopProfiler)
 
     def __post_init__(self):
         store_config = self.store_config
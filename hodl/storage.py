@@ -1,8 +1,16 @@
+import time
+import zlib
+import atexit
+import queue
+import difflib
+import hashlib
 import sqlite3
 import threading
+import traceback
 from datetime import timedelta
 from dataclasses import dataclass, field
 from hodl.state import *
+from hodl.thread_mixin import *
 from hodl.tools import FormatTool, TimeTools
 
 
@@ -23,40 +31,62 @@ class EarningRow:
     id: int = None
 
     def save(self, con: sqlite3.Connection):
-        with con:
-            con.execute(
-                "INSERT INTO `earning`"
-                "(`day`, `symbol`, `currency`, `days`, `amount`, `unit`, `region`, `broker`, `buyback_price`, `max_level`, `state_version`, `create_time`) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
-                (
-                    self.day,
-                    self.symbol,
-                    self.currency,
-                    self.days,
-                    self.amount,
-                    self.unit,
-                    self.region,
-                    self.broker,
-                    self.buyback_price,
-                    self.max_level,
-                    self.state_version,
-                    self.create_time,
-                ))
+        """
+        收益明细和 earning_summary 中对应的汇总行在同一个事务中写入
+        """
+        with con.write_lock, con:
+            con.execute('BEGIN IMMEDIATE;')
+            try:
+                con.execute(
+                    "INSERT INTO `earning`"
+                    "(`day`, `symbol`, `currency`, `days`, `amount`, `unit`, `region`, `broker`, `buyback_price`, `max_level`, `state_version`, `create_time`) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                    (
+                        self.day,
+                        self.symbol,
+                        self.currency,
+                        self.days,
+                        self.amount,
+                        self.unit,
+                        self.region,
+                        self.broker,
+                        self.buyback_price,
+                        self.max_level,
+                        self.state_version,
+                        self.create_time,
+                    ))
+                con.execute(*EarningSummaryRow.from_earning(self).save_args())
+                con.execute('COMMIT;')
+            except Exception as e:
+                con.execute('ROLLBACK;')
+                raise e
 
     @classmethod
-    def items_after_time(cls, con: sqlite3.Connection, create_time: int):
-        sql = "SELECT * FROM `earning` WHERE create_time >= ? ORDER BY `create_time` DESC;"
+    def items_after_time(cls, con: sqlite3.Connection, create_time: int, limit: int = None):
+        sql = "SELECT * FROM `earning` WHERE create_time >= ? ORDER BY `create_time` DESC"
+        params = (create_time,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
         with con:
             cur = con.cursor()
-            cur.execute(sql, (create_time,))
+            cur.execute(f'{sql};', params)
             items = cur.fetchall()
         items = map(lambda item: EarningRow(**item), items)
         return items
 
     @classmethod
     def total_amount_before_time(cls, con: sqlite3.Connection, create_time: int, currency: str) -> int:
+        """
+        截止时间晚于所有收益的创建时间时, 直接累加汇总表, 否则扫描收益明细
+        """
         with con:
             cur = con.cursor()
+            cur.execute("SELECT SUM(`amount`), MAX(`last_create_time`) FROM `earning_summary` WHERE `currency` = ?;",
+                        (currency,))
+            total, last_create_time = cur.fetchone()
+            if last_create_time is None or last_create_time < create_time:
+                return total or 0
             cur.execute("SELECT SUM(`amount`) FROM `earning` WHERE create_time < ? AND `currency` = ?;",
                         (create_time, currency,))
             item = cur.fetchone()[0]
@@ -106,16 +136,113 @@ class EarningRow:
         with con:
             cur = con.cursor()
             cur.execute(
-                "SELECT substr( `day`, 1, 6) AS `month`, `currency`, sum(`amount`) AS `total` "
-                "FROM `earning` "
-                "WHERE `day` >= ? "
-                "GROUP BY substr( `day`, 1, 6), `currency` "
-                "ORDER BY substr( `day`, 1, 6) DESC, `currency`;", (begin_month,))
+                "SELECT `month`, `currency`, sum(`amount`) AS `total` "
+                "FROM `earning_summary` "
+                "WHERE `month` >= ? "
+                "GROUP BY `month`, `currency` "
+                "ORDER BY `month` DESC, `currency`;", (begin_month,))
             items = cur.fetchall()
         items = list(map(lambda item: _MonthlyEarning(**item), items))
         return items
 
 
+@dataclass
+class EarningSummaryRow:
+    """
+    按月份, 币种, 标的汇总的收益, 随 EarningRow.save 在同一事务中累加,
+    页面统计只需要读取月份数量级的汇总行, 不再扫描全部收益明细
+    """
+    month: int
+    currency: str
+    region: str
+    symbol: str
+    unit: str
+    amount: int
+    times: int
+    last_create_time: int
+    id: int = None
+
+    @classmethod
+    def from_earning(cls, earning: EarningRow) -> 'EarningSummaryRow':
+        return EarningSummaryRow(
+            month=earning.day // 100,
+            currency=earning.currency,
+            region=earning.region,
+            symbol=earning.symbol,
+            unit=earning.unit,
+            amount=earning.amount,
+            times=1,
+            last_create_time=earning.create_time,
+        )
+
+    def save_args(self) -> tuple[str, tuple]:
+        sql = "INSERT INTO `earning_summary`" \
+              "(`month`, `currency`, `region`, `symbol`, `unit`, `amount`, `times`, `last_create_time`) " \
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?) " \
+              "ON CONFLICT(`month`, `currency`, `region`, `symbol`) DO UPDATE SET " \
+              "`unit` = excluded.`unit`, " \
+              "`amount` = `amount` + excluded.`amount`, " \
+              "`times` = `times` + excluded.`times`, " \
+              "`last_create_time` = MAX(`last_create_time`, excluded.`last_create_time`);"
+        params = (
+            self.month,
+            self.currency,
+            self.region,
+            self.symbol,
+            self.unit,
+            self.amount,
+            self.times,
+            self.last_create_time,
+        )
+        return sql, params
+
+    @property
+    def day(self) -> int:
+        """
+        汇总行所在月份的第一天, 页面图表按照收益明细的 day 字段归类
+        """
+        return self.month * 100 + 1
+
+    @classmethod
+    def items_after_month(cls, con: sqlite3.Connection, month: int) -> list['EarningSummaryRow']:
+        with con:
+            cur = con.cursor()
+            cur.execute(
+                "SELECT `month`, `currency`, `region`, `symbol`, `unit`, `amount`, `times`, `last_create_time` "
+                "FROM `earning_summary` WHERE `month` >= ? ORDER BY `month` DESC, `currency`, `region`, `symbol`;",
+                (month,),
+            )
+            items = cur.fetchall()
+        items = list(map(lambda item: EarningSummaryRow(**item), items))
+        return items
+
+    @classmethod
+    def rebuild(cls, con: sqlite3.Connection) -> int:
+        """
+        根据收益明细重新生成全部汇总行, 返回汇总行的数量
+        """
+        with con.write_lock, con:
+            con.execute('BEGIN IMMEDIATE;')
+            try:
+                cls.rebuild_in_transaction(con)
+                con.execute('COMMIT;')
+            except Exception as e:
+                con.execute('ROLLBACK;')
+                raise e
+            count = con.execute("SELECT COUNT(*) FROM `earning_summary`;").fetchone()[0]
+        return count
+
+    @classmethod
+    def rebuild_in_transaction(cls, con: sqlite3.Connection):
+        con.execute("DELETE FROM `earning_summary`;")
+        con.execute(
+            "INSERT INTO `earning_summary`"
+            "(`month`, `currency`, `region`, `symbol`, `unit`, `amount`, `times`, `last_create_time`) "
+            "SELECT `day` / 100, `currency`, `region`, `symbol`, MAX(`unit`), SUM(`amount`), COUNT(*), MAX(`create_time`) "
+            "FROM `earning` GROUP BY `day` / 100, `currency`, `region`, `symbol`;"
+        )
+
+
 @dataclass
 class OrderRow:
     unique_id: str
@@ -128,22 +255,26 @@ class OrderRow:
     content: str = field(default=None)
     id: int = field(default=None)
 
+    def save_args(self) -> tuple[str, tuple]:
+        sql = "REPLACE INTO `orders`" \
+              "(`unique_id`, `symbol`, `order_id`, `region`, `broker`, `content`, `create_time`, `update_time`) " \
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?);"
+        params = (
+            self.unique_id,
+            self.symbol,
+            self.order_id,
+            self.region,
+            self.broker,
+            self.content,
+            self.create_time,
+            self.update_time,
+        )
+        return sql, params
+
     def save(self, con: sqlite3.Connection):
+        sql, params = self.save_args()
         with con:
-            con.execute(
-                "REPLACE INTO `orders`"
-                "(`unique_id`, `symbol`, `order_id`, `region`, `broker`, `content`, `create_time`, `update_time`) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
-                (
-                    self.unique_id,
-                    self.symbol,
-                    self.order_id,
-                    self.region,
-                    self.broker,
-                    self.content,
-                    self.create_time,
-                    self.update_time,
-                ))
+            con.execute(sql, params)
 
     @classmethod
     def items_after_create_time(cls, con: sqlite3.Connection, create_time: int):
@@ -195,25 +326,201 @@ class OrderRow:
 
 @dataclass
 class StateRow:
+    """
+    每个持仓状态版本的最新归档,
+    content_hash 指向 state_blob 中的内容, 旧版本的数据直接在 content 中保存完整的状态文本
+    """
     version: str
     day: int
     symbol: str
     content: str
     update_time: int
+    content_hash: str = None
     id: int = None
 
+    def save_args(self) -> tuple[str, tuple]:
+        sql = "REPLACE INTO `state_archive`(`version`, `day`, `symbol`, `content`, `update_time`, `content_hash`) " \
+              "VALUES (?, ?, ?, ?, ?, ?);"
+        params = (
+            self.version,
+            self.day,
+            self.symbol,
+            self.content,
+            self.update_time,
+            self.content_hash,
+        )
+        return sql, params
+
     def save(self, con: sqlite3.Connection):
+        sql, params = self.save_args()
         with con:
-            con.execute(
-                "REPLACE INTO `state_archive`(`version`, `day`, `symbol`, `content`, `update_time`) "
-                "VALUES (?, ?, ?, ?, ?);",
-                (
-                    self.version,
-                    self.day,
-                    self.symbol,
-                    self.content,
-                    self.update_time,
-                ))
+            con.execute(sql, params)
+
+    @classmethod
+    def query_by_version(cls, con: sqlite3.Connection, version: str) -> 'StateRow | None':
+        with con:
+            cur = con.cursor()
+            cur.execute("SELECT * FROM `state_archive` WHERE `version` = ?;", (version,))
+            row = cur.fetchone()
+        if row:
+            return StateRow(**row)
+        return None
+
+    def state_text(self, con: sqlite3.Connection) -> str | None:
+        """
+        还原归档的持仓状态文本
+        """
+        if self.content_hash:
+            return StateBlobRow.rebuild(con=con, content_hash=self.content_hash)
+        return self.content
+
+
+@dataclass
+class StateBlobRow:
+    """
+    按内容寻址的持仓状态存档,
+    同一持仓同一天的状态依次以行为单位, 保存为相对前一个版本的压缩差异,
+    每隔若干个版本, 或者换日之后, 保存一份压缩后的完整快照, 限制还原时需要回放的差异数量.
+    base_hash 为空的是完整快照, chain 表示距离最近快照的差异数量.
+    """
+    hash: str
+    symbol: str
+    day: int
+    chain: int
+    content: bytes
+    update_time: int
+    base_hash: str = None
+    id: int = None
+
+    def save_args(self) -> tuple[str, tuple]:
+        sql = "INSERT OR IGNORE INTO `state_blob`(`hash`, `symbol`, `day`, `base_hash`, `chain`, `content`, `update_time`) " \
+              "VALUES (?, ?, ?, ?, ?, ?, ?);"
+        params = (
+            self.hash,
+            self.symbol,
+            self.day,
+            self.base_hash,
+            self.chain,
+            self.content,
+            self.update_time,
+        )
+        return sql, params
+
+    def save(self, con: sqlite3.Connection):
+        sql, params = self.save_args()
+        with con:
+            con.execute(sql, params)
+
+    @property
+    def is_snapshot(self) -> bool:
+        return self.base_hash is None
+
+    @classmethod
+    def content_hash(cls, symbol: str, text: str) -> str:
+        return hashlib.blake2b(f'{symbol}\n{text}'.encode('utf8'), digest_size=16).hexdigest()
+
+    @classmethod
+    def encode_delta(cls, base_text: str, text: str) -> bytes:
+        """
+        状态文本是缩进并且排序了键的 json, 按行比较即可得到很小的差异;
+        差异是由 [开始行, 结束行) 表示的复制片段和新增的文本行组成的列表
+        """
+        base_lines = base_text.splitlines(keepends=True)
+        lines = text.splitlines(keepends=True)
+        matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+        ops = list()
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                ops.append([i1, i2])
+            elif j1 < j2:
+                ops.append(''.join(lines[j1:j2]))
+        return zlib.compress(FormatTool.json_dumps(ops, binary=True))
+
+    @classmethod
+    def apply_delta(cls, base_text: str, delta: bytes) -> str:
+        base_lines = base_text.splitlines(keepends=True)
+        parts = list()
+        for op in FormatTool.json_loads(zlib.decompress(delta)):
+            if isinstance(op, str):
+                parts.append(op)
+            else:
+                parts.extend(base_lines[op[0]:op[1]])
+        return ''.join(parts)
+
+    @classmethod
+    def new(
+            cls,
+            symbol: str,
+            day: int,
+            text: str,
+            update_time: int,
+            base: tuple[int, str, str, int] = None,
+            snapshot_interval: int = 64,
+    ) -> 'StateBlobRow':
+        """
+        base 为前一个版本的 (日期, hash, 状态文本, chain),
+        同一天并且差异数量未达到 snapshot_interval 时保存差异, 否则保存完整快照
+        """
+        content_hash = cls.content_hash(symbol=symbol, text=text)
+        if base and base[0] == day and base[1] and base[3] + 1 < snapshot_interval:
+            _, base_hash, base_text, base_chain = base
+            return StateBlobRow(
+                hash=content_hash,
+                symbol=symbol,
+                day=day,
+                base_hash=base_hash,
+                chain=base_chain + 1,
+                content=cls.encode_delta(base_text=base_text, text=text),
+                update_time=update_time,
+            )
+        return StateBlobRow(
+            hash=content_hash,
+            symbol=symbol,
+            day=day,
+            base_hash=None,
+            chain=0,
+            content=zlib.compress(text.encode('utf8')),
+            update_time=update_time,
+        )
+
+    @classmethod
+    def query_by_hash(cls, con: sqlite3.Connection, content_hash: str) -> 'StateBlobRow | None':
+        with con:
+            cur = con.cursor()
+            cur.execute("SELECT * FROM `state_blob` WHERE `hash` = ?;", (content_hash,))
+            row = cur.fetchone()
+        if row:
+            return StateBlobRow(**row)
+        return None
+
+    @classmethod
+    def hashes_by_symbol(cls, con: sqlite3.Connection, symbol: str, day: int) -> list[str]:
+        """
+        持仓某一天保存过的全部状态版本, 按照保存的先后顺序排列
+        """
+        with con:
+            cur = con.cursor()
+            cur.execute("SELECT `hash` FROM `state_blob` WHERE `symbol` = ? AND `day` = ? ORDER BY `id`;", (symbol, day,))
+            items = cur.fetchall()
+        return [item[0] for item in items]
+
+    @classmethod
+    def rebuild(cls, con: sqlite3.Connection, content_hash: str) -> str | None:
+        """
+        沿着 base_hash 找到最近的快照, 再依次回放差异, 还原出指定版本的状态文本
+        """
+        chain: list[StateBlobRow] = list()
+        while content_hash:
+            row = cls.query_by_hash(con=con, content_hash=content_hash)
+            if row is None:
+                return None
+            chain.append(row)
+            content_hash = row.base_hash
+        snapshot = chain.pop()
+        text = zlib.decompress(snapshot.content).decode('utf8')
+        for row in reversed(chain):
+            text = cls.apply_delta(base_text=text, delta=row.content)
+        return text
 
 
 @dataclass
@@ -300,7 +607,7 @@ class QuoteLowHistoryRow:
     update_time: int
     id: int = None
 
-    def save(self, con: sqlite3.Connection):
+    def save_args(self) -> tuple[str, tuple]:
         sql = "REPLACE INTO `quote_low_history`(`broker`, `region`, `symbol`, `day`, `low_price`, `update_time`) " \
               "VALUES (?, ?, ?, ?, ?, ?);"
         params = (
@@ -311,6 +618,10 @@ class QuoteLowHistoryRow:
             self.low_price,
             self.update_time,
         )
+        return sql, params
+
+    def save(self, con: sqlite3.Connection):
+        sql, params = self.save_args()
         with con:
             con.execute(sql, params)
 
@@ -345,7 +656,7 @@ class QuoteHighHistoryRow:
     update_time: int
     id: int = None
 
-    def save(self, con: sqlite3.Connection):
+    def save_args(self) -> tuple[str, tuple]:
         sql = "REPLACE INTO `quote_high_history`(`broker`, `region`, `symbol`, `day`, `high_price`, `update_time`) " \
               "VALUES (?, ?, ?, ?, ?, ?);"
         params = (
@@ -356,6 +667,10 @@ class QuoteHighHistoryRow:
             self.high_price,
             self.update_time,
         )
+        return sql, params
+
+    def save(self, con: sqlite3.Connection):
+        sql, params = self.save_args()
         with con:
             con.execute(sql, params)
 
@@ -380,22 +695,177 @@ class QuoteHighHistoryRow:
         return items
 
 
+@dataclass
+class DailyCandleRow:
+    """
+    日线数据, 每个标的每天一行, 持仓循环获得行情后原地更新这一行.
+    最高价/最低价/开盘价取自行情的当日数据, 收盘价为最近一次写入时的最新价.
+    """
+    broker: str
+    region: str
+    symbol: str
+    day: int
+    open_price: float = None
+    high_price: float = None
+    low_price: float = None
+    close_price: float = None
+    update_time: int = None
+    id: int = None
+
+    def save_args(self) -> tuple[str, tuple]:
+        sql = "INSERT INTO `daily_candle`" \
+              "(`broker`, `region`, `symbol`, `day`, `open_price`, `high_price`, `low_price`, `close_price`, `update_time`) " \
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) " \
+              "ON CONFLICT(`broker`, `region`, `symbol`, `day`) DO UPDATE SET " \
+              "`open_price` = COALESCE(excluded.`open_price`, `open_price`), " \
+              "`high_price` = COALESCE(excluded.`high_price`, `high_price`), " \
+              "`low_price` = COALESCE(excluded.`low_price`, `low_price`), " \
+              "`close_price` = COALESCE(excluded.`close_price`, `close_price`), " \
+              "`update_time` = excluded.`update_time`;"
+        params = (
+            self.broker,
+            self.region,
+            self.symbol,
+            self.day,
+            self.open_price,
+            self.high_price,
+            self.low_price,
+            self.close_price,
+            self.update_time,
+        )
+        return sql, params
+
+    def save(self, con: sqlite3.Connection):
+        sql, params = self.save_args()
+        with con:
+            con.execute(sql, params)
+
+    @classmethod
+    def query_by_symbol(
+            cls,
+            con: sqlite3.Connection,
+            broker: str,
+            region: str,
+            symbol: str,
+            begin_day: int,
+            end_day: int,
+            asc: bool = True,
+    ) -> list['DailyCandleRow']:
+        """
+        使用唯一索引做一次范围扫描, 只返回最高价和最低价都存在的日期
+        """
+        order = 'ASC' if asc else 'DESC'
+        sql = "SELECT `broker`, `region`, `symbol`, `day`, `open_price`, `high_price`, `low_price`, `close_price`, " \
+              "`update_time` FROM `daily_candle` " \
+              "WHERE `broker` = ? AND `region` = ? AND `symbol` = ? AND `day` >= ? AND `day` <= ? " \
+              "AND `high_price` IS NOT NULL AND `low_price` IS NOT NULL " \
+              f"ORDER BY `day` {order};"
+        params = (broker, region, symbol, begin_day, end_day,)
+        with con:
+            cur = con.cursor()
+            cur.execute(sql, params)
+            items = cur.fetchall()
+        items = list(map(lambda item: DailyCandleRow(**item), items))
+        return items
+
+
+class DbLockStats:
+    """
+    记录数据库锁的等待情况, 用于观察多个线程访问数据库时的争用程度
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.times = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, secs: float):
+        with self._lock:
+            self.times += 1
+            self.total_wait += secs
+            self.max_wait = max(self.max_wait, secs)
+
+    @property
+    def avg_wait(self) -> float:
+        if not self.times:
+            return 0.0
+        return self.total_wait / self.times
+
+
 class SqliteConnWithLock(sqlite3.Connection):
     DB_LOCK = threading.RLock()
+    LOCK_STATS = DbLockStats()
+    # 和 SqliteWalConn 保持一致, 需要把多条写语句放在同一个事务中时持有这个锁
+    write_lock = DB_LOCK
 
     def __enter__(self):
         super().__enter__()
+        begin = time.perf_counter()
         SqliteConnWithLock.DB_LOCK.acquire(blocking=True)
+        SqliteConnWithLock.LOCK_STATS.record(time.perf_counter() - begin)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         SqliteConnWithLock.DB_LOCK.release()
         super().__exit__(exc_type, exc_val, exc_tb)
 
 
+class SqliteWalConn(sqlite3.Connection):
+    """
+    WAL 模式下每个线程独占的连接,
+    读操作之间, 以及读写之间不再需要互斥, 只有写语句需要经过数据库对象的写锁, 保证同一时刻只有一个写者
+    """
+    WRITE_PREFIXES = ('INSERT', 'REPLACE', 'UPDATE', 'DELETE', )
+
+    def bind(self, write_lock: threading.RLock, lock_stats: DbLockStats):
+        self.write_lock = write_lock
+        self.lock_stats = lock_stats
+
+    def _acquire_write(self):
+        begin = time.perf_counter()
+        self.write_lock.acquire(blocking=True)
+        self.lock_stats.record(time.perf_counter() - begin)
+
+    def execute(self, sql: str, parameters=(), /):
+        if not sql.lstrip().upper().startswith(SqliteWalConn.WRITE_PREFIXES):
+            return super().execute(sql, parameters)
+        self._acquire_write()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.write_lock.release()
+
+    def executemany(self, sql: str, parameters, /):
+        self._acquire_write()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self.write_lock.release()
+
+
 class LocalDb:
-    def __init__(self, db_path):
-        con = sqlite3.connect(db_path, factory=SqliteConnWithLock, check_same_thread=False, isolation_level=None)
-        con.row_factory = sqlite3.Row
+    """
+    本地 sqlite 数据库
+    默认所有线程共享一个连接, 并通过进程级的锁互斥访问;
+    开启 wal_mode 后, 数据库使用 WAL 日志模式, 每个线程从连接池获得自己的连接, 读操作可以和一个写者并发进行.
+    内存数据库无法在多个连接间共享, 所以始终使用共享连接的方式.
+    """
+    BUSY_TIMEOUT_MS = 20_000
+
+    def __init__(self, db_path, wal_mode: bool = False):
+        self.db_path = db_path
+        self.wal_mode = wal_mode and db_path != ':memory:'
+        self._local = threading.local()
+        self._pool: list[sqlite3.Connection] = list()
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self.writer: WriteBehindQueue | None = None
+        if self.wal_mode:
+            self.lock_stats = DbLockStats()
+        else:
+            self.lock_stats = SqliteConnWithLock.LOCK_STATS
+        con = self._connect()
+        if not self.wal_mode:
+            self._conn = con
         cur = con.cursor()
         cur.execute('''CREATE TABLE IF NOT EXISTS earning (
         id INTEGER PRIMARY KEY, 
@@ -415,6 +885,20 @@ class LocalDb:
         cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_create_time_symbol ON `earning` (`create_time`, `broker`, `symbol`);')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_earning_symbol_day ON `earning` (`symbol`, `day`);')
 
+        cur.execute('''CREATE TABLE IF NOT EXISTS `earning_summary` (
+        id INTEGER PRIMARY KEY, 
+        `month` INTEGER NOT NULL,
+        `currency` TEXT NOT NULL,
+        `region` TEXT NOT NULL,
+        `symbol` TEXT NOT NULL,
+        `unit` TEXT NOT NULL,
+        `amount` INTEGER NOT NULL,
+        `times` INTEGER NOT NULL,
+        `last_create_time` INTEGER NOT NULL
+        );''')
+        cur.execute(
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_earning_summary_main ON `earning_summary` (`month`, `currency`, `region`, `symbol`);')
+
         cur.execute('''CREATE TABLE IF NOT EXISTS `state_archive` (
                 id INTEGER PRIMARY KEY, 
                 `version` TEXT NOT NULL,
@@ -427,6 +911,19 @@ class LocalDb:
         cur.execute(
             'CREATE INDEX IF NOT EXISTS idx_state_archive_symbol_version ON `state_archive` (`symbol`, `version`);')
 
+        cur.execute('''CREATE TABLE IF NOT EXISTS `state_blob` (
+                id INTEGER PRIMARY KEY, 
+                `hash` TEXT NOT NULL,
+                `symbol` TEXT NOT NULL,
+                `day` INTEGER NOT NULL,
+                `base_hash` TEXT,
+                `chain` INTEGER NOT NULL,
+                `content` BLOB NOT NULL,
+                `update_time` INTEGER NOT NULL
+                );''')
+        cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_state_blob_hash ON `state_blob` (`hash`);')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_state_blob_symbol_day ON `state_blob` (`symbol`, `day`);')
+
         cur.execute('''CREATE TABLE IF NOT EXISTS `orders` (
                         id INTEGER PRIMARY KEY, 
                         `unique_id` TEXT NOT NULL,
@@ -485,17 +982,282 @@ class LocalDb:
         cur.execute(
             'CREATE UNIQUE INDEX IF NOT EXISTS idx_quote_high_history_search ON `quote_high_history` (`broker`, `region`, `symbol`, `day`);')
 
+        cur.execute('''CREATE TABLE IF NOT EXISTS `daily_candle` (
+                                                        id INTEGER PRIMARY KEY,
+                                                        `broker` TEXT NOT NULL,
+                                                        `region` TEXT NOT NULL,
+                                                        `symbol` TEXT NOT NULL,
+                                                        `day` INTEGER NOT NULL,
+                                                        `open_price` REAL,
+                                                        `high_price` REAL,
+                                                        `low_price` REAL,
+                                                        `close_price` REAL,
+                                                        `update_time` INTEGER NOT NULL
+                                                        );''')
+        cur.execute(
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_candle_search ON `daily_candle` (`broker`, `region`, `symbol`, `day`);')
+
         con.commit()
-        self.conn = con
+        self._migrate(con)
+
+    def _migrate(self, con: sqlite3.Connection):
+        """
+        按照 user_version 记录的版本号, 依次执行尚未执行过的一次性数据迁移
+        """
+        migrations = [
+            self._migrate_daily_candle,
+            self._migrate_state_archive_hash,
+            EarningSummaryRow.rebuild_in_transaction,
+        ]
+        version = con.execute('PRAGMA user_version;').fetchone()[0]
+        for idx, migration in enumerate(migrations[version:], start=version + 1):
+            with self.write_lock():
+                con.execute('BEGIN IMMEDIATE;')
+                try:
+                    migration(con)
+                    con.execute(f'PRAGMA user_version={idx};')
+                    con.execute('COMMIT;')
+                except Exception as e:
+                    con.execute('ROLLBACK;')
+                    raise e
+
+    @classmethod
+    def _migrate_daily_candle(cls, con: sqlite3.Connection):
+        """
+        把旧的 quote_low_history 和 quote_high_history 两张表合并到 daily_candle
+        """
+        con.execute(
+            "INSERT OR IGNORE INTO `daily_candle`(`broker`, `region`, `symbol`, `day`, `high_price`, `low_price`, `update_time`) "
+            "SELECT `broker`, `region`, `symbol`, `day`, MAX(`high_price`), MIN(`low_price`), MAX(`update_time`) FROM ("
+            "SELECT `broker`, `region`, `symbol`, `day`, NULL AS `high_price`, `low_price`, `update_time` FROM `quote_low_history` "
+            "UNION ALL "
+            "SELECT `broker`, `region`, `symbol`, `day`, `high_price`, NULL AS `low_price`, `update_time` FROM `quote_high_history`"
+            ") GROUP BY `broker`, `region`, `symbol`, `day`;"
+        )
+
+    @classmethod
+    def _migrate_state_archive_hash(cls, con: sqlite3.Connection):
+        """
+        state_archive 增加指向 state_blob 的 content_hash 列
+        """
+        columns = [row[1] for row in con.execute('PRAGMA table_info(`state_archive`);').fetchall()]
+        if 'content_hash' not in columns:
+            con.execute('ALTER TABLE `state_archive` ADD COLUMN `content_hash` TEXT;')
+
+    def _connect(self) -> sqlite3.Connection:
+        # auto_vacuum 只对还没有建表的新数据库生效, 使得清理数据后可以用 incremental_vacuum 逐步归还空闲页
+        if self.wal_mode:
+            con = sqlite3.connect(
+                self.db_path,
+                factory=SqliteWalConn,
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=LocalDb.BUSY_TIMEOUT_MS / 1000,
+            )
+            con.bind(write_lock=self._write_lock, lock_stats=self.lock_stats)
+            con.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+            con.execute('PRAGMA journal_mode=WAL;')
+            con.execute('PRAGMA synchronous=NORMAL;')
+            con.execute(f'PRAGMA busy_timeout={LocalDb.BUSY_TIMEOUT_MS};')
+            self._local.conn = con
+        else:
+            con = sqlite3.connect(self.db_path, factory=SqliteConnWithLock, check_same_thread=False, isolation_level=None)
+            con.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+        con.row_factory = sqlite3.Row
+        with self._pool_lock:
+            self._pool.append(con)
+        return con
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        当前线程应使用的数据库连接
+        """
+        if not self.wal_mode:
+            return self._conn
+        con = getattr(self._local, 'conn', None)
+        if con is None:
+            con = self._connect()
+        return con
+
+    @property
+    def pool_size(self) -> int:
+        return len(self._pool)
+
+    def write_lock(self) -> threading.RLock:
+        """
+        WAL 模式下需要把多条写语句放在同一个事务中时, 可以持有这个锁, 以免其他写者在事务中途获得写入机会
+        """
+        return self._write_lock
+
+    def save(self, row):
+        """
+        保存实现了 save_args 方法的数据行,
+        如果设置了 writer, 数据行将进入后写队列批量写入, 否则立即写入
+        """
+        if writer := self.writer:
+            writer.put(row)
+        else:
+            row.save(con=self.conn)
+
+    def close(self):
+        if writer := self.writer:
+            writer.close()
+        with self._pool_lock:
+            pool = self._pool.copy()
+            self._pool.clear()
+        for con in pool:
+            con.close()
+
+
+class WriteBehindQueue(ThreadMixin):
+    """
+    数据行的后写队列,
+    持仓线程只把数据行放入有界队列, 由写入线程每隔 flush_interval 秒或者积累到 flush_rows 行时,
+    在一个事务中使用 executemany 批量写入, 这样磁盘的延迟不再计入持仓循环, 同时大幅减少事务提交的次数.
+    sync 模式下数据行在 put 时立即写入, 供测试使用.
+    """
+
+    def __init__(
+            self,
+            db: LocalDb,
+            max_size: int = 4096,
+            flush_interval: float = 0.2,
+            flush_rows: int = 256,
+            sync: bool = False,
+    ):
+        assert max_size > 0
+        assert flush_interval > 0
+        assert flush_rows > 0
+        self.db = db
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.sync = sync
+        self.queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self.pending: list = list()
+        self.flush_lock = threading.RLock()
+        self.closed = False
+        self.total_rows = 0
+        self.total_batches = 0
+        self.error_times = 0
+
+    def primary_bar(self) -> list[BarElementDesc]:
+        return [
+            BarElementDesc(
+                content=f'🗃️{self.queue.qsize()}',
+                tooltip=f'后写队列待写入{self.queue.qsize()}行, '
+                        f'已写入{self.total_rows:,}行/{self.total_batches:,}个事务, 失败{self.error_times}次',
+            ),
+        ]
+
+    def prepare(self):
+        # 写入线程是守护线程, 进程退出时需要持久化队列中剩余的数据行
+        atexit.register(self.close)
+
+    def put(self, row):
+        if self.sync or self.closed:
+            with self.flush_lock:
+                self._write([row])
+            return
+        self.queue.put(row, block=True)
+
+    def _drain(self):
+        while True:
+            try:
+                row = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                self.pending.append(row)
+
+    def _write(self, rows: list):
+        if not rows:
+            return
+        groups: dict[str, list[tuple]] = dict()
+        for row in rows:
+            sql, params = row.save_args()
+            groups.setdefault(sql, list()).append(params)
+        db = self.db
+        con = db.conn
+        with db.write_lock(), con:
+            con.execute('BEGIN IMMEDIATE;')
+            try:
+                for sql, params in groups.items():
+                    con.executemany(sql, params)
+                con.execute('COMMIT;')
+            except Exception as e:
+                con.execute('ROLLBACK;')
+                raise e
+        self.total_rows += len(rows)
+        self.total_batches += 1
+
+    def flush(self):
+        """
+        立即写入队列中的所有数据行
+        """
+        with self.flush_lock:
+            self._drain()
+            rows, self.pending = self.pending, list()
+            try:
+                self._write(rows)
+            except Exception as e:
+                self.error_times += 1
+                self.pending = rows + self.pending
+                raise e
+
+    def close(self):
+        """
+        停止后写, 并把剩余的数据行持久化, 之后的数据行将被同步写入
+        """
+        self.closed = True
+        thread = self.current_thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            # 放入空行唤醒写入线程, 等待它结束手上的批次
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+            thread.join(timeout=self.flush_interval + 30.0)
+        self.flush()
+
+    def _collect(self):
+        deadline = time.monotonic() + self.flush_interval
+        while len(self.pending) < self.flush_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                row = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if row is None:
+                break
+            with self.flush_lock:
+                self.pending.append(row)
+
+    def run(self):
+        super(WriteBehindQueue, self).run()
+        while not self.closed:
+            self._collect()
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+                time.sleep(self.flush_interval)
 
 
 __all__ = [
+    'DbLockStats',
     'LocalDb',
+    'WriteBehindQueue',
     'EarningRow',
+    'EarningSummaryRow',
     'StateRow',
+    'StateBlobRow',
     'OrderRow',
     'AlarmRow',
     'TempBasePriceRow',
     'QuoteLowHistoryRow',
     'QuoteHighHistoryRow',
+    'DailyCandleRow',
 ]
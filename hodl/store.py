@@ -2,6 +2,7 @@ from typing import Type
 import os
 import abc
 from hodl.bot import *
+from hodl.file_writer import *
 from hodl.proxy import *
 from hodl.risk_control import *
 from hodl.state import *
@@ -61,6 +62,7 @@ class Store(StoreBase):
     ):
         super().__init__(store_config=store_config, db=db, variable=variable)
         variable = self.runtime_state.variable
+        self.risk_ledger = RiskLedger(region=store_config.region)
         self.bot = AlertBot(
             broker=store_config.broker,
             symbol=store_config.symbol,
@@ -82,38 +84,88 @@ class Store(StoreBase):
         return State.new(state)
 
     def load_state(self):
+        """
+        内存中的持仓状态是权威的, 只有状态文件被外部修改, 删除, 或者状态文件路径变化时才重新读取
+        """
         if not self.state_file:
             return
-        text = LocateTools.read_file(self.state_file)
+        runtime_state = self.runtime_state
+        path = self.state_file
+        if FileWriterThread.is_pending(path):
+            return
+        signature = LocateTools.file_signature(path)
+        if runtime_state.variable.state_in_memory \
+                and signature is not None \
+                and (path, signature, ) == runtime_state.state_file_signature:
+            return
+        text = LocateTools.read_file(path)
         if text is None:
             self.state = State.new()
         else:
-            runtime_state = self.runtime_state
             runtime_state.state_compare = TimeTools.us_day_now(), text
             self.state = self.read_state(text)
+        runtime_state.state_file_signature = path, signature,
         self.state.name = self.store_config.name
 
     def save_state(self):
+        """
+        持仓状态自上次保存后没有任何改动, 并且没有跨日时, 不需要重新序列化
+        """
         runtime_state = self.runtime_state
-        text = FormatTool.json_dumps(self.state)
+        state = self.state
         day = TimeTools.us_time_now()
         today = TimeTools.date_to_ymd(day)
+        runtime_state.state_save_loops += 1
+        if not state.is_dirty and today == runtime_state.state_compare[0]:
+            return
+        dirty_sections = state.dirty_sections
+        for section in dirty_sections:
+            runtime_state.state_section_changes[section] += 1
+        state.clear_dirty()
+        text = FormatTool.json_dumps(state)
         changed = (today, text,) != runtime_state.state_compare
         if changed:
-            if self.state_file:
-                LocateTools.write_file(self.state_file, text)
+            runtime_state.state_save_times += 1
+            runtime_state.state_compare = today, text,
+            if path := self.state_file:
+                match runtime_state.variable.state_fsync_policy:
+                    case 'always':
+                        fsync = True
+                    case 'plan':
+                        fsync = 'plan' in dirty_sections
+                    case _:
+                        fsync = False
+                FileWriterThread.write(path, text, fsync=fsync, on_written=self._on_state_written)
             if self.state_archive:
                 archive_path = os.path.join(self.state_archive, f'{today}.json')
-                LocateTools.write_file(archive_path, text)
+                FileWriterThread.write(archive_path, text)
             if db := self.db:
+                ymd = int(TimeTools.date_to_ymd(day, join=False))
+                symbol = self.store_config.symbol
+                update_time = int(TimeTools.us_time_now().timestamp())
+                blob = StateBlobRow.new(
+                    symbol=symbol,
+                    day=ymd,
+                    text=text,
+                    update_time=update_time,
+                    base=runtime_state.archive_base,
+                    snapshot_interval=runtime_state.variable.db_state_snapshot_interval,
+                )
+                if blob.hash != runtime_state.archive_base[1]:
+                    runtime_state.archive_base = (ymd, blob.hash, text, blob.chain, )
+                    db.save(blob)
                 row = StateRow(
                     version=self.state.version,
-                    day=int(TimeTools.date_to_ymd(day, join=False)),
-                    symbol=self.store_config.symbol,
-                    content=text,
-                    update_time=int(TimeTools.us_time_now().timestamp()),
+                    day=ymd,
+                    symbol=symbol,
+                    content='',
+                    update_time=update_time,
+                    content_hash=blob.hash,
                 )
-                row.save(con=db.conn)
+                db.save(row)
+
+    def _on_state_written(self, path: str):
+        self.runtime_state.state_file_signature = path, LocateTools.file_signature(path),
 
     @property
     def logger(self):
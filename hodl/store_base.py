@@ -63,6 +63,30 @@ class StoreBase(ThreadMixin):
         config = self.store_config
         return 'Store', config.broker, config.region, config.symbol,
 
+    def wake(self, reason: str):
+        """
+        提前唤醒持仓线程开始下一次循环
+        """
+        self.runtime_state.wake_event.notify(reason)
+
+    @classmethod
+    def wake_stores(cls, reason: str, broker: str = None, region: str = None, symbol: str = None) -> int:
+        """
+        唤醒所有符合条件的持仓线程, 返回唤醒的数量
+        """
+        count = 0
+        for store in cls.find_by_type(StoreBase):
+            config = store.store_config
+            if broker is not None and config.broker != broker:
+                continue
+            if region is not None and config.region != region:
+                continue
+            if symbol is not None and config.symbol != symbol:
+                continue
+            store.wake(reason)
+            count += 1
+        return count
+
     @property
     def process_time(self) -> float | None:
         return getattr(self, '_process_time', None)
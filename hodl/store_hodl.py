@@ -1,3 +1,4 @@
+import time
 from hodl.bot import *
 from hodl.tools import *
 from hodl.state import *
@@ -14,6 +15,9 @@ from hodl.tools import FormatTool as FMT
 
 @trade_strategy(name=TradeStrategyEnum.HODL)
 class StoreHodl(BasePriceMixin, SleepMixin, FactorMixin, UiMixin):
+    # 没有开启数据库后写时, 日线的收盘价最多每隔这些秒更新一次
+    CANDLE_CLOSE_INTERVAL = 60.0
+
     def booting_check(self):
         trade_broker = self.broker_proxy.trade_broker
         if not trade_broker.ENABLE_BOOTING_CHECK:
@@ -121,32 +125,30 @@ class StoreHodl(BasePriceMixin, SleepMixin, FactorMixin, UiMixin):
         db = self.db
         runtime_state = self.runtime_state
         quote_time = quote.time.timestamp()
-        low_price = quote.day_low
         quote_day = int(TimeTools.date_to_ymd(TimeTools.from_timestamp(quote_time), join=False))
-
-        if quote_time and low_price and db and (quote_day, low_price,) != runtime_state.low_price_compare:
-            runtime_state.low_price_compare = (quote_day, low_price,)
-            row = QuoteLowHistoryRow(
-                broker=self.store_config.broker,
-                region=self.store_config.region,
-                symbol=self.store_config.symbol,
-                day=quote_day,
-                low_price=low_price,
-                update_time=int(TimeTools.us_time_now().timestamp()),
-            )
-            row.save(con=db.conn)
-        high_price = quote.day_high
-        if quote_time and high_price and db and (quote_day, high_price,) != runtime_state.high_price_compare:
-            runtime_state.high_price_compare = (quote_day, high_price,)
-            row = QuoteHighHistoryRow(
+        low_price = quote.day_low or None
+        high_price = quote.day_high or None
+        candle_key = (quote_day, quote.open, low_price, high_price, quote.latest_price, )
+        if db and db.writer is None \
+                and candle_key[:4] == runtime_state.candle_compare[:4] \
+                and time.monotonic() - runtime_state.candle_save_time < StoreHodl.CANDLE_CLOSE_INTERVAL:
+            # 同步写入时, 只有最新价变化不值得每次循环提交一次事务
+            candle_key = runtime_state.candle_compare
+        if quote_time and (low_price or high_price) and db and candle_key != runtime_state.candle_compare:
+            runtime_state.candle_compare = candle_key
+            runtime_state.candle_save_time = time.monotonic()
+            row = DailyCandleRow(
                 broker=self.store_config.broker,
                 region=self.store_config.region,
                 symbol=self.store_config.symbol,
                 day=quote_day,
+                open_price=quote.open,
                 high_price=high_price,
+                low_price=low_price,
+                close_price=quote.latest_price or None,
                 update_time=int(TimeTools.us_time_now().timestamp()),
             )
-            row.save(con=db.conn)
+            db.save(row)
 
     def prepare_delete_state(self) -> int:
         orders = self.state.plan.orders
@@ -384,10 +386,13 @@ class StoreHodl(BasePriceMixin, SleepMixin, FactorMixin, UiMixin):
                         self.prepare_chip()
                     if not state.cash_day or state.cash_day != TimeTools.us_day_now():
                         self.prepare_cash()
-                    self.prepare_ta()
+                    with self.profiler.phase('prepare_ta'):
+                        self.prepare_ta()
                 except Exception as e:
                     error = PrepareError(str(e))
                     raise error
+                # 持仓和现金的查询同样是券商接口调用, 之后重新冻结时钟
+                TimeTools.snapshot_begin()
 
                 quote_date = TimeTools.from_timestamp(state.quote_time)
                 us_date = TimeTools.us_time_now()
@@ -405,7 +410,8 @@ class StoreHodl(BasePriceMixin, SleepMixin, FactorMixin, UiMixin):
 
         match current:
             case self.STATE_TRADE:
-                self.try_fire_orders()
+                with self.profiler.phase('try_fire_orders'):
+                    self.try_fire_orders()
 
     def clear_error(self):
         alert_bot = self.bot
@@ -416,7 +422,10 @@ class StoreHodl(BasePriceMixin, SleepMixin, FactorMixin, UiMixin):
 
     def loop_finally(self):
         self.risk_control = None
-        self.after_loop()
+        try:
+            self.after_loop()
+        finally:
+            TimeTools.snapshot_end()
 
     def run(self):
         super().run()
@@ -459,18 +468,27 @@ class StoreHodl(BasePriceMixin, SleepMixin, FactorMixin, UiMixin):
                     if self.ENABLE_LOG_ALIVE:
                         self.alive_logger.debug(f'开始处理循环')
 
+                    profiler = self.profiler
                     order_checked = False
                     try:
-                        self.prepare_plan()
-                        self.prepare_plug_in()
-                        self.prepare_market_status()
+                        with profiler.phase('prepare_plan'):
+                            self.prepare_plan()
+                        with profiler.phase('prepare_plug_in'):
+                            self.prepare_plug_in()
+                        with profiler.phase('prepare_market_status'):
+                            self.prepare_market_status()
                         if self.state.market_status in {
                             'TRADING',
                             'CLOSING',
                         }:
-                            self.refresh_orders()
+                            with profiler.phase('refresh_orders'):
+                                self.refresh_orders()
                             order_checked = True
-                        self.prepare_quote()
+                        with profiler.phase('prepare_quote'):
+                            self.prepare_quote()
+                        # 本次循环中的当前时间, 日期字符串只计算一次,
+                        # 在券商接口调用(订单, 行情)之后冻结, 避免排队和限流等待使得冻结的时间落后于行情时间
+                        TimeTools.snapshot_begin()
                     except QuoteFieldError as e:
                         if self.ENABLE_LOG_ALIVE:
                             self.alive_logger.warning(f'行情字段异常: {e}')
@@ -488,15 +506,17 @@ class StoreHodl(BasePriceMixin, SleepMixin, FactorMixin, UiMixin):
                             self.alive_logger.exception(f'更新状态字典/计划/市场状态/交易通道连通/订单时出现错误:{e}')
                         raise PrepareError
                     finally:
-                        self.risk_control = RiskControl(
-                            store_config=self.store_config,
-                            margin_amount=self.margin_amount(),
-                            state=self.state,
-                            max_shares=self.state.plan.total_chips,
-                            cash_balance_func=self.current_cash,
-                            latest_price=self.state.quote_latest_price,
-                            order_checked=order_checked,
-                        )
+                        with profiler.phase('risk_control'):
+                            self.risk_control = RiskControl(
+                                store_config=self.store_config,
+                                margin_amount=self.margin_amount(),
+                                state=self.state,
+                                max_shares=self.state.plan.total_chips,
+                                cash_balance_func=self.current_cash,
+                                latest_price=self.state.quote_latest_price,
+                                order_checked=order_checked,
+                                ledger=self.risk_ledger,
+                            )
 
                     state = self.state
                     market_status, current, new_current = state.market_status, state.current, state.current
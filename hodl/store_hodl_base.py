@@ -1,3 +1,4 @@
+import time
 from hodl.exception_tools import *
 from hodl.state import *
 from hodl.store_isolated import *
@@ -23,17 +24,29 @@ class StoreHodlBase(IsolatedStore):
     def exception(self, v: Exception):
         setattr(self, '_exception', v)
 
+    @property
+    def profiler(self) -> LoopProfiler:
+        return self.runtime_state.profiler
+
     def before_loop(self):
-        self.load_state()
+        profiler = self.profiler
+        profiler.enable = self.runtime_state.variable.store_profiler_enable
+        setattr(self, '_loop_begin', time.perf_counter())
+        with profiler.phase('load_state'):
+            self.load_state()
         setattr(self, '_begin_time', TimeTools.get_utc())
         return True
 
     def after_loop(self):
-        self.save_state()
+        with self.profiler.phase('save_state'):
+            self.save_state()
         now = TimeTools.get_utc()
         begin_time = getattr(self, '_begin_time', now)
         process_time = FormatTool.adjust_precision((now - begin_time).total_seconds(), 3)
         self.process_time = process_time
+        profiler = self.profiler
+        if profiler.enable:
+            profiler.record('loop', time.perf_counter() - getattr(self, '_loop_begin', time.perf_counter()))
 
     @classmethod
     def build_table(cls, store_config: StoreConfig, plan: Plan):
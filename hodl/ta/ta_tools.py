@@ -1,4 +1,3 @@
-from collections import defaultdict
 from dataclasses import dataclass, field
 from hodl.storage import *
 from hodl.tools import *
@@ -9,6 +8,8 @@ class Candle:
     time: int
     high_price: float = field(default=None)
     low_price: float = field(default=None)
+    open_price: float = field(default=None)
+    close_price: float = field(default=None)
 
     @property
     def avg_price(self) -> None | float:
@@ -38,43 +39,32 @@ class TaTools:
         self.db = db
         self.cfg = cfg
 
-    def _query_history(self, days: int, day_low=True, asc=False):
+    def query_days(self, days: int, asc=True) -> list[Candle]:
         db = self.db
         if not db:
             return list()
         store_config = self.cfg
         end_day = TimeTools.us_time_now()
         begin_day = TimeTools.timedelta(end_day, days=-days)
-        args = dict(
+        rows = DailyCandleRow.query_by_symbol(
             con=db.conn,
             broker=store_config.broker,
             region=store_config.region,
             symbol=store_config.symbol,
             begin_day=int(TimeTools.date_to_ymd(begin_day, join=False)),
             end_day=int(TimeTools.date_to_ymd(end_day, join=False)),
+            asc=asc,
         )
-        if day_low:
-            history = QuoteLowHistoryRow.query_by_symbol(**args)
-        else:
-            history = QuoteHighHistoryRow.query_by_symbol(**args)
-        if asc:
-            history = history[::-1]
-        return history
-
-    def query_days(self, days: int, asc=True) -> list[Candle]:
-        low_his: list[QuoteLowHistoryRow] = self._query_history(days=days, day_low=True, asc=True)
-        high_his: list[QuoteHighHistoryRow] = self._query_history(days=days, day_low=False, asc=True)
-        d: dict[int, list[float]] = defaultdict(list)
-        for item in low_his:
-            d[item.day].append(item.low_price)
-        for item in high_his:
-            d[item.day].append(item.high_price)
-        result = [
-            Candle(time=day, high_price=max(nums), low_price=min(nums))
-            for day, nums in d.items() if len(nums) > 1
+        return [
+            Candle(
+                time=row.day,
+                high_price=max(row.high_price, row.low_price),
+                low_price=min(row.high_price, row.low_price),
+                open_price=row.open_price,
+                close_price=row.close_price,
+            )
+            for row in rows
         ]
-        result = sorted(result, key=lambda i: i.time, reverse=not asc)
-        return result
 
     @classmethod
     def ma(cls, candles: list[Candle], period: int = 5, precision: int = 3) -> MA | None:
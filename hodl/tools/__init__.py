@@ -4,10 +4,13 @@ from hodl.tools.locate import LocateTools
 from hodl.tools.variable import VariableTools, StoreKey, HotReloadVariableTools
 from hodl.tools.format import FormatTool
 from hodl.tools.currency_config import CurrencyConfig
+from hodl.tools.trading_schedule import TradingSchedule
 from hodl.tools.store_config import TradeStrategyEnum, StoreConfig
 from hodl.tools.store_state_base import StoreStateBase
 from hodl.tools.dict_wrapper import DictWrapper
 from hodl.tools.leaky_bucket import LeakyBucket
+from hodl.tools.wake_event import WakeEvent
+from hodl.tools.loop_profiler import PhaseReport, LoopProfiler
 from hodl.tools.broker_meta import BrokerTradeType, BrokerMeta
 
 
@@ -21,11 +24,15 @@ __all__ = [
     'HotReloadVariableTools',
     'FormatTool',
     'CurrencyConfig',
+    'TradingSchedule',
     'TradeStrategyEnum',
     'StoreConfig',
     'StoreStateBase',
     'DictWrapper',
     'LeakyBucket',
+    'WakeEvent',
+    'PhaseReport',
+    'LoopProfiler',
     'BrokerTradeType',
     'BrokerMeta',
 ]
@@ -1,11 +1,25 @@
+from typing import Callable
 from hodl.tools import FormatTool
 
 
 class DictWrapper:
-    def __init__(self, d: dict = None):
+    """
+    包装一个可以直接序列化的字典,
+    属性的 setter 通过 _set 写入字典, 并调用 on_change 通知持有这个字典的对象, 以便追踪改动
+    """
+    def __init__(self, d: dict = None, on_change: Callable[[], None] = None):
         if d is None:
             d = dict()
         self.d = d
+        self.on_change = on_change
+
+    def _set(self, key: str, v):
+        self.d[key] = v
+        self.mark_changed()
+
+    def mark_changed(self):
+        if on_change := self.on_change:
+            on_change()
 
     def copy(self):
         d = FormatTool.json_loads(FormatTool.json_dumps(self.d))
@@ -15,6 +29,7 @@ class DictWrapper:
         d = FormatTool.json_loads(FormatTool.json_dumps(wrapper.d))
         self.d.clear()
         self.d.update(d)
+        self.mark_changed()
 
 
 __all__ = ['DictWrapper', ]
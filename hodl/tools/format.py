@@ -22,7 +22,15 @@ class FormatTool:
     def adjust_precision(cls, f: float, precision: int) -> float:
         """
         根据小数精度重新格式化浮点数
+        普通范围内的 float 直接使用内置的 round, 它对浮点数的精确二进制值做银行家舍入, 结果与 Decimal 的 quantize 相同;
+        其他类型, 特别大的数值, NaN 和无穷大仍然交给 Decimal 处理
         """
+        if type(f) is float and 0 <= precision <= 12 and -1e15 < f < 1e15:
+            return round(f, precision)
+        return cls._adjust_precision_decimal(f, precision)
+
+    @classmethod
+    def _adjust_precision_decimal(cls, f: float, precision: int) -> float:
         d = cls._precision(precision=precision)
         f = float(Decimal(f).quantize(d))
         return f
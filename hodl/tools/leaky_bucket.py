@@ -22,7 +22,7 @@ class LeakyBucket:
         self._capacity = capacity
         self._used_tokens = used_tokens
         self._leak_rate = float(leak_rate)
-        self._last_time = TimeTools.utc_now().timestamp()
+        self._last_time = TimeTools.get_utc().timestamp()
         self._lock = Lock()
 
     def __enter__(self):
@@ -39,8 +39,36 @@ class LeakyBucket:
     def available_tokens(self):
         return self._capacity - self.used_tokens
 
+    @property
+    def leak_rate(self) -> float:
+        """
+        每分钟漏出的令牌数
+        """
+        return self._leak_rate
+
+    @leak_rate.setter
+    def leak_rate(self, leak_rate: float):
+        assert isinstance(leak_rate, (int, float, ))
+        assert leak_rate > 0
+        with self._lock:
+            self._leak_rate = float(leak_rate)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def wait_secs(self) -> float:
+        """
+        距离下一个令牌可用还需要等待的秒数, 已有可用令牌时为 0
+        """
+        with self._lock:
+            if 1 + self._get_used_tokens(rewrite_tokens=False) <= self._capacity:
+                return 0.0
+            now = TimeTools.get_utc().timestamp()
+            return max(0.0, self._last_time + 60.0 / self._leak_rate - now)
+
     def _get_used_tokens(self, rewrite_tokens=False):
-        now = TimeTools.utc_now().timestamp()
+        now = TimeTools.get_utc().timestamp()
         delta = self._leak_rate / 60.0 * (now - self._last_time)
         delta = math.floor(delta)
         new_used_tokens = max(0, self._used_tokens - delta)
@@ -53,15 +81,26 @@ class LeakyBucket:
             with self._lock:
                 if 1 + self._get_used_tokens(rewrite_tokens=True) <= self._capacity:
                     self._used_tokens += 1
-                    self._last_time = TimeTools.utc_now().timestamp()
+                    self._last_time = TimeTools.get_utc().timestamp()
                     break
                 last_time = self._last_time
-            now = TimeTools.utc_now().timestamp()
+            now = TimeTools.get_utc().timestamp()
             secs = last_time + 60.0 / self._leak_rate - now
             TimeTools.sleep(secs=secs)
 
     def consume(self):
         self._consume()
 
+    def try_consume(self) -> bool:
+        """
+        不阻塞的消费, 没有可用令牌时返回 False
+        """
+        with self._lock:
+            if 1 + self._get_used_tokens(rewrite_tokens=True) <= self._capacity:
+                self._used_tokens += 1
+                self._last_time = TimeTools.get_utc().timestamp()
+                return True
+            return False
+
 
 __all__ = ["LeakyBucket", ]
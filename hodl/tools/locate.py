@@ -3,6 +3,7 @@ import re
 import sys
 import pkgutil
 import inspect
+import threading
 import importlib
 
 
@@ -64,15 +65,50 @@ class LocateTools:
             return None
 
     @classmethod
-    def write_file(cls, path: str, text: str, mode: str = 'w'):
+    def file_signature(cls, path: str) -> None | tuple[int, int, int]:
+        """
+        文件的 inode, 修改时间(纳秒)和大小, 用于判断文件是否被外部修改, 文件不存在时返回 None
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def write_file(cls, path: str, text: str, mode: str = 'w', atomic: bool = False, fsync: bool = False):
+        """
+        atomic 模式下先写入同目录的临时文件, 再通过 os.replace 替换目标文件, 读者只会看到完整的旧文件或者新文件;
+        fsync 要求数据在函数返回前落盘
+        """
+        target = path
+        if atomic:
+            folder, name = os.path.split(path)
+            target = os.path.join(folder, f'.{name}.{os.getpid()}.{threading.get_ident()}.tmp')
         args = dict(
-            file=path,
+            file=target,
             mode=mode,
         )
         if mode == 'w':
             args |= dict(encoding='utf8')
-        with open(**args) as f:
-            f.write(text)
+        try:
+            with open(**args) as f:
+                f.write(text)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            if atomic:
+                os.replace(target, path)
+        except BaseException as e:
+            if atomic and os.path.exists(target):
+                os.remove(target)
+            raise e
+        if atomic and fsync and hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
 
     @classmethod
     def discover_plugins(cls, package_name):
@@ -0,0 +1,105 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass
+class PhaseReport:
+    name: str
+    count: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'count': self.count,
+            'p50': self.p50,
+            'p95': self.p95,
+            'p99': self.p99,
+            'max': self.max,
+        }
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'begin', )
+
+    def __init__(self, profiler: 'LoopProfiler', name: str):
+        self.profiler = profiler
+        self.name = name
+        self.begin = 0.0
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.record(self.name, time.perf_counter() - self.begin)
+        return False
+
+
+class LoopProfiler:
+    """
+    持仓循环的分阶段耗时统计,
+    每个阶段保留最近 window 次的耗时, 报告其中的 p50/p95/p99/最大值, 单位毫秒.
+    关闭时 phase 返回共享的空上下文, 不会读取时钟.
+    """
+    NULL_PHASE = _NullPhase()
+
+    def __init__(self, window: int = 512, enable: bool = True):
+        assert window > 0
+        self.window = window
+        self.enable = enable
+        self.samples: dict[str, deque] = dict()
+
+    def phase(self, name: str):
+        if not self.enable:
+            return LoopProfiler.NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name: str, secs: float):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = deque(maxlen=self.window)
+            self.samples[name] = samples
+        samples.append(secs)
+
+    @classmethod
+    def _percentile(cls, ordered: list[float], rate: float) -> float:
+        idx = min(len(ordered) - 1, int(round(rate * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def report(self) -> list[PhaseReport]:
+        result = list()
+        for name, samples in list(self.samples.items()):
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            result.append(PhaseReport(
+                name=name,
+                count=len(ordered),
+                p50=round(self._percentile(ordered, 0.50) * 1000, 3),
+                p95=round(self._percentile(ordered, 0.95) * 1000, 3),
+                p99=round(self._percentile(ordered, 0.99) * 1000, 3),
+                max=round(ordered[-1] * 1000, 3),
+            ))
+        return result
+
+    def reset(self):
+        self.samples = dict()
+
+
+__all__ = [
+    'PhaseReport',
+    'LoopProfiler',
+]
@@ -1,5 +1,6 @@
 import os
 import exchange_calendars
+from hodl.tools.trading_schedule import TradingSchedule
 
 
 class TradeStrategyEnum:
@@ -514,7 +515,8 @@ class StoreConfig(dict):
     def using_cached_quote(self) -> bool:
         """
         是否选择使用缓存过的行情,
-        如果在多家券商操作同一标的的持仓, 可以减少对相同标的行情的频繁获取
+        如果在多家券商操作同一标的的持仓, 可以减少对相同标的行情的频繁获取,
+        缓存以行情券商为键, 允许共享行情(share_quote)的券商的行情可以被其他券商的持仓使用
         启用这个设定需要配合根配置的 quote_cache_ttl 设定
         """
         return self.get('using_cached_quote', False)
@@ -554,11 +556,11 @@ class StoreConfig(dict):
             case 'stock':
                 match self.region:
                     case 'US':
-                        return exchange_calendars.get_calendar('XNYS')
+                        return TradingSchedule.get_calendar('XNYS')
                     case 'HK':
-                        return exchange_calendars.get_calendar('XHKG')
+                        return TradingSchedule.get_calendar('XHKG')
                     case 'CN':
-                        return exchange_calendars.get_calendar('XSHG')
+                        return TradingSchedule.get_calendar('XSHG')
         return None
 
 
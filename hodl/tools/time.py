@@ -1,15 +1,81 @@
 import re
 import time
 import threading
+from contextlib import contextmanager
 from zoneinfo import ZoneInfo
 from datetime import datetime, timedelta, UTC, timezone
 import humanize
 from hodl.tools.store_state_base import StoreStateBase
 
 
+class ClockSnapshot:
+    """
+    冻结的时钟,
+    创建时读取一次 utc_now, 之后各个时区的当前时间和日期字符串只计算一次.
+    """
+    __slots__ = ('utc', '_times', '_days', )
+
+    def __init__(self, utc: datetime):
+        self.utc = utc
+        self._times: dict[str, datetime] = dict()
+        self._days: dict[str, str] = dict()
+
+    def time(self, tz: str) -> datetime:
+        date = self._times.get(tz)
+        if date is None:
+            date = self.utc.astimezone(TimeTools.zone(tz))
+            self._times[tz] = date
+        return date
+
+    def day(self, tz: str) -> str:
+        day = self._days.get(tz)
+        if day is None:
+            day = TimeTools.date_to_ymd(self.time(tz))
+            self._days[tz] = day
+        return day
+
+
 class TimeTools:
     # 一个由线程id为键用于存储线程应使用的默认时区信息
     THREAD_TZ: dict[int, str] = dict()
+    ZONES: dict[str, ZoneInfo] = dict()
+    _CLOCK = threading.local()
+
+    @classmethod
+    def zone(cls, tz: str) -> ZoneInfo:
+        zone = TimeTools.ZONES.get(tz)
+        if zone is None:
+            zone = ZoneInfo(tz)
+            TimeTools.ZONES[tz] = zone
+        return zone
+
+    @classmethod
+    def snapshot(cls) -> ClockSnapshot | None:
+        return getattr(TimeTools._CLOCK, 'snapshot', None)
+
+    @classmethod
+    def snapshot_begin(cls) -> ClockSnapshot:
+        """
+        为当前线程冻结时钟, 直到 snapshot_end 之前, us_time_now 和 us_day_now 都返回同一时刻的结果,
+        冻结的时刻来自 utc_now, 所以测试中 mock 的时间同样有效.
+        需要真实流逝的时间(例如计算耗时)应使用 get_utc
+        """
+        snapshot = ClockSnapshot(cls.utc_now())
+        TimeTools._CLOCK.snapshot = snapshot
+        return snapshot
+
+    @classmethod
+    def snapshot_end(cls):
+        TimeTools._CLOCK.snapshot = None
+
+    @classmethod
+    @contextmanager
+    def clock_snapshot(cls):
+        last = cls.snapshot()
+        try:
+            yield cls.snapshot_begin()
+        finally:
+            TimeTools._CLOCK.snapshot = last
 
     @classmethod
     def thread_register(cls, region: str):
@@ -61,7 +127,17 @@ class TimeTools:
         函数名中的us是开发历史问题，并非指美国地区当前时间。
         """
         tz = tz if tz else cls.current_tz()
-        return cls.utc_now().astimezone(ZoneInfo(tz))
+        if snapshot := cls.snapshot():
+            return snapshot.time(tz)
+        return cls.utc_now().astimezone(cls.zone(tz))
+
+    @classmethod
+    def clock_time_now(cls, tz: str = None) -> datetime:
+        """
+        不使用时钟快照的当前时间, 用于记录事件真实发生的时刻, 比如订单的创建时间
+        """
+        tz = tz if tz else cls.current_tz()
+        return cls.utc_now().astimezone(cls.zone(tz))
 
     @classmethod
     def date_to_ymd(cls, date: datetime, join=True) -> str:
@@ -86,6 +162,8 @@ class TimeTools:
 
     @classmethod
     def us_day_now(cls, tz=None) -> str:
+        if snapshot := cls.snapshot():
+            return snapshot.day(tz if tz else cls.current_tz())
         day = cls.us_time_now(tz=tz)
         return cls.date_to_ymd(day)
 
@@ -103,7 +181,7 @@ class TimeTools:
         """
         tz = tz if tz else cls.current_tz()
         date = datetime.fromtimestamp(timestamp, UTC)
-        return date.astimezone(ZoneInfo(tz))
+        return date.astimezone(cls.zone(tz))
 
     @classmethod
     def from_params(cls, year: int, month: int, day: int, hour: int, minute: int, second: int, tz: str):
@@ -134,4 +212,4 @@ class TimeTools:
         return humanize.precisedelta(value=value, minimum_unit=minimum_unit, suppress=suppress, format=format)
 
 
-__all__ = ['TimeTools', ]
+__all__ = ['ClockSnapshot', 'TimeTools', ]
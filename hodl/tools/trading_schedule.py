@@ -0,0 +1,113 @@
+import bisect
+import threading
+from datetime import datetime, timedelta
+import exchange_calendars
+import pandas as pd
+
+
+class TradingSchedule:
+    """
+    交易日历的时段缓存,
+    每个交易日历在进程中只加载一次, 并把一段日期内的交易时段转换为有序的 [开始, 结束) 时间戳区间,
+    之后判断某一时刻是否在交易时段内, 以及距离下一次开盘的秒数, 都只需要一次二分查找.
+    查询的时刻超出已缓存的日期范围时, 以该时刻为起点重新生成区间.
+    """
+    CALENDARS: dict[str, exchange_calendars.ExchangeCalendar] = dict()
+    SCHEDULES: dict[str, 'TradingSchedule'] = dict()
+    LOCK = threading.Lock()
+
+    def __init__(self, calendar: exchange_calendars.ExchangeCalendar, days: int = 30):
+        assert days > 0
+        self.calendar = calendar
+        self.days = days
+        self.begin = 0
+        self.end = 0
+        self.starts: list[int] = list()
+        self.ends: list[int] = list()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_calendar(cls, name: str) -> exchange_calendars.ExchangeCalendar:
+        with TradingSchedule.LOCK:
+            calendar = TradingSchedule.CALENDARS.get(name)
+            if calendar is None:
+                calendar = exchange_calendars.get_calendar(name)
+                TradingSchedule.CALENDARS[name] = calendar
+            return calendar
+
+    @classmethod
+    def by_calendar(cls, calendar: exchange_calendars.ExchangeCalendar) -> 'TradingSchedule':
+        with TradingSchedule.LOCK:
+            schedule = TradingSchedule.SCHEDULES.get(calendar.name)
+            if schedule is None or schedule.calendar is not calendar:
+                schedule = TradingSchedule(calendar=calendar)
+                TradingSchedule.SCHEDULES[calendar.name] = schedule
+            return schedule
+
+    def _build(self, ts: int):
+        calendar = self.calendar
+        begin = max(pd.Timestamp(ts - 86400 * 7, unit='s'), calendar.first_session).normalize()
+        end = min(pd.Timestamp(ts + 86400 * self.days, unit='s'), calendar.last_session).normalize()
+        starts, ends = list(), list()
+        if begin <= end:
+            schedule = calendar.schedule.loc[begin:end]
+            for row in schedule.itertuples(index=False):
+                if pd.isna(row.break_start) or pd.isna(row.break_end):
+                    intervals = ((row.open, row.close, ), )
+                else:
+                    intervals = ((row.open, row.break_start, ), (row.break_end, row.close, ), )
+                for open_time, close_time in intervals:
+                    starts.append(int(open_time.timestamp()))
+                    ends.append(int(close_time.timestamp()))
+        self.starts, self.ends = starts, ends
+        self.begin = int(begin.timestamp())
+        self.end = int(end.timestamp()) + 86400
+
+    def _intervals(self, ts: int) -> tuple[list[int], list[int]]:
+        with self.lock:
+            if not (self.begin <= ts < self.end - 86400):
+                self._build(ts)
+            return self.starts, self.ends
+
+    @classmethod
+    def _timestamp(cls, time: datetime | float | int) -> int:
+        if isinstance(time, datetime):
+            time = time.timestamp()
+        # 与交易日历一致, 按分钟判断
+        return int(time) // 60 * 60
+
+    def is_trading(self, time: datetime | float | int, forward_minutes: int = 0) -> bool:
+        """
+        time 所在的分钟, 以及之后 forward_minutes 分钟内, 是否存在交易时段
+        """
+        ts = self._timestamp(time)
+        starts, ends = self._intervals(ts)
+        idx = bisect.bisect_right(starts, ts) - 1
+        if idx >= 0 and ts < ends[idx]:
+            return True
+        if forward_minutes > 0 and idx + 1 < len(starts):
+            return starts[idx + 1] <= ts + forward_minutes * 60
+        return False
+
+    def seconds_until_open(self, time: datetime | float | int) -> float | None:
+        """
+        距离下一个交易时段开始的秒数, 正处于交易时段时为 0, 缓存范围内没有交易时段时返回 None
+        """
+        raw = time.timestamp() if isinstance(time, datetime) else float(time)
+        ts = self._timestamp(raw)
+        starts, ends = self._intervals(ts)
+        idx = bisect.bisect_right(starts, ts) - 1
+        if idx >= 0 and ts < ends[idx]:
+            return 0.0
+        if idx + 1 < len(starts):
+            return max(0.0, starts[idx + 1] - raw)
+        return None
+
+    def next_open(self, time: datetime) -> datetime | None:
+        secs = self.seconds_until_open(time)
+        if secs is None:
+            return None
+        return time + timedelta(seconds=secs)
+
+
+__all__ = ['TradingSchedule', ]
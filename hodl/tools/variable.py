@@ -190,6 +190,38 @@ class VariableTools:
         """
         return self._config.get('manager_state_path')
 
+    @property
+    def state_in_memory(self) -> bool:
+        """
+        持仓线程是否以内存中的持仓状态为准,
+        开启后只有状态文件被外部修改(inode, 修改时间或者大小发生变化)或者被删除时, 才重新读取状态文件,
+        关闭则每次循环都重新读取状态文件
+        """
+        return self._config.get('state_in_memory', True)
+
+    @property
+    def state_fsync_policy(self) -> str:
+        """
+        持仓状态文件写入后何时调用 fsync 确保落盘:
+        always: 每次写入都调用;
+        plan: 只有持仓计划(订单, 成交档位等)发生变化时调用;
+        never: 交给操作系统决定.
+        状态文件总是先写临时文件再原子替换, 任何策略下都不会读到写了一半的文件
+        """
+        policy = self._config.get('state_fsync_policy', 'plan')
+        assert policy in ('always', 'plan', 'never', )
+        return policy
+
+    @property
+    def file_write_interval(self) -> float:
+        """
+        文件写入线程对同一个文件两次写入之间的最小间隔, 单位毫秒,
+        间隔内到达的多次写入被合并为最后一次, 需要 fsync 的写入不受限制
+        """
+        ms = self._config.get('file_write_interval', 1000)
+        assert ms >= 0
+        return ms / 1000.0
+
     @property
     def db_path(self):
         """
@@ -199,6 +231,95 @@ class VariableTools:
         """
         return self._config.get('db_path')
 
+    @property
+    def db_wal_mode(self) -> bool:
+        """
+        数据库是否使用 WAL 日志模式,
+        开启后每个线程使用独立的数据库连接, 读操作可以和写操作并发进行, 减少持仓线程和网页刷新线程之间的锁等待
+        """
+        return self._config.get('db_wal_mode', False)
+
+    @property
+    def db_write_behind(self) -> bool:
+        """
+        是否将行情历史、订单、持仓状态归档这些数据行交给后写队列批量写入数据库,
+        开启后持仓线程不再等待每一行数据的事务提交
+        """
+        return self._config.get('db_write_behind', False)
+
+    @property
+    def db_write_behind_interval(self) -> float:
+        """
+        后写队列批量写入的间隔时间, 单位毫秒
+        """
+        ms = self._config.get('db_write_behind_interval', 200)
+        assert ms > 0
+        return ms / 1000.0
+
+    @property
+    def db_state_snapshot_interval(self) -> int:
+        """
+        持仓状态归档时, 每保存多少个差异版本后保存一份完整快照,
+        快照越稀疏占用的空间越小, 但还原一个版本需要回放的差异越多
+        """
+        interval = self._config.get('db_state_snapshot_interval', 64)
+        assert interval > 0
+        return interval
+
+    @property
+    def db_retention_enable(self) -> bool:
+        """
+        是否启动数据库清理线程, 按照各数据表的保留策略删除过期数据并回收空间
+        """
+        return self._config.get('db_retention_enable', True)
+
+    @property
+    def db_retention_interval(self) -> int:
+        """
+        数据库清理线程的执行间隔, 单位秒
+        """
+        secs = self._config.get('db_retention_interval', 3600)
+        assert secs > 0
+        return secs
+
+    @property
+    def db_retention_state_days(self) -> int | None:
+        """
+        持仓状态存档保留完整历史的天数, 更早的日期每个持仓每天只保留最后一个版本,
+        不设置则保留全部版本
+        """
+        return self._config.get('db_retention_state_days', 30)
+
+    @property
+    def db_retention_order_days(self) -> int | None:
+        """
+        订单记录保留的天数, 不设置则永久保留
+        """
+        return self._config.get('db_retention_order_days', None)
+
+    @property
+    def db_retention_quote_history_days(self) -> int | None:
+        """
+        日线表保留的天数, 同时清理旧的最高价/最低价历史表中残留的数据, 不设置则永久保留
+        """
+        return self._config.get('db_retention_quote_history_days', None)
+
+    @property
+    def db_retention_alarm_days(self) -> int | None:
+        """
+        已解除的告警记录保留的天数, 不设置则永久保留
+        """
+        return self._config.get('db_retention_alarm_days', None)
+
+    @property
+    def db_write_behind_rows(self) -> int:
+        """
+        后写队列积累到多少行数据时立即写入
+        """
+        rows = self._config.get('db_write_behind_rows', 256)
+        assert rows > 0
+        return rows
+
     @property
     def prefer_market_status_brokers(self) -> list[str]:
         """
@@ -215,6 +336,34 @@ class VariableTools:
         """
         return self._config.get('prefer_quote_brokers', list())
 
+    @property
+    def store_wake_interval(self) -> float:
+        """
+        持仓线程被事件(行情变化, 订单更新, 配置重载)提前唤醒时, 两次循环之间的最小间隔, 单位毫秒,
+        sleep_limit 仍然是没有事件时两次循环之间的最大间隔
+        """
+        ms = self._config.get('store_wake_interval', 200)
+        assert ms >= 0
+        return ms / 1000.0
+
+    @property
+    def sleep_mode_limit(self) -> int | None:
+        """
+        休眠模式下持仓线程两次循环之间的最大间隔, 单位秒,
+        休眠模式按交易日历等到下一次开盘前一分钟, 但不超过这个间隔;
+        不设置则沿用刷新间隔的8倍, 例如设置为3600可以在休市期间每小时只循环一次
+        """
+        limit = self._config.get('sleep_mode_limit', None)
+        assert limit is None or limit >= 1
+        return limit
+
+    @property
+    def store_profiler_enable(self) -> bool:
+        """
+        是否统计持仓循环中各个阶段的耗时(p50/p95/p99/最大值), 结果显示在网页和 manager 的状态 json 中
+        """
+        return self._config.get('store_profiler_enable', True)
+
     @property
     def sleep_limit(self) -> int:
         """
@@ -245,6 +394,28 @@ class VariableTools:
             ttl = None
         return ttl
 
+    @property
+    def quote_prefetch_interval(self) -> float | None:
+        """
+        行情预拉取线程每一轮的间隔, 单位秒, 预拉取的行情在这段时间内被持仓线程直接使用,
+        只有券商支持批量行情(fetch_quotes)时才会启动预拉取线程, 设置为 0 则关闭
+        """
+        interval = self._config.get('quote_prefetch_interval', 2.0)
+        if not interval or interval < 0:
+            return None
+        return float(interval)
+
+    @property
+    def quote_stream_stale(self) -> float | None:
+        """
+        推送行情的过期时间, 单位秒, 一个标的超过这段时间没有新的推送, 持仓线程恢复拉取行情,
+        只有券商开启了推送行情(subscribe_quotes)时才会启动推送线程, 设置为 0 则关闭
+        """
+        stale = self._config.get('quote_stream_stale', 5.0)
+        if not stale or stale < 0:
+            return None
+        return float(stale)
+
     @property
     def html_file_path(self) -> str | None:
         """
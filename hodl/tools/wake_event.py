@@ -0,0 +1,71 @@
+import time
+import threading
+from collections import Counter
+
+
+class WakeEvent:
+    """
+    持仓线程的唤醒事件,
+    行情变化, 订单更新, 配置重载等事件通过 notify 提前唤醒正在等待的持仓线程,
+    没有事件时 wait 等到最大间隔再返回.
+    两次唤醒之间至少间隔 min_secs 秒, 频繁的事件被合并到同一次唤醒中, 不会增加券商接口的调用次数.
+    """
+    QUOTE = 'quote'
+    ORDER = 'order'
+    CONFIG = 'config'
+    MARKET = 'market'
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._reasons: set[str] = set()
+        self._notify_time: float = None
+        self._last_wake: float = 0.0
+        self.wake_counter: Counter = Counter()
+        self.early_times = 0
+        self.deadline_times = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def notify(self, reason: str):
+        with self._cond:
+            if not self._reasons:
+                self._notify_time = time.monotonic()
+            self._reasons.add(reason)
+            self._cond.notify_all()
+
+    def wait(self, secs: float, min_secs: float = 0.0) -> set[str]:
+        """
+        返回唤醒的原因, 等到最大间隔才返回时为空集合
+        """
+        now = time.monotonic()
+        deadline = now + max(secs, 0.0)
+        earliest = self._last_wake + min_secs
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if self._reasons and now >= earliest:
+                    break
+                timeout = deadline - now
+                if self._reasons:
+                    timeout = min(timeout, earliest - now)
+                self._cond.wait(timeout=timeout)
+            reasons, self._reasons = self._reasons, set()
+            self._last_wake = now
+            if reasons:
+                latency = now - self._notify_time
+                self.latency_sum += latency
+                self.latency_max = max(self.latency_max, latency)
+                self.wake_counter.update(reasons)
+                self.early_times += 1
+            else:
+                self.deadline_times += 1
+        return reasons
+
+    @property
+    def latency_avg(self) -> float:
+        return self.latency_sum / self.early_times if self.early_times else 0.0
+
+
+__all__ = ['WakeEvent', ]
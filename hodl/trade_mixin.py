@@ -16,9 +16,18 @@ class TradeMixin(IsolatedStoreBase, ABC):
         self.broker_proxy.refresh_order(order=order)
         return order
 
-    def refresh_order(self, order: Order):
+    def _get_orders(self, orders: list[Order]) -> list[Order]:
+        """
+        通过券商的批量订单接口更新订单, 返回已经更新的订单, 券商不支持时返回空列表
+        """
+        return self.broker_proxy.refresh_orders(orders=orders)
+
+    def refresh_order(self, order: Order, refreshed: bool = False):
+        """
+        refreshed 说明订单已经被批量订单接口更新过, 只需要记录订单的变化
+        """
         symbol = order.symbol
-        if order.refreshable:
+        if order.refreshable and not refreshed:
             self._get_order(order=order)
         if db := self.db:
             unique_id = order.unique_id
@@ -34,14 +43,21 @@ class TradeMixin(IsolatedStoreBase, ABC):
                     create_time=int(order.create_timestamp),
                     update_time=int(TimeTools.us_time_now().timestamp()),
                 )
-                row.save(con=db.conn)
+                db.save(row)
                 self.__ORDER_DUMPS[unique_id] = text
 
     def refresh_orders(self):
+        """
+        可更新的订单先尝试通过一次批量请求更新, 批量请求没有覆盖的订单再逐个更新
+        """
         plan = self.state.plan
         orders = plan.orders
+        refreshable = [order for order in orders if order.refreshable]
+        refreshed = set()
+        if len(refreshable) > 1:
+            refreshed = {id(order) for order in self._get_orders(orders=refreshable)}
         for order in orders:
-            self.refresh_order(order=order)
+            self.refresh_order(order=order, refreshed=id(order) in refreshed)
 
     def _cancel_order(self, order: Order):
         assert order.order_id
@@ -64,10 +80,12 @@ class TradeMixin(IsolatedStoreBase, ABC):
         assert order.qty > 0
         order.region = self.store_config.region
         order.broker = self.store_config.broker
-        if order.create_timestamp is None:
-            order.create_timestamp = TimeTools.us_time_now().timestamp()
-        if order.order_day is None:
-            order.order_day = TimeTools.us_day_now()
+        if order.create_timestamp is None or order.order_day is None:
+            now = TimeTools.clock_time_now()
+            if order.create_timestamp is None:
+                order.create_timestamp = now.timestamp()
+            if order.order_day is None:
+                order.order_day = TimeTools.date_to_ymd(now)
         order.currency = self.store_config.currency
         order.filled_qty = 0
         order.remain_qty = order.qty
@@ -208,13 +208,55 @@ class UiMixin(StoreHodlBase, ABC):
             state=self.state,
         )
 
+    @classmethod
+    def state_change_bar(cls, runtime_state: StoreState) -> list[BarElementDesc]:
+        loops = runtime_state.state_save_loops
+        if not loops:
+            return list()
+        changes = runtime_state.state_section_changes
+        sections = ', '.join(
+            f'{section}:{FormatTool.factor_to_percent(changes[section] / loops)}'
+            for section in State.SECTIONS + (State.OTHER_SECTION, )
+        )
+        save_rate = FormatTool.factor_to_percent(runtime_state.state_save_times / loops)
+        tooltip = f'{loops}次循环中写入状态{runtime_state.state_save_times}次, 各部分改动的频率 {sections}'
+        return [BarElementDesc(content=f'💾{save_rate}', tooltip=tooltip)]
+
+    @classmethod
+    def wake_bar(cls, runtime_state: StoreState) -> list[BarElementDesc]:
+        wake_event = runtime_state.wake_event
+        if not wake_event.early_times:
+            return list()
+        reasons = ', '.join(f'{reason}:{times}' for reason, times in sorted(wake_event.wake_counter.items()))
+        tooltip = f'被事件提前唤醒{wake_event.early_times}次, 等待到期{wake_event.deadline_times}次, ' \
+                  f'事件来源 {reasons}, ' \
+                  f'平均延迟{int(wake_event.latency_avg * 1000)}ms, 最大延迟{int(wake_event.latency_max * 1000)}ms'
+        return [BarElementDesc(content=f'⏰{wake_event.early_times}', tooltip=tooltip)]
+
+    @classmethod
+    def profiler_bar(cls, runtime_state: StoreState) -> list[BarElementDesc]:
+        reports = [report for report in runtime_state.profiler.report() if report.name != 'loop']
+        if not reports:
+            return list()
+        slowest = max(reports, key=lambda i: i.p95)
+        phases = ', '.join(
+            f'{report.name}:{report.p50}/{report.p95}/{report.p99}/{report.max}'
+            for report in reports
+        )
+        tooltip = f'循环各阶段耗时(p50/p95/p99/最大, 毫秒) {phases}'
+        return [BarElementDesc(content=f'⏱️{slowest.name}:{int(slowest.p95)}ms', tooltip=tooltip)]
+
     def secondary_bar(self) -> list[BarElementDesc]:
-        return self.buff_bar(
+        bar = self.buff_bar(
             config=self.store_config,
             state=self.state,
             process_time=self.process_time,
             margin_amount=self.margin_amount(),
         )
+        bar.extend(self.state_change_bar(runtime_state=self.runtime_state))
+        bar.extend(self.wake_bar(runtime_state=self.runtime_state))
+        bar.extend(self.profiler_bar(runtime_state=self.runtime_state))
+        return bar
 
     def warning_alert_bar(self) -> list[str]:
         result = list()
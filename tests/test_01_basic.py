@@ -1,9 +1,26 @@
+import os
+import copy
 import re
+import json
+import random
 import time
 import pytest
+import struct
+import tempfile
+import threading
+from types import SimpleNamespace
+import numpy as np
 from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
 from hodl.unit_test import *
+from hodl.file_writer import *
+from hodl.plan_calc import *
 from hodl.broker import *
+from hodl.proxy import *
+from hodl.simulation.fake_quote_stream import *
+from hodl.cli.threads.quote_prefetch import *
+from hodl.cli.threads.quote_stream import *
 from hodl.state import *
 from hodl.tools import *
 
@@ -244,3 +261,661 @@ class BasicTestCase(HodlTestCase):
         assert order.direction == reload_order.direction
         assert order.qty == reload_order.qty
         assert order.limit_price == reload_order.limit_price
+
+    def test_state_dirty(self):
+        state = State(FormatTool.json_loads(FormatTool.json_dumps({'plan': {'orders': [{'qty': 1}]}})))
+        assert not state.is_dirty
+        assert state.plan.base_price is None
+        assert not state.is_dirty
+
+        state.quote_latest_price = 1.0
+        assert state.dirty_sections == {'latestSnapshot'}
+        state.clear_dirty()
+
+        order = state.plan.orders[0]
+        order.filled_qty = 1
+        assert state.dirty_sections == {'plan'}
+        state.clear_dirty()
+
+        new_order = Order.new_order(
+            symbol='TEST', region='US', broker='broker', currency='USD', level=1, direction='BUY', qty=1,
+            limit_price=1.0,
+        )
+        state.plan.append_order(new_order)
+        state.clear_dirty()
+        new_order.avg_price = 1.0
+        assert state.dirty_sections == {'plan'}
+
+        state.current = 'test'
+        assert state.dirty_sections == {'plan', 'other'}
+        assert '_dirty' not in FormatTool.json_loads(FormatTool.json_dumps(state))
+
+    def test_file_writer(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'state.json')
+            LocateTools.write_file(path, 'v1', atomic=True, fsync=True)
+            assert LocateTools.read_file(path) == 'v1'
+            assert os.listdir(folder) == ['state.json']
+
+            writer = FileWriterThread(min_interval=60.0)
+            written = list()
+            for idx in range(5):
+                writer.put(path, f'v{idx + 2}', on_written=written.append)
+            assert writer.total_coalesced == 4
+            writer.flush()
+            assert LocateTools.read_file(path) == 'v6'
+            assert written == [path]
+
+            writer.put(path, b'v7')
+            assert path in writer.pending and writer.pending[path].due_time > time.time()
+            writer.put(path, b'v8', fsync=True)
+            assert writer.pending[path].due_time == 0.0
+            writer.flush()
+            assert LocateTools.read_file(path) == 'v8'
+            assert writer.total_writes == 2 and writer.total_fsync == 1
+            assert os.listdir(folder) == ['state.json']
+
+            # 删除文件前放弃等待中的写入, 之后的刷新不会重新创建文件
+            writer.put(path, b'v9')
+            last_instance, FileWriterThread.INSTANCE = FileWriterThread.INSTANCE, writer
+            try:
+                assert FileWriterThread.is_pending(path)
+                assert FileWriterThread.discard(path)
+                os.remove(path)
+                assert not FileWriterThread.is_pending(path)
+                assert not FileWriterThread.discard(path)
+            finally:
+                FileWriterThread.INSTANCE = last_instance
+            writer.flush()
+            assert not os.path.exists(path)
+
+    def test_wake_event(self):
+        wake_event = WakeEvent()
+        assert wake_event.wait(0.01) == set()
+        assert wake_event.deadline_times == 1
+
+        def _notify():
+            time.sleep(0.05)
+            wake_event.notify(WakeEvent.QUOTE)
+            wake_event.notify(WakeEvent.ORDER)
+
+        thread = threading.Thread(target=_notify)
+        thread.start()
+        begin = time.monotonic()
+        reasons = wake_event.wait(10.0)
+        thread.join()
+        assert reasons == {WakeEvent.QUOTE, WakeEvent.ORDER}
+        assert time.monotonic() - begin < 5.0
+        assert wake_event.early_times == 1
+
+        wake_event.notify(WakeEvent.CONFIG)
+        begin = time.monotonic()
+        assert wake_event.wait(10.0, min_secs=0.2) == {WakeEvent.CONFIG}
+        assert time.monotonic() - begin >= 0.1
+
+    def test_loop_profiler(self):
+        profiler = LoopProfiler(window=100)
+        for i in range(200):
+            profiler.record('phase', (i % 100 + 1) / 1000)
+        with profiler.phase('other'):
+            pass
+        reports = {report.name: report for report in profiler.report()}
+        report = reports['phase']
+        assert report.count == 100
+        assert (report.p50, report.p95, report.p99, report.max) == (51.0, 95.0, 99.0, 100.0)
+        assert reports['other'].count == 1
+
+        profiler.enable = False
+        assert profiler.phase('disabled') is LoopProfiler.NULL_PHASE
+        with profiler.phase('disabled'):
+            pass
+        assert 'disabled' not in profiler.samples
+
+    def test_order_index(self):
+        state = State.new()
+        state.plan = Plan.new_plan(self.config().store_configs['TEST'])
+        plan = state.plan
+        assert state.plan is plan
+        kwargs = dict(symbol='TEST', region='US', broker='tiger', currency='USD', limit_price=10.0)
+        sell = Order.new_order(level=1, direction='SELL', qty=100, **kwargs)
+        plan.append_order(sell)
+        index = plan.order_index()
+        assert plan.order_index() is index
+        assert plan.sell_order_active_count() == 1 and plan.sell_volume == 0
+        assert plan.current_sell_level() == 1 and plan.current_sell_level_filled() == 0
+
+        state.plan.orders[0].filled_qty = 100
+        state.plan.orders[0].avg_price = 10.0
+        assert plan.order_index() is not index
+        assert plan.sell_order_active_count() == 0
+        assert plan.sell_volume == 100 and plan.total_sell_by_level(1) == 100
+        assert plan.current_sell_level_filled() == 1
+        assert plan.all_today_sell_completed
+
+        buy = Order.new_order(level=1, direction='BUY', qty=100, **kwargs)
+        plan.append_order(buy)
+        assert plan.buy_order_active_count() == 1
+        assert plan.latest_today_buy_order().d is buy.d
+        assert plan.today_contains_buy_level(1) and not plan.should_today_get_off
+        buy.filled_qty = 100
+        buy.avg_price = 9.0
+        assert plan.should_today_get_off
+        assert plan.calc_earning() == 100
+
+        index = plan.order_index()
+        index.days['US'] = '1970-01-01'
+        assert plan.order_index() is not index
+
+    def test_order_index_threads(self):
+        # 网页线程构建索引期间, 持仓线程加入了新订单, 网页线程构建的过时索引不能被保存
+        import hodl.state.state_plan as state_plan
+        plan = Plan.new_plan(self.config().store_configs['TEST'])
+        kwargs = dict(symbol='TEST', region='US', broker='tiger', currency='USD', limit_price=10.0)
+        plan.append_order(Order.new_order(level=1, direction='SELL', qty=100, **kwargs))
+        building = threading.Event()
+        appended = threading.Event()
+        origin_type = state_plan.OrderIndex
+
+        def _slow_index(orders):
+            if threading.current_thread() is not threading.main_thread():
+                building.set()
+                appended.wait(timeout=5)
+            return origin_type(orders)
+
+        result = list()
+        with patch.object(state_plan, 'OrderIndex', side_effect=_slow_index):
+            thread = threading.Thread(target=lambda: result.append(plan.order_index()))
+            thread.start()
+            assert building.wait(timeout=5)
+            plan.append_order(Order.new_order(level=2, direction='SELL', qty=100, **kwargs))
+            appended.set()
+            thread.join()
+        assert len(result[0].orders) == 1
+        assert len(plan.orders) == 2
+        assert plan.sell_order_active_count() == 2
+
+    def test_clock_snapshot(self):
+        tz = 'America/New_York'
+        with TimeTools.clock_snapshot() as snapshot:
+            assert TimeTools.us_time_now(tz=tz) is TimeTools.us_time_now(tz=tz)
+            assert TimeTools.us_day_now(tz=tz) == TimeTools.date_to_ymd(snapshot.utc.astimezone(TimeTools.zone(tz)))
+            with TimeTools.clock_snapshot() as inner:
+                assert TimeTools.snapshot() is inner
+            assert TimeTools.snapshot() is snapshot
+        assert TimeTools.snapshot() is None
+
+        # 快照期间时间保持不变, 快照结束后恢复读取最新的时间; 订单使用的 clock_time_now 不受快照影响
+        first = datetime(2023, 4, 10, 13, 30, tzinfo=TimeTools.zone('UTC'))
+        second = datetime(2023, 4, 11, 13, 30, tzinfo=TimeTools.zone('UTC'))
+        with patch.object(TimeTools, 'utc_now', return_value=first) as utc_now:
+            TimeTools.snapshot_begin()
+            try:
+                utc_now.return_value = second
+                assert TimeTools.us_time_now(tz=tz) == first
+                assert TimeTools.us_day_now(tz=tz) == '2023-04-10'
+                assert TimeTools.clock_time_now(tz=tz) == second
+            finally:
+                TimeTools.snapshot_end()
+            assert TimeTools.us_time_now(tz=tz) == second
+            assert TimeTools.us_day_now(tz=tz) == '2023-04-11'
+
+    def test_profit_table_cache(self):
+        cache = ProfitTableCache(capacity=2)
+        PlanCalc.TABLE_CACHE, last_cache = cache, PlanCalc.TABLE_CACHE
+        try:
+            calc = PlanCalc(weight=[1, 1], sell_rate=[1.03, 1.05], buy_rate=[1.0, 1.01])
+            table = calc.profit_rows(base_price=10.0, max_shares=100)
+            assert calc.profit_rows(base_price=10.0, max_shares=100) is table
+            assert (cache.hits, cache.misses) == (1, 1)
+
+            other = PlanCalc(weight=[1, 1], sell_rate=[1.03, 1.05], buy_rate=[1.0, 1.01])
+            assert other.profit_rows(base_price=10.0, max_shares=100) is table
+            assert calc.profit_rows(base_price=10.0, max_shares=100, sell_spread=0.01) is not table
+            calc.profit_rows(base_price=11.0, max_shares=100)
+            assert cache.size == 2
+            assert calc.profit_rows(base_price=10.0, max_shares=100) is not table
+            assert [row.sell_at for row in table] == [10.3, 10.5]
+            with pytest.raises(Exception):
+                table[0].sell_at = 1.0
+        finally:
+            PlanCalc.TABLE_CACHE = last_cache
+
+    def test_profit_rows_batch(self):
+        def _reference(calc: PlanCalc, base_price, max_shares, buy_spread, sell_spread, precision, shares_per_unit,
+                       buy_spread_rate, sell_spread_rate):
+            weight, sell_rate, buy_rate = calc.weight, calc.sell_rate, calc.buy_rate
+            rows = list()
+            sum_shares = 0
+            for i in range(len(weight)):
+                range_weight = weight[0:i + 1]
+                sell_cog = sum(weight[j] * sell_rate[j] for j in range(i + 1))
+                buy_cog = sum(range_weight) * buy_rate[i]
+                cog_diff = sell_cog - buy_cog
+                sell_points = FormatTool.spread(base_price * sell_rate[i], precision, sell_spread, sell_spread_rate)
+                buy_points = FormatTool.spread(base_price * buy_rate[i], precision, buy_spread, buy_spread_rate)
+                range_shares = int(max_shares * sum(range_weight) / sum(weight))
+                shares = (range_shares - sum_shares) // shares_per_unit * shares_per_unit
+                sum_shares += shares
+                if shares <= 0:
+                    return list()
+                rows.append((
+                    FormatTool.adjust_precision(cog_diff / sum(weight), precision),
+                    FormatTool.adjust_precision(cog_diff / sum(range_weight) + 1, 6),
+                    FormatTool.adjust_precision(cog_diff / sum(weight) + 1, 6),
+                    FormatTool.adjust_precision(base_price * sell_rate[i] + sell_points, precision),
+                    FormatTool.adjust_precision(base_price * buy_rate[i] - buy_points, precision),
+                    buy_points,
+                    sell_points,
+                    shares,
+                ))
+            return rows
+
+        rnd = random.Random(20230410)
+        for _ in range(50):
+            size = rnd.randint(1, 8)
+            calc = PlanCalc(
+                weight=[rnd.choice([1, 1.5, 0.3, 2, 0.7]) for _ in range(size)],
+                sell_rate=[1 + rnd.random() / 10 for _ in range(size)],
+                buy_rate=[1 + rnd.random() / 20 for _ in range(size)],
+            )
+            kwargs = dict(
+                max_shares=rnd.choice([100, 1000, 3333, 20000]),
+                buy_spread=rnd.choice([None, 0.01, 0.005]),
+                sell_spread=rnd.choice([None, 0.01, 0.005]),
+                precision=rnd.choice([2, 3]),
+                shares_per_unit=rnd.choice([1, 100]),
+                buy_spread_rate=rnd.choice([None, 0.0015]),
+                sell_spread_rate=rnd.choice([None, 0.0015]),
+            )
+            prices = np.round(np.linspace(0.5, 500.0, 97), 3)
+            tables = calc.profit_rows_batch(base_prices=prices, **kwargs)
+            for price, table in zip(prices.tolist(), tables):
+                expected = _reference(calc, base_price=price, **kwargs)
+                actual = [
+                    (r.value, r.float_rate, r.total_rate, r.sell_at, r.buy_at, r.buy_spread, r.sell_spread, r.shares)
+                    for r in table
+                ]
+                assert actual == expected
+
+    def test_adjust_precision_equivalence(self):
+        # 随机生成各种量级的浮点数, 包括恰好落在舍入边界上的十进制数, 以及任意比特位组成的浮点数,
+        # 快速路径和 Decimal 路径的结果必须完全一致(包括负零和异常)
+        rnd = random.Random(20230410)
+        for _ in range(100000):
+            match rnd.randint(0, 3):
+                case 0:
+                    f = rnd.uniform(-1e4, 1e4)
+                case 1:
+                    f = float(f'{rnd.randint(-10 ** 6, 10 ** 6)}5e-{rnd.randint(1, 8)}')
+                case 2:
+                    f = rnd.uniform(-1e15, 1e15) * 10 ** -rnd.randint(0, 20)
+                case _:
+                    f = struct.unpack('d', struct.pack('Q', rnd.getrandbits(64)))[0]
+            precision = rnd.randint(0, 12)
+            try:
+                expected = FormatTool._adjust_precision_decimal(f, precision)
+            except Exception as e:
+                expected = type(e)
+            try:
+                actual = FormatTool.adjust_precision(f, precision)
+            except Exception as e:
+                actual = type(e)
+            if isinstance(expected, float) and expected != expected:
+                assert actual != actual
+            else:
+                assert repr(actual) == repr(expected)
+        assert FormatTool.adjust_precision(1, 2) == 1.0
+        assert FormatTool.adjust_precision(np.float64(2.675), 2) == 2.67
+
+    def test_quote_hub(self):
+        # 多个持仓同时请求同一标的的行情, 只调用一次券商接口, 其余请求共享结果或者异常, 并且记录在接口统计中
+        api_type = BrokerApiBase.all_brokers_type()[0]
+        hub = QuoteHub(max_age=60.0)
+        key = (api_type.BROKER_NAME, 'stock', 'US', 'TEST', )
+        calls = list()
+        entered = threading.Event()
+        release = threading.Event()
+
+        def _fetch():
+            calls.append(1)
+            entered.set()
+            release.wait(timeout=5.0)
+            return 'QUOTE'
+
+        results = list()
+        leader = threading.Thread(target=lambda: results.append(hub.fetch(api_type, key, _fetch)))
+        leader.start()
+        entered.wait(timeout=5.0)
+        followers = [
+            threading.Thread(target=lambda: results.append(hub.fetch(api_type, key, _fetch)))
+            for _ in range(4)
+        ]
+        for thread in followers:
+            thread.start()
+        while hub.coalesce_times < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+        assert results == ['QUOTE'] * 5
+        assert len(calls) == 1
+        assert (hub.miss_times, hub.coalesce_times, ) == (1, 4, )
+
+        assert hub.fetch(api_type, key, _fetch, using_cache=True) == 'QUOTE'
+        assert hub.hit_times == 1 and len(calls) == 1
+
+        def _error():
+            raise ValueError('fetch failed')
+
+        with pytest.raises(ValueError):
+            hub.fetch(api_type, ('other', ), _error)
+        assert not hub.flights
+
+        reports = [report for report in track_api_report() if report.api_type is api_type and report.api_name == '行情快照']
+        assert reports and reports[0].hit_times >= 1 and reports[0].coalesce_times >= 4
+
+    def test_fetch_quotes(self):
+        # 批量行情按 batch_quote_size 分批请求, 结果按标的整理, 放入行情中心后持仓直接读取, 不再调用单个标的的行情接口
+        broker = HttpTradingBase(
+            symbol=None,
+            name=None,
+            broker_config={'base_site': 'http://127.0.0.1/', 'instance_id': 'i', 'batch_quote': True, 'batch_quote_size': 2},
+        )
+        assert broker.batch_quote_enabled()
+        symbols = ['AAPL', 'TSLA', '00700', 'NVDA', 'MSFT', ]
+        urls = list()
+
+        def _request(method, url, **kwargs):
+            urls.append(url)
+            query = url.split('symbols=', 1)[1]
+            contracts = [item.split('.', 1) for item in query.split(',')]
+            return {'quotes': [
+                {
+                    'contract': {'region': region, 'symbol': symbol},
+                    'openPrice': 1.0, 'preClose': 1.0, 'latest': 1.5, 'lowPrice': 1.0, 'highPrice': 2.0,
+                    'timestamp': 1681133400000, 'isTradable': True,
+                }
+                for region, symbol in contracts
+            ]}
+
+        with patch.object(HttpTradingBase, '_http_request', side_effect=_request):
+            quotes = broker.fetch_quotes(symbols + ['AAPL', ])
+        assert len(urls) == 3
+        assert '/market/quotes?tradeType=Securities&symbols=US.AAPL,US.TSLA' in urls[0]
+        assert 'HK.00700' in urls[1]
+        assert list(quotes) == symbols
+        assert quotes['00700'].latest_price == 1.5 and quotes['00700'].time.year == 2023
+
+        hub = QuoteHub()
+        key = (broker.BROKER_NAME, 'stock', 'US', 'AAPL', )
+        hub.put_prefetched(key, quotes['AAPL'])
+        assert hub.fetch(HttpTradingBase, key, lambda: None) is quotes['AAPL']
+        assert hub.hit_times == 1 and hub.miss_times == 0
+
+        # 预拉取线程只为交易时段中的持仓拉取行情, 字段异常的行情不会进入行情中心
+        def _store(symbol: str, market_status: str):
+            hub_key = (broker.BROKER_NAME, 'stock', 'US', symbol, )
+            return SimpleNamespace(
+                broker_proxy=SimpleNamespace(quote_candidates=lambda: [(broker, hub_key, )]),
+                store_config=SimpleNamespace(trade_type='stock', region='US', symbol=symbol),
+                state=SimpleNamespace(sleep_mode_active=False, market_status=market_status),
+                runtime_state=SimpleNamespace(calendar=None),
+            )
+
+        def _null_open(method, url, **kwargs):
+            d = _request(method, url, **kwargs)
+            for quote_d in d['quotes']:
+                if quote_d['contract']['symbol'] == 'TSLA':
+                    quote_d['openPrice'] = None
+            return d
+
+        hub = QuoteHub()
+        stores = [_store('AAPL', 'TRADING'), _store('TSLA', 'PRE_HOUR_TRADING'), _store('NVDA', 'CLOSING')]
+        thread = QuotePrefetchThread(stores=stores, hub=hub)
+        urls.clear()
+        with patch.object(HttpTradingBase, '_http_request', side_effect=_null_open):
+            thread.run_once()
+            assert len(urls) == 1 and 'NVDA' not in urls[0]
+            assert thread.total_quotes == 1 and thread.invalid_times == 1
+            assert hub.prefetched.get(stores[0].broker_proxy.quote_candidates()[0][1])
+            assert hub.prefetched.get(stores[1].broker_proxy.quote_candidates()[0][1]) is None
+            for store in stores:
+                store.state.market_status = 'CLOSING'
+            thread.run_once()
+            assert len(urls) == 1
+
+    def test_refresh_orders(self):
+        # 3个待更新的订单只需要一次批量订单请求, 接口没有返回的订单不会被更新, 留给逐个刷新
+        broker = HttpTradingBase(
+            symbol='TEST',
+            name=None,
+            broker_config={'base_site': 'http://127.0.0.1/', 'instance_id': 'i', 'batch_order': True},
+        )
+        assert broker.batch_order_enabled()
+        orders = list()
+        for idx in range(3):
+            order = Order.new_order(
+                symbol='TEST', region='US', broker='tiger', currency='USD', level=idx + 1,
+                direction='SELL', qty=100, limit_price=10.0,
+            )
+            order.order_id = f'O{idx}'
+            order.filled_qty = 0
+            orders.append(order)
+        urls = list()
+
+        def _request(method, url, **kwargs):
+            urls.append(url)
+            return {'orders': [
+                {'orderId': 'O0', 'qty': 100, 'filledQty': 100, 'avgPrice': 10.0, 'isCanceled': False},
+                {'orderId': 'O1', 'qty': 100, 'filledQty': 40, 'avgPrice': 10.0, 'isCanceled': True},
+            ]}
+
+        with patch.object(HttpTradingBase, '_http_request', side_effect=_request):
+            refreshed = broker.refresh_orders(orders)
+        assert len(urls) == 1 and urls[0].endswith('/order/states?orderIds=O0,O1,O2')
+        assert refreshed == orders[:2]
+        assert orders[0].is_filled
+        assert orders[1].filled_qty == 40 and orders[1].is_canceled
+        assert orders[2].filled_qty == 0
+
+    def test_account_snapshot(self):
+        # 同一券商账户的多个持仓共用持仓和现金快照, 下单后快照立即失效
+        config = {'base_site': 'http://127.0.0.1/', 'instance_id': 'snapshot', 'account_cache_ttl': 60.0}
+        brokers = [HttpTradingBase(symbol=symbol, name=None, broker_config=config) for symbol in ('AAPL', 'TSLA', 'NVDA', )]
+        urls = list()
+
+        def _request(method, url, **kwargs):
+            urls.append(url)
+            if url.endswith('/position/state'):
+                return {'positions': [
+                    {'contract': {'tradeType': 'Securities', 'region': 'US', 'symbol': 'AAPL'}, 'qty': 100},
+                    {'contract': {'tradeType': 'Securities', 'region': 'US', 'symbol': 'TSLA'}, 'qty': 200},
+                ]}
+            if url.endswith('/cash/state'):
+                return {'cash': {'currency': 'USD', 'amount': 1000.0}}
+            if url.endswith('/order/place'):
+                return {'orderId': 'O1'}
+            return dict()
+
+        with patch.object(HttpTradingBase, '_http_request', side_effect=_request):
+            assert [broker.query_chips() for broker in brokers] == [100, 200, 0]
+            assert [broker.query_cash() for broker in brokers] == [1000.0] * 3
+            assert len(urls) == 2
+
+            order = Order.new_order(
+                symbol='AAPL', region='US', broker='tiger', currency='USD', level=1,
+                direction='SELL', qty=100, limit_price=10.0,
+            )
+            brokers[0].place_order(order)
+            assert brokers[1].query_chips() == 200
+            assert len(urls) == 4
+
+            broker = HttpTradingBase(symbol='AAPL', name=None, broker_config=config | {'account_cache_ttl': 0})
+            broker.query_cash()
+            broker.query_cash()
+            assert len(urls) == 6
+
+    def test_async_transport(self):
+        # 异步传输层中, 同一个券商实例的并发请求不超过 max_concurrency, 超出的请求排队等待, 结果与阻塞会话一致
+        state = {'active': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                time.sleep(0.05)
+                body = json.dumps({'pong': True, 'token': self.headers.get('HT-TOKEN')}).encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    state['active'] -= 1
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base_site = f'http://127.0.0.1:{server.server_port}/'
+            config = {'base_site': base_site, 'instance_id': 'i', 'token': 'T', 'max_concurrency': 2, 'async_transport': True}
+            broker = HttpTradingBase(symbol='TEST', name=None, broker_config=config)
+            results = list()
+            threads = [
+                threading.Thread(target=lambda: results.append(broker._http_get('/httptrading/api/{instance_id}/ping/state')))
+                for _ in range(6)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert results == [{'pong': True, 'token': 'T'}] * 6
+            assert state['peak'] == 2
+
+            # 排队的时间计入超时: 每个请求只需要 0.05 秒, 但是串行排队的 8 个请求中, 排在后面的会超过 0.2 秒
+            config = config | {'max_concurrency': 1}
+            broker = HttpTradingBase(symbol='TEST', name=None, broker_config=config)
+            results = list()
+
+            def _get():
+                try:
+                    broker._http_get('/httptrading/api/{instance_id}/ping/state', timeout=0.2)
+                    results.append(True)
+                except Exception as e:
+                    results.append(False)
+
+            threads = [threading.Thread(target=_get) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert len(results) == 8 and not all(results)
+
+            config = {'base_site': base_site, 'instance_id': 'i', 'token': 'T'}
+            broker = HttpTradingBase(symbol='TEST', name=None, broker_config=config)
+            assert broker._transport_args() == dict()
+            assert broker.detect_plug_in()
+        finally:
+            server.shutdown()
+
+    def test_rate_limiter(self):
+        # 限流闸门中, 下单优先于可用资金查询; 连续失败后速率减半, 成功调用逐步恢复速率
+        gate = RateGate(budget=600)
+        while gate.bucket.try_consume():
+            pass
+        admitted = list()
+
+        def _call(api_name):
+            gate.acquire(api_name, RateLimiter.priority(api_name))
+            admitted.append(api_name)
+
+        low = threading.Thread(target=_call, args=('query_cash', ))
+        low.start()
+        while gate.depth() < 1:
+            time.sleep(0.001)
+        high = threading.Thread(target=_call, args=('place_order', ))
+        high.start()
+        low.join()
+        high.join()
+        assert admitted == ['place_order', 'query_cash']
+        assert gate.depth() == 0
+
+        for _ in range(RateGate.ERROR_BURST):
+            gate.feedback(False)
+        assert gate.rate == 300.0
+        assert gate.bucket.leak_rate == 300.0
+        gate.feedback(True)
+        assert gate.rate == 330.0
+
+        class _LimitedApi(BrokerApiBase):
+            BROKER_DISPLAY = 'rate_limit'
+
+            @track_api
+            def fetch_quote(self):
+                raise ConnectionError('429')
+
+        api = _LimitedApi(symbol='AAPL', name=None, broker_config={'rate_limit': {'fetch_quote': 600}})
+        for _ in range(12):
+            with pytest.raises(ConnectionError):
+                api.fetch_quote()
+        assert RateLimiter.find_gate(_LimitedApi, 'fetch_quote').decrease_times == 1
+        report = [report for report in track_api_report() if report.api_type is _LimitedApi][0]
+        assert report.error_times == 12
+        assert report.rate_limit == 300.0
+        assert report.wait_times > 0 and report.queue_depth == 0
+        assert RateLimiter.gate(_LimitedApi, 'query_cash', {'rate_limit': {'fetch_quote': 600}}) is None
+
+    def test_quote_stream(self):
+        # 推送的行情进入行情中心后直接提供给持仓使用, 推送断开后自动重连, 推送过期后恢复拉取行情
+        with FakeQuoteStreamServer(heartbeat=0.1) as server:
+            config = {'base_site': server.base_site, 'instance_id': 'stream', 'stream_quote': True}
+            broker = HttpTradingBase(symbol='AAPL', name=None, broker_config=config)
+            assert broker.stream_quote_enabled()
+            hub = QuoteHub(stream_age=0.5)
+            hub_key = ('stream', 'STOCK', 'US', 'AAPL', )
+            thread = QuoteStreamThread(stores=list(), hub=hub)
+            received = list()
+            event = threading.Event()
+
+            def _callback(quote):
+                thread.on_quote({'AAPL': hub_key}, quote)
+                received.append(quote)
+                event.set()
+
+            subscription = broker.subscribe_quotes(['AAPL', 'TSLA', ], _callback)
+            assert subscription.connected.wait(timeout=5)
+            assert server.publish('NVDA', 1.0) == 0
+            assert server.publish('AAPL', 10.0) == 1
+            assert event.wait(timeout=5)
+            quote = received[0]
+            assert quote.symbol == 'AAPL' and quote.latest_price == 10.0 and quote.status == 'NORMAL'
+            assert hub.fetch(HttpTradingBase, hub_key, func=lambda: None) is quote
+            assert hub.stream_times == 1 and thread.total_quotes == 1
+            malformed = copy.copy(quote)
+            malformed.open = None
+            thread.on_quote({'AAPL': hub_key}, malformed)
+            assert thread.invalid_times == 1 and thread.total_quotes == 1
+            assert hub.fetch(HttpTradingBase, hub_key, func=lambda: None) is quote
+
+            connect_times = subscription.connect_times
+            server.disconnect()
+            begin = time.time()
+            while subscription.connect_times == connect_times and time.time() - begin < 5:
+                time.sleep(0.01)
+            assert subscription.connect_times == connect_times + 1
+            event.clear()
+            server.publish('AAPL', 11.0)
+            assert event.wait(timeout=5)
+            assert not hub.put_streamed(hub_key, received[-1])
+
+            time.sleep(0.6)
+            quote = hub.fetch(HttpTradingBase, hub_key, func=broker.fetch_quote)
+            assert quote.latest_price == 11.0 and server.quote_times == 1
+
+            subscription.close()
+            subscription.thread.join(timeout=5)
+            assert not subscription.alive
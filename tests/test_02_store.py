@@ -1,4 +1,5 @@
 from hodl.unit_test import *
+from hodl.tools import *
 
 
 class StoreTestCase(HodlTestCase):
@@ -196,6 +197,45 @@ class StoreTestCase(HodlTestCase):
         files = store.files
         assert files['/a/b/c.json']
 
+    def test_state_in_memory(self):
+        # 验证状态文件只在被外部修改或者删除后才重新读取
+        class _Store(SimulationStore):
+            read_times = 0
+
+            def read_file_mock(self, path: str):
+                self.read_times += 1
+                return super().read_file_mock(path)
+
+        store_config = self.config().store_configs['TEST']
+        store_config['state_file_path'] = '/a/b/c.json'
+        pc = 10.0
+        ticks = [
+            Tick(time=f'23-04-10T09:30:{i:02d}-04:00:00', pre_close=pc, open=pc, latest=pc, )
+            for i in range(5)
+        ]
+        store = SimulationBuilder.from_config(store_config=store_config, ticks=ticks, store_type=_Store)
+        assert store.read_times == 1
+
+        d = FormatTool.json_loads(store.files['/a/b/c.json'])
+        d['externalMark'] = True
+        store.files['/a/b/c.json'] = FormatTool.json_dumps(d)
+        ticks = [
+            Tick(time='23-04-10T09:31:00-04:00:00', pre_close=pc, open=pc, latest=pc, ),
+            Tick(time='23-04-10T09:31:01-04:00:00', pre_close=pc, open=pc, latest=pc, ),
+        ]
+        store = SimulationBuilder.resume(store=store, ticks=ticks)
+        assert store.read_times == 2
+        assert store.state.get('externalMark')
+
+        del store.files['/a/b/c.json']
+        ticks = [
+            Tick(time='23-04-10T09:32:00-04:00:00', pre_close=pc, open=pc, latest=pc, ),
+        ]
+        store = SimulationBuilder.resume(store=store, ticks=ticks)
+        assert store.read_times == 3
+        assert not store.state.get('externalMark')
+        assert store.files['/a/b/c.json']
+
     def test_bars(self):
         # 触发持仓线程的监控可视化状态更新动作，覆盖测试相关代码。
         pc = 10.0
@@ -207,6 +247,29 @@ class StoreTestCase(HodlTestCase):
         store = SimulationBuilder.from_symbol(symbol='TEST', ticks=ticks)
         store.call_bars()
 
+    def test_loop_profiler(self):
+        # 持仓循环的各个阶段被计时, 关闭统计后不再记录样本
+        pc = 10.0
+        ticks = [
+            Tick(time=f'23-04-10T09:30:{i:02d}-04:00:00', pre_close=pc, open=pc, latest=pc, )
+            for i in range(3)
+        ]
+        store = SimulationBuilder.from_symbol(symbol='TEST', ticks=ticks)
+        reports = {report.name: report for report in store.runtime_state.profiler.report()}
+        assert reports['loop'].count >= len(ticks)
+        for name in ('load_state', 'prepare_quote', 'risk_control', 'try_fire_orders', 'save_state', ):
+            assert reports[name].count
+            assert reports[name].p50 <= reports[name].p99 <= reports[name].max
+        assert store.profiler_bar(store.runtime_state)
+
+        store.runtime_state.profiler.reset()
+        store.runtime_state.variable._config['store_profiler_enable'] = False
+        ticks = [
+            Tick(time='23-04-10T09:31:00-04:00:00', pre_close=pc, open=pc, latest=pc, ),
+        ]
+        store = SimulationBuilder.resume(store=store, ticks=ticks)
+        assert not store.runtime_state.profiler.report()
+
     def test_cancel_outdated_buy(self):
         # 模拟上涨3%, 然后下跌到‘接近’0%, 即触发买单下达且不成交,
         # 但是立刻变为+5.5%, 成功卖出第二档,
@@ -1,5 +1,10 @@
 import pytest
+from datetime import datetime
+from unittest.mock import patch
 from hodl.exception_tools import *
+from hodl.risk_control import *
+from hodl.state import *
+from hodl.tools import *
 from hodl.unit_test import *
 
 
@@ -102,3 +107,38 @@ class RiskControlTestCase(unittest.TestCase):
         with pytest.raises(RiskControlError):
             with store.order_behavior(filled_qty=100_000, freeze_qty=True):
                 SimulationBuilder.resume(store, ticks)
+
+    def test_risk_ledger(self):
+        # 测试风控账本记录当天提交过的订单, 计划被清空后当日下单次数仍然有效, 重复的订单被拒绝, 并且跨日后记录被清除。
+        var = HodlTestCase.config()
+        store_config = var.store_configs['TEST']
+        ledger = RiskLedger(region=store_config.region)
+        plan = Plan.new_plan(store_config)
+        days = [
+            datetime.fromisoformat('2023-04-10T10:00:00-04:00'),
+            datetime.fromisoformat('2023-04-11T10:00:00-04:00'),
+        ]
+        with patch.object(TimeTools, 'utc_now', side_effect=lambda: days[0]):
+            for level in range(1, 4):
+                order = Order.new_config_order(store_config, direction='SELL', qty=100, limit_price=10.0, level=level)
+                order.order_id = str(level)
+                plan.append_order(order)
+            ledger.sync(plan)
+            assert ledger.today_times == 3
+            index = plan.order_index()
+            assert index.sell_exposure == 300 and index.buy_exposure == 0
+            ledger.sync(plan)
+            assert ledger.today_times == 3
+
+            plan.d['orders'] = list()
+            plan.mark_changed()
+            ledger.sync(plan)
+            assert ledger.today_times == 3
+            with pytest.raises(RiskControlError):
+                order = Order.new_config_order(store_config, direction='SELL', qty=100, limit_price=10.0, level=1)
+                order.order_id = '1'
+                ledger.record(order, version='V')
+
+        with patch.object(TimeTools, 'utc_now', side_effect=lambda: days[1]):
+            ledger.sync(plan)
+            assert ledger.today_times == 0
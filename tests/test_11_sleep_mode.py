@@ -1,5 +1,8 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 from hodl.unit_test import *
 from hodl.sleep_mixin import *
+from hodl.tools import *
 
 
 class SleepModeTestCase(HodlTestCase):
@@ -39,3 +42,72 @@ class SleepModeTestCase(HodlTestCase):
         for tick, result in cn_ticks_table:
             time = tick.to_fake_quote().time
             assert is_trading_minute(calendar=cn_calendar, time=time) is result
+
+    def test_trading_schedule(self):
+        # 交易日历只加载一次, 并且交易时段缓存与第三方交易日历模块的逐分钟判断结果一致,
+        # 休市期间可以计算出距离下一次开盘的秒数.
+        var = self.config()
+        us_store_config = var.store_configs['TEST']
+        cn_store_config = var.store_configs['000001']
+        assert us_store_config.trading_calendar is us_store_config.trading_calendar
+        for calendar in (us_store_config.trading_calendar, cn_store_config.trading_calendar, ):
+            schedule = TradingSchedule.by_calendar(calendar)
+            assert TradingSchedule.by_calendar(calendar) is schedule
+            begin = TimeTools.from_timestamp(
+                Tick(time='23-04-28T00:00:00+00:00:00', pre_close=0.0, open=0.0, latest=0.0, ).to_fake_quote().time.timestamp(),
+                tz='UTC',
+            )
+            for minutes in range(0, 6 * 24 * 60, 7):
+                time = TimeTools.timedelta(begin, minutes=minutes)
+                assert schedule.is_trading(time) is calendar.is_trading_minute(time)
+
+        schedule = TradingSchedule.by_calendar(us_store_config.trading_calendar)
+        time = Tick(time='23-04-07T09:00:00-04:00:00', pre_close=0.0, open=0.0, latest=0.0, ).to_fake_quote().time
+        assert schedule.seconds_until_open(time) == 3 * 86400 + 30 * 60  # 耶稣受难日到周一开盘
+        time = Tick(time='23-04-10T09:29:30-04:00:00', pre_close=0.0, open=0.0, latest=0.0, ).to_fake_quote().time
+        assert schedule.seconds_until_open(time) == 30
+        assert schedule.is_trading(time, forward_minutes=1)
+        time = Tick(time='23-04-10T10:00:00-04:00:00', pre_close=0.0, open=0.0, latest=0.0, ).to_fake_quote().time
+        assert schedule.seconds_until_open(time) == 0
+
+    def test_invisible_sleep_before_open(self):
+        # 不可见持仓放大的等待间隔不能越过开盘前一分钟
+        var = self.config()
+        store_config = var.store_configs['TEST']
+        wake_event = MagicMock()
+        runtime_state = SimpleNamespace(
+            sleep_secs=1200.0,
+            calendar=store_config.trading_calendar,
+            variable=var,
+            wake_event=wake_event,
+        )
+        config = SimpleNamespace(sleep_mode=True, visible=False)
+        state = SimpleNamespace(market_status='CLOSING', sleep_mode_active=False)
+        store = SimpleNamespace(runtime_state=runtime_state, state=state, args=lambda: (config, state, None))
+        time = Tick(time='23-04-10T09:00:00-04:00:00', pre_close=0.0, open=0.0, latest=0.0, ).to_fake_quote().time
+        with patch.object(TimeTools, 'utc_now', return_value=time):
+            SleepMixin.sleep(store)
+        assert state.sleep_mode_active
+        assert wake_event.wait.call_args.args[0] == 29 * 60
+
+    def test_sleep_mode_limit(self):
+        # 默认沿用刷新间隔的8倍, 设置 sleep_mode_limit 后按它等待, 但都不越过开盘前一分钟
+        var = self.config()
+        store_config = var.store_configs['TEST']
+        time = Tick(time='23-04-08T09:00:00-04:00:00', pre_close=0.0, open=0.0, latest=0.0, ).to_fake_quote().time
+        for limit, secs in ((None, 96.0, ), (3600, 3600, ), ):
+            var._config['sleep_mode_limit'] = limit
+            wake_event = MagicMock()
+            runtime_state = SimpleNamespace(
+                sleep_secs=12.0,
+                calendar=store_config.trading_calendar,
+                variable=var,
+                wake_event=wake_event,
+            )
+            config = SimpleNamespace(sleep_mode=True, visible=True)
+            state = SimpleNamespace(market_status='CLOSED', sleep_mode_active=False)
+            store = SimpleNamespace(runtime_state=runtime_state, state=state, args=lambda: (config, state, None))
+            with patch.object(TimeTools, 'utc_now', return_value=time):
+                SleepMixin.sleep(store)
+            assert state.sleep_mode_active
+            assert wake_event.wait.call_args.args[0] == secs
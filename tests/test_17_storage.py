@@ -0,0 +1,322 @@
+import os
+import sys
+import tempfile
+import subprocess
+import threading
+from hodl.unit_test import *
+from hodl.storage import *
+from hodl.tools import *
+from hodl.cli.threads.db_retention import *
+
+
+class StorageTestCase(HodlTestCase):
+    """
+    验证本地数据库的连接方式, 以及各个数据表的读写功能
+    """
+
+    def test_wal_mode(self):
+        """
+        WAL 模式下, 每个线程获得自己的连接, 不同线程写入的数据彼此可见, 并且写锁的等待被记录
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            db = LocalDb(os.path.join(folder, 'test.db'), wal_mode=True)
+            assert db.wal_mode
+            mode = db.conn.execute('PRAGMA journal_mode;').fetchone()[0]
+            assert mode == 'wal'
+
+            main_conn = db.conn
+            assert db.conn is main_conn
+            lock_times = db.lock_stats.times
+            thread_conn = list()
+
+            def _write():
+                thread_conn.append(db.conn)
+                row = AlarmRow(key='K', is_set=1, symbol='TEST', broker='tiger', update_time=1)
+                row.save(con=db.conn)
+
+            thread = threading.Thread(target=_write)
+            thread.start()
+            thread.join()
+            assert thread_conn[0] is not main_conn
+            assert db.pool_size == 2
+            assert AlarmRow.query_by_key(con=db.conn, key='K').is_set
+            assert db.lock_stats.times == lock_times + 1
+            db.close()
+            assert db.pool_size == 0
+
+    def test_memory_db_shared(self):
+        """
+        内存数据库无法跨连接共享, 即使要求 WAL 模式, 仍然使用唯一的共享连接
+        """
+        db = LocalDb(':memory:', wal_mode=True)
+        assert not db.wal_mode
+        conn = list()
+        thread = threading.Thread(target=lambda: conn.append(db.conn))
+        thread.start()
+        thread.join()
+        assert conn[0] is db.conn
+
+    def test_write_behind_sync(self):
+        """
+        同步模式的后写队列在放入数据行时立即写入
+        """
+        db = LocalDb(':memory:')
+        db.writer = WriteBehindQueue(db=db, sync=True)
+        row = QuoteLowHistoryRow(broker='tiger', region='US', symbol='TEST', day=20230410, low_price=9.5, update_time=1)
+        db.save(row)
+        items = QuoteLowHistoryRow.query_by_symbol(db.conn, 'tiger', 'US', 'TEST', 20230401, 20230430)
+        assert len(items) == 1
+        assert db.writer.total_batches == 1
+
+    def test_write_behind_batch(self):
+        """
+        后写队列把多行数据合并在一个事务中写入, 关闭时剩余的数据行被持久化
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            db = LocalDb(os.path.join(folder, 'test.db'), wal_mode=True)
+            writer = WriteBehindQueue(db=db, flush_interval=60.0, flush_rows=1000)
+            db.writer = writer
+            writer.start(name='dbWriter')
+            for day in range(20230401, 20230411):
+                db.save(QuoteHighHistoryRow(
+                    broker='tiger', region='US', symbol='TEST', day=day, high_price=10.0, update_time=1,
+                ))
+            db.save(OrderRow(
+                unique_id='tiger.2023-04-10.1', symbol='TEST', order_id='1', region='US', broker='tiger',
+                create_time=1, update_time=1, content='{}',
+            ))
+            items = QuoteHighHistoryRow.query_by_symbol(db.conn, 'tiger', 'US', 'TEST', 20230401, 20230430)
+            assert len(items) == 0
+
+            db.close()
+            assert writer.total_rows == 11
+            assert writer.total_batches == 1
+            db = LocalDb(os.path.join(folder, 'test.db'), wal_mode=True)
+            items = QuoteHighHistoryRow.query_by_symbol(db.conn, 'tiger', 'US', 'TEST', 20230401, 20230430)
+            assert len(items) == 10
+            assert len(OrderRow.items_after_create_time(db.conn, create_time=0)) == 1
+            db.close()
+
+    def test_write_behind_atexit(self):
+        """
+        进程退出前没有关闭数据库时, 后写队列中剩余的数据行仍然被持久化
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'test.db')
+            code = '\n'.join([
+                'from hodl.storage import *',
+                f'db = LocalDb({path!r}, wal_mode=True)',
+                'writer = WriteBehindQueue(db=db, flush_interval=60.0, flush_rows=1000)',
+                'db.writer = writer',
+                'writer.prepare()',
+                'writer.start(name="dbWriter")',
+                'for day in range(20230401, 20230411):',
+                '    db.save(QuoteHighHistoryRow(',
+                '        broker="tiger", region="US", symbol="TEST", day=day, high_price=10.0, update_time=1,',
+                '    ))',
+            ])
+            subprocess.run([sys.executable, '-c', code], check=True, timeout=60)
+            db = LocalDb(path, wal_mode=True)
+            items = QuoteHighHistoryRow.query_by_symbol(db.conn, 'tiger', 'US', 'TEST', 20230401, 20230430)
+            assert len(items) == 10
+            db.close()
+
+    def test_daily_candle(self):
+        """
+        日线表原地更新同一天的数据, 并且旧的最高价/最低价历史表只被迁移一次
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'test.db')
+            db = LocalDb(path)
+            db.conn.execute('PRAGMA user_version=0;')
+            db.conn.execute('DELETE FROM `daily_candle`;')
+            QuoteLowHistoryRow(broker='tiger', region='US', symbol='TEST', day=20230410, low_price=9.0, update_time=1).save(db.conn)
+            QuoteHighHistoryRow(broker='tiger', region='US', symbol='TEST', day=20230410, high_price=11.0, update_time=2).save(db.conn)
+            QuoteLowHistoryRow(broker='tiger', region='US', symbol='TEST', day=20230411, low_price=9.5, update_time=3).save(db.conn)
+            db.close()
+
+            db = LocalDb(path)
+            items = DailyCandleRow.query_by_symbol(db.conn, 'tiger', 'US', 'TEST', 20230401, 20230430)
+            assert len(items) == 1
+            assert items[0].high_price == 11.0 and items[0].low_price == 9.0
+            assert db.conn.execute('PRAGMA user_version;').fetchone()[0] >= 1
+
+            kwargs = dict(broker='tiger', region='US', symbol='TEST', day=20230411)
+            db.save(DailyCandleRow(**kwargs, open_price=10.0, high_price=10.0, close_price=10.0, update_time=4))
+            db.save(DailyCandleRow(**kwargs, open_price=10.0, high_price=10.5, close_price=10.2, update_time=5))
+            items = DailyCandleRow.query_by_symbol(db.conn, 'tiger', 'US', 'TEST', 20230401, 20230430, asc=False)
+            assert [item.day for item in items] == [20230411, 20230410]
+            item = items[0]
+            assert (item.open_price, item.high_price, item.low_price, item.close_price) == (10.0, 10.5, 9.5, 10.2)
+            db.close()
+
+            db = LocalDb(path)
+            assert len(DailyCandleRow.query_by_symbol(db.conn, 'tiger', 'US', 'TEST', 20230401, 20230430)) == 2
+            db.close()
+
+    def test_daily_candle_close_throttle(self):
+        """
+        没有后写队列时, 只有最新价变化的行情不会每次循环都写入日线; 开启后写队列时收盘价每次都会更新
+        """
+        ticks = [
+            Tick(time=f'23-04-10T09:30:0{idx}-04:00:00', pre_close=10.0, open=10.0, latest=10.0 + idx * 0.01, low=9.0, high=11.0)
+            for idx in range(5)
+        ]
+        for write_behind, times in ((False, 1, ), (True, 5, ), ):
+            db = LocalDb(':memory:')
+            if write_behind:
+                db.writer = WriteBehindQueue(db=db, sync=True)
+            saved = list()
+            origin_save = db.save
+
+            def _save(row, saved=saved, origin_save=origin_save):
+                if isinstance(row, DailyCandleRow):
+                    saved.append(row.close_price)
+                return origin_save(row)
+
+            db.save = _save
+            SimulationBuilder.from_symbol('TEST', db=db, ticks=ticks)
+            assert len(saved) == times
+            assert saved[-1] == (10.04 if write_behind else 10.0)
+
+    def test_state_blob(self):
+        """
+        持仓状态按差异归档, 每个版本都可以被还原, 并且按照间隔保存完整快照
+        """
+        db = LocalDb(':memory:')
+        base = None
+        texts = dict()
+        for idx in range(10):
+            d = {f'k{i}': i for i in range(100)}
+            d['latestSnapshot'] = idx
+            text = FormatTool.json_dumps(d)
+            blob = StateBlobRow.new(symbol='TEST', day=20230410, text=text, update_time=idx, base=base, snapshot_interval=4)
+            base = (20230410, blob.hash, text, blob.chain, )
+            db.save(blob)
+            texts[blob.hash] = text
+            assert blob.chain == idx % 4
+            if blob.chain:
+                assert len(blob.content) < len(text) / 10
+        db.save(StateRow(version='V', day=20230410, symbol='TEST', content='', update_time=1, content_hash=blob.hash))
+        db.save(blob)
+
+        hashes = StateBlobRow.hashes_by_symbol(db.conn, symbol='TEST', day=20230410)
+        assert hashes == list(texts)
+        for h, text in texts.items():
+            assert StateBlobRow.rebuild(db.conn, content_hash=h) == text
+        row = StateRow.query_by_version(db.conn, version='V')
+        assert row.state_text(db.conn) == texts[blob.hash]
+        assert StateBlobRow.rebuild(db.conn, content_hash='unknown') is None
+
+        blob = StateBlobRow.new(symbol='TEST', day=20230411, text=text, update_time=11, base=base, snapshot_interval=4)
+        assert blob.is_snapshot
+
+    def test_retention(self):
+        """
+        清理线程删除过期的临时基准价格, 早期的持仓状态存档每天只保留最后一个版本, 并且保留的版本仍然可以还原
+        """
+        self.config()
+        with tempfile.TemporaryDirectory() as folder:
+            db = LocalDb(os.path.join(folder, 'test.db'), wal_mode=True)
+            now = TimeTools.us_time_now()
+            old_day = int(TimeTools.date_to_ymd(TimeTools.timedelta(now, days=-60), join=False))
+            today = int(TimeTools.date_to_ymd(now, join=False))
+            TempBasePriceRow(broker='tiger', symbol='TEST', price=1.0, expiry_time=1, update_time=1).save(db.conn)
+            texts = dict()
+            for day in (old_day, today, ):
+                base = None
+                for idx in range(20):
+                    text = FormatTool.json_dumps({'day': day, 'idx': idx, 'padding': ['x' * 64] * 64})
+                    blob = StateBlobRow.new(symbol='TEST', day=day, text=text, update_time=idx, base=base)
+                    base = (day, blob.hash, text, blob.chain, )
+                    db.save(blob)
+                texts[day] = (blob.hash, text, )
+
+            thread = DbRetentionThread(db=db)
+            thread.BATCH_PAUSE = 0.0
+            thread.run_once()
+            assert thread.total_rows == 20
+            assert thread.total_bytes > 0
+            assert TempBasePriceRow.query_by_symbol(db.conn, broker='tiger', symbol='TEST') is None
+            for day, (last_hash, text) in texts.items():
+                hashes = StateBlobRow.hashes_by_symbol(db.conn, symbol='TEST', day=day)
+                assert len(hashes) == (1 if day == old_day else 20)
+                assert StateBlobRow.rebuild(db.conn, content_hash=last_hash) == text
+            assert StateBlobRow.query_by_hash(db.conn, content_hash=texts[old_day][0]).is_snapshot
+            thread.primary_bar()
+            db.close()
+
+    def test_retention_candle_alarm(self):
+        """
+        清理线程按保留天数删除过期的日线和已解除的告警记录, 仍在告警中的记录保留
+        """
+        var = self.config()
+        var._config['db_retention_quote_history_days'] = 30
+        var._config['db_retention_alarm_days'] = 30
+        db = LocalDb(':memory:')
+        now = TimeTools.us_time_now()
+        old_time = TimeTools.timedelta(now, days=-60)
+        old_day = int(TimeTools.date_to_ymd(old_time, join=False))
+        today = int(TimeTools.date_to_ymd(now, join=False))
+        for day in (old_day, today, ):
+            DailyCandleRow(
+                broker='tiger', region='US', symbol='TEST', day=day,
+                high_price=2.0, low_price=1.0, close_price=1.5, update_time=1,
+            ).save(db.conn)
+        for key, is_set, update_time in (
+                ('old_unset', 0, old_time, ),
+                ('old_set', 1, old_time, ),
+                ('new_unset', 0, now, ),
+        ):
+            AlarmRow(
+                key=key, is_set=is_set, symbol='TEST', broker='tiger', update_time=int(update_time.timestamp()),
+            ).save(db.conn)
+
+        thread = DbRetentionThread(db=db)
+        thread.BATCH_PAUSE = 0.0
+        thread.run_once()
+        assert thread.total_rows == 2
+        candles = DailyCandleRow.query_by_symbol(
+            db.conn, broker='tiger', region='US', symbol='TEST', begin_day=0, end_day=today,
+        )
+        assert [candle.day for candle in candles] == [today]
+        assert AlarmRow.query_by_key(db.conn, key='old_unset').id is None
+        assert AlarmRow.query_by_key(db.conn, key='old_set').is_set
+        assert AlarmRow.query_by_key(db.conn, key='new_unset').id is not None
+        db.close()
+
+    def test_earning_summary(self):
+        """
+        收益汇总随收益明细一起写入, 汇总结果和扫描明细的结果一致, 并且可以根据明细重建
+        """
+        db = LocalDb(':memory:')
+        items = [
+            (20230410, 'TEST', 'USD', 100, 1, ),
+            (20230411, 'TEST', 'USD', 200, 2, ),
+            (20230512, 'TEST', 'USD', 300, 3, ),
+            (20230512, 'CN1', 'CNY', 400, 4, ),
+        ]
+        for day, symbol, currency, amount, create_time in items:
+            EarningRow(
+                day=day, symbol=symbol, currency=currency, days=1, amount=amount, unit='$', region='US',
+                broker='tiger', buyback_price=1.0, max_level=1, state_version='V', create_time=create_time,
+            ).save(db.conn)
+        with self.assertRaises(Exception):
+            EarningRow(
+                day=20230601, symbol='TEST', currency='USD', days=1, amount=1000, unit='$', region='US',
+                broker='tiger', buyback_price=1.0, max_level=1, state_version='V', create_time=1,
+            ).save(db.conn)
+
+        summary = EarningSummaryRow.items_after_month(db.conn, month=202301)
+        assert [(item.month, item.symbol, item.amount, item.times) for item in summary] == [
+            (202305, 'CN1', 400, 1),
+            (202305, 'TEST', 300, 1),
+            (202304, 'TEST', 300, 2),
+        ]
+        assert EarningRow.total_amount_before_time(db.conn, create_time=10, currency='USD') == 600
+        assert EarningRow.total_amount_before_time(db.conn, create_time=3, currency='USD') == 300
+        assert len(list(EarningRow.items_after_time(db.conn, create_time=0, limit=2))) == 2
+
+        db.conn.execute('DELETE FROM `earning_summary`;')
+        assert EarningSummaryRow.rebuild(db.conn) == 3
+        assert EarningRow.total_amount_before_time(db.conn, create_time=10, currency='CNY') == 400